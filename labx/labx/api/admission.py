@@ -0,0 +1,367 @@
+"""Admission control — a process-wide bounded queue in front of the pipeline.
+
+Provider calls are already throttled by the shared adaptive limiter; this
+layer bounds whole requests.  At most ``admission_max_active`` requests run
+the pipeline at once, at most ``admission_max_queued`` wait behind them,
+and the upload bytes held by requests in flight stay within
+``admission_max_bytes``.  Anything beyond that is shed with 503 +
+``Retry-After`` rather than accepted and left to time out — before the
+body is read when ``Content-Length`` already shows it cannot fit.
+
+Bytes are charged as the body arrives, and a request only queues for an
+active slot once its upload is complete, so slow clients cannot hold the
+slots while they trickle data in.
+
+Priority (``X-Priority``) applies here too: ``admission_stat_reserved`` of
+the active slots are held back for STAT requests, queued STAT requests are
+admitted before any routine one, and routine requests are shed first — on
+a full queue (STAT does not count against it) and at
+``ADMISSION_ROUTINE_BYTE_SHARE`` of the byte budget.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from labx.api.schemas import ErrorResponse
+from labx.config.constants import (
+    ADMISSION_INITIAL_SERVICE_S,
+    ADMISSION_ROUTINE_BYTE_SHARE,
+    SHED_RETRY_AFTER_MAX_S,
+)
+from labx.config.settings import Settings, get_settings
+from labx.observability.metrics import inc_shed, set_admission
+from labx.pipeline.concurrency import Priority, parse_priority
+
+logger = logging.getLogger(__name__)
+
+# Upload routes that run (or enqueue) the pipeline.
+ADMISSION_PATHS = frozenset({"/extract", "/analyse", "/analyse/stream", "/jobs"})
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed; carries the Retry-After hint in seconds."""
+
+    def __init__(self, reason: str, retry_after_s: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, min(SHED_RETRY_AFTER_MAX_S, math.ceil(retry_after_s)))
+
+
+def overloaded_response(exc: OverloadedError) -> JSONResponse:
+    """503 response for a shed request."""
+    return JSONResponse(
+        status_code=503,
+        content=ErrorResponse(
+            error="overloaded", detail="Server is busy, retry later"
+        ).model_dump(),
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+class AdmissionController:
+    """Bounded admission by priority lane, with a byte budget.
+
+    A limit of 0 disables it.  Waiters are admitted STAT first, then FIFO;
+    routine requests never take the last *stat_reserved* active slots.
+    The Retry-After hint is derived from an exponentially weighted average
+    of recent request service times.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_active: int = 0,
+        max_queued: int = 0,
+        max_bytes: int = 0,
+        queue_timeout_s: float = 0,
+        stat_reserved: int = 0,
+    ) -> None:
+        self._max_active = max_active
+        self._max_queued = max_queued
+        self._max_bytes = max_bytes
+        self._queue_timeout = queue_timeout_s or None
+        # Routine requests always keep at least one slot.
+        self._stat_reserved = max(0, min(stat_reserved, max_active - 1))
+        self._active = 0
+        self._queued = 0
+        self._bytes = 0
+        self._service_s = ADMISSION_INITIAL_SERVICE_S
+        self._waiters: dict[Priority, deque[asyncio.Future[None]]] = {
+            priority: deque() for priority in Priority
+        }
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def reserved_bytes(self) -> int:
+        return self._bytes
+
+    def retry_after(self) -> float:
+        """Estimated seconds until a new request would be admitted."""
+        slots = self._max_active or 1
+        return self._service_s * (self._queued + 1) / slots
+
+    def _has_slot(self, priority: Priority) -> bool:
+        if not self._max_active:
+            return True
+        limit = self._max_active
+        if priority is not Priority.stat:
+            limit -= self._stat_reserved
+        return self._active < limit
+
+    def _check_queue(self, priority: Priority) -> None:
+        if (
+            priority is not Priority.stat
+            and self._max_queued
+            and not self._has_slot(priority)
+            and len(self._waiters[Priority.routine]) >= self._max_queued
+        ):
+            self._shed(OverloadedError("queue_full", self.retry_after()), priority)
+
+    def _check_bytes(self, held: int, cost: int, priority: Priority) -> None:
+        """Shed a request holding *held* bytes that asks for *cost* more.
+
+        A request is never shed for bytes while it is the only one holding
+        any, so a single upload larger than the budget cannot starve.
+        """
+        budget = self._max_bytes
+        if priority is not Priority.stat:
+            budget = int(budget * ADMISSION_ROUTINE_BYTE_SHARE)
+        if self._max_bytes and self._bytes + cost > budget and self._bytes > held:
+            self._shed(OverloadedError("memory", self.retry_after()), priority)
+
+    def _charge(self, admission: Admission, size: int) -> None:
+        self._check_bytes(admission.bytes, size, admission.priority)
+        self._bytes += size
+        admission.bytes += size
+
+    @staticmethod
+    def _shed(exc: OverloadedError, priority: Priority) -> None:
+        inc_shed(exc.reason)
+        logger.warning(
+            "Shedding %s request (%s, retry after %ds)", priority.name, exc.reason, exc.retry_after
+        )
+        raise exc
+
+    @asynccontextmanager
+    async def request(
+        self, priority: Priority = Priority.routine, declared: int = 0
+    ) -> AsyncIterator[Admission]:
+        """Track one request from its headers until it has been answered.
+
+        Sheds at once when the queue is full or the *declared* body size
+        would not fit the byte budget.  The yielded ``Admission`` then
+        charges body bytes as they arrive and only takes an active slot
+        on ``start``, so slow uploads never hold one.
+        """
+        self._check_queue(priority)
+        self._check_bytes(0, declared, priority)
+        admission = Admission(self, priority)
+        try:
+            yield admission
+        finally:
+            if admission.started is not None:
+                self._release()
+                elapsed = time.monotonic() - admission.started
+                self._service_s = 0.8 * self._service_s + 0.2 * elapsed
+                set_admission(self._active, self._queued)
+            self._bytes -= admission.bytes
+
+    @asynccontextmanager
+    async def admit(
+        self, cost: int = 0, priority: Priority = Priority.routine
+    ) -> AsyncIterator[None]:
+        """Hold *cost* bytes of budget and an active slot for the block.
+
+        Raises ``OverloadedError`` instead of waiting when the queue or byte
+        budget is full, or when the wait exceeds the queue timeout.
+        """
+        async with self.request(priority, cost) as admission:
+            admission.charge(cost)
+            await admission.start()
+            yield
+
+    def _ahead(self, priority: Priority) -> bool:
+        """Whether a waiter would be admitted before a new *priority* request."""
+        return any(self._waiters[p] for p in Priority if p <= priority)
+
+    async def _acquire(self, priority: Priority) -> None:
+        self._check_queue(priority)
+        if self._has_slot(priority) and not self._ahead(priority):
+            self._active += 1
+            set_admission(self._active, self._queued)
+            return
+
+        lane = self._waiters[priority]
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        lane.append(future)
+        self._queued += 1
+        set_admission(self._active, self._queued)
+        try:
+            await asyncio.wait_for(future, self._queue_timeout)
+        except BaseException as exc:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up: pass it on.
+                self._release()
+            elif future in lane:
+                lane.remove(future)
+            if not isinstance(exc, TimeoutError):
+                raise
+            shed = OverloadedError("timeout", self.retry_after())
+            inc_shed(shed.reason)
+            logger.warning(
+                "Shedding %s request after queueing %.0fs",
+                priority.name,
+                self._queue_timeout or 0,
+            )
+            raise shed from None
+        finally:
+            self._queued -= 1
+            set_admission(self._active, self._queued)
+
+    def _release(self) -> None:
+        self._active -= 1
+        for priority in Priority:
+            lane = self._waiters[priority]
+            while lane and self._has_slot(priority):
+                future = lane.popleft()
+                if not future.done():
+                    self._active += 1
+                    future.set_result(None)
+
+
+class Admission:
+    """One request's hold on an ``AdmissionController`` (see ``request``)."""
+
+    def __init__(self, controller: AdmissionController, priority: Priority) -> None:
+        self._controller = controller
+        self.priority = priority
+        self.bytes = 0
+        self.started: float | None = None
+
+    def charge(self, size: int) -> None:
+        """Add *size* received bytes, shedding the request if they do not fit."""
+        self._controller._charge(self, size)
+
+    async def start(self) -> None:
+        """Wait for an active slot (once; later calls return at once)."""
+        if self.started is None:
+            await self._controller._acquire(self.priority)
+            self.started = time.monotonic()
+
+    def receive(self, receive: Receive) -> Receive:
+        """Wrap *receive* to charge body chunks and ``start`` after the last one."""
+
+        async def _receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                self.charge(len(message.get("body", b"")))
+                if not message.get("more_body", False):
+                    await self.start()
+            return message
+
+        return _receive
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits upload requests as their body arrives.
+
+    A request whose ``Content-Length`` cannot fit is shed before its body
+    is read.  Otherwise bytes are charged as they are received, and the
+    request queues for an active slot only once its body is complete (see
+    ``AdmissionController.request``).
+    """
+
+    def __init__(self, app: ASGIApp, *, paths: frozenset[str] = ADMISSION_PATHS) -> None:
+        self.app = app
+        self._paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self._paths:
+            await self.app(scope, receive, send)
+            return
+        controller = get_admission_controller()
+        if controller is None:
+            await self.app(scope, receive, send)
+            return
+
+        responded = False
+
+        async def _send(message: Message) -> None:
+            nonlocal responded
+            responded = True
+            await send(message)
+
+        try:
+            async with controller.request(
+                _declared_priority(scope), _declared_size(scope)
+            ) as admission:
+                await self.app(scope, admission.receive(receive), _send)
+        except OverloadedError as exc:
+            if responded:
+                raise
+            await overloaded_response(exc)(scope, receive, send)
+
+
+def _declared_priority(scope: Scope) -> Priority:
+    """Lane from ``X-Priority``; an invalid value is left for the route to reject."""
+    for name, value in scope["headers"]:
+        if name == b"x-priority":
+            try:
+                return parse_priority(value.decode("latin-1"))
+            except ValueError:
+                break
+    return Priority.routine
+
+
+def _declared_size(scope: Scope) -> int:
+    """``Content-Length``, or 0 for chunked uploads (charged as they arrive)."""
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                break
+    return 0
+
+
+_controller: AdmissionController | None = None
+
+
+def get_admission_controller(settings: Settings | None = None) -> AdmissionController | None:
+    """Return the process-wide admission controller, or ``None`` if every limit is 0."""
+    global _controller  # noqa: PLW0603
+    if _controller is None:
+        s = settings or get_settings()
+        if not (s.admission_max_active or s.admission_max_queued or s.admission_max_bytes):
+            return None
+        _controller = AdmissionController(
+            max_active=s.admission_max_active,
+            max_queued=s.admission_max_queued,
+            max_bytes=s.admission_max_bytes,
+            queue_timeout_s=s.admission_queue_timeout_s,
+            stat_reserved=s.admission_stat_reserved,
+        )
+    return _controller
+
+
+def reset_admission_controller() -> None:
+    """Tear down the shared admission controller (useful in tests)."""
+    global _controller  # noqa: PLW0603
+    _controller = None
@@ -0,0 +1,267 @@
+"""Per-API-key rate limiting and image quotas at the API edge.
+
+Each tenant (see ``security.configured_keys``) gets two token buckets:
+requests per minute (with a burst allowance) and images per hour.  The
+request bucket — and a check that the image quota is not already spent —
+runs in ASGI middleware before the upload body is read; the actual image
+count is charged once the upload has been parsed.  Buckets live in memory
+or, to share them across worker processes, in a SQLite file.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from labx.api.admission import ADMISSION_PATHS
+from labx.api.schemas import ErrorResponse
+from labx.api.security import configured_keys, resolve_tenant
+from labx.config.settings import Settings, get_settings
+from labx.observability.metrics import inc_rate_limited
+from labx.storage.sqlite import DATA_DIR, ThreadLocalConnection
+
+logger = logging.getLogger(__name__)
+
+_DB_PATH = DATA_DIR / "ratelimit.sqlite3"
+
+
+class RateLimitedError(Exception):
+    """Raised when a tenant is over its rate or quota; carries Retry-After seconds."""
+
+    def __init__(self, reason: str, retry_after_s: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after_s))
+
+
+def rate_limited_response(exc: RateLimitedError) -> JSONResponse:
+    """429 response for a rate-limited request."""
+    detail = (
+        "Image quota exceeded" if exc.reason == "image_quota" else "Too many requests"
+    )
+    return JSONResponse(
+        status_code=429,
+        content=ErrorResponse(error="rate_limited", detail=detail).model_dump(),
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _refill(level: float, updated: float, now: float, rate: float, capacity: float) -> float:
+    return min(capacity, level + (now - updated) * rate)
+
+
+class BucketStore(ABC):
+    """Token-bucket state keyed by string.
+
+    ``take`` debits *amount* once the bucket holds ``min(amount, capacity)``
+    (so an oversized charge can still succeed from a full bucket, leaving
+    it in debt) and returns 0, or returns the seconds until that would be
+    possible.  With ``consume=False`` it only checks.
+    """
+
+    @abstractmethod
+    def take(
+        self, key: str, amount: float, *, rate: float, capacity: float, consume: bool = True
+    ) -> float: ...
+
+
+class MemoryBucketStore(BucketStore):
+    """In-process buckets; each API worker process enforces its own limits."""
+
+    def __init__(self) -> None:
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(
+        self, key: str, amount: float, *, rate: float, capacity: float, consume: bool = True
+    ) -> float:
+        now = time.monotonic()
+        with self._lock:
+            level, updated = self._buckets.get(key, (capacity, now))
+            level = _refill(level, updated, now, rate, capacity)
+            needed = min(amount, capacity)
+            if level < needed:
+                self._buckets[key] = (level, now)
+                return (needed - level) / rate
+            self._buckets[key] = (level - amount if consume else level, now)
+            return 0.0
+
+
+class SQLiteBucketStore(BucketStore):
+    """Buckets in a WAL-mode SQLite file shared by every worker process on the host."""
+
+    def __init__(self, db_path: Path | None = None) -> None:
+        self._conn = ThreadLocalConnection(db_path or _DB_PATH)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS buckets "
+            "(key TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def take(
+        self, key: str, amount: float, *, rate: float, capacity: float, consume: bool = True
+    ) -> float:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT level, updated FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            level, updated = row or (capacity, now)
+            level = _refill(level, updated, now, rate, capacity)
+            needed = min(amount, capacity)
+            wait = 0.0 if level >= needed else (needed - level) / rate
+            if wait == 0.0 and consume:
+                level -= amount
+            conn.execute(
+                "INSERT INTO buckets (key, level, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET level = excluded.level, "
+                "updated = excluded.updated",
+                (key, level, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class ApiRateLimiter:
+    """Request-rate and image-quota buckets per tenant (0 disables either)."""
+
+    def __init__(
+        self,
+        store: BucketStore,
+        *,
+        requests_per_minute: int = 0,
+        burst: int = 0,
+        images_per_hour: int = 0,
+    ) -> None:
+        self._store = store
+        self._blocking = isinstance(store, SQLiteBucketStore)
+        self._rpm = requests_per_minute
+        self._burst = burst or requests_per_minute
+        self._iph = images_per_hour
+
+    async def _take(
+        self, key: str, amount: float, rate: float, capacity: float, consume: bool
+    ) -> float:
+        if self._blocking:
+            return await asyncio.to_thread(
+                self._store.take, key, amount, rate=rate, capacity=capacity, consume=consume
+            )
+        return self._store.take(key, amount, rate=rate, capacity=capacity, consume=consume)
+
+    async def check_request(self, tenant: str) -> None:
+        """Admit one request for *tenant* or raise ``RateLimitedError``."""
+        if self._iph:
+            wait = await self._take(f"img:{tenant}", 1, self._iph / 3600, self._iph, False)
+            if wait:
+                raise RateLimitedError("image_quota", wait)
+        if self._rpm:
+            wait = await self._take(f"req:{tenant}", 1, self._rpm / 60, self._burst, True)
+            if wait:
+                raise RateLimitedError("request_rate", wait)
+
+    async def charge_images(self, tenant: str, count: int) -> None:
+        """Charge *count* images to *tenant*'s quota or raise ``RateLimitedError``."""
+        if not self._iph:
+            return
+        wait = await self._take(f"img:{tenant}", count, self._iph / 3600, self._iph, True)
+        if wait:
+            raise RateLimitedError("image_quota", wait)
+
+
+class ApiRateLimitMiddleware:
+    """ASGI middleware applying per-key limits to upload routes before the body is read.
+
+    Requests on those routes with a missing or unknown key are rejected
+    here with 401 for the same reason: an unauthenticated client must not
+    be able to make the server buffer its upload.
+    """
+
+    def __init__(self, app: ASGIApp, *, paths: frozenset[str] = ADMISSION_PATHS) -> None:
+        self.app = app
+        self._paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self._paths:
+            await self.app(scope, receive, send)
+            return
+        keys = configured_keys()
+        if not keys:
+            await self.app(scope, receive, send)  # the route answers 503
+            return
+
+        api_key = next(
+            (v.decode("latin-1") for k, v in scope["headers"] if k == b"x-api-key"), None
+        )
+        tenant = resolve_tenant(api_key, keys)
+        if tenant is None:
+            response = JSONResponse(
+                status_code=401, content={"detail": "Invalid or missing API key"}
+            )
+            await response(scope, receive, send)
+            return
+
+        limiter = get_api_rate_limiter()
+        if limiter is not None:
+            try:
+                await limiter.check_request(tenant)
+            except RateLimitedError as exc:
+                inc_rate_limited(exc.reason)
+                logger.warning("Rate limited tenant %s (%s)", tenant, exc.reason)
+                await rate_limited_response(exc)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+async def charge_images(tenant: str, count: int) -> None:
+    """Charge an upload's image count; raises ``RateLimitedError`` over quota."""
+    limiter = get_api_rate_limiter()
+    if limiter is None:
+        return
+    try:
+        await limiter.charge_images(tenant, count)
+    except RateLimitedError as exc:
+        inc_rate_limited(exc.reason)
+        logger.warning("Image quota exceeded for tenant %s", tenant)
+        raise
+
+
+_limiter: ApiRateLimiter | None = None
+
+
+def get_api_rate_limiter(settings: Settings | None = None) -> ApiRateLimiter | None:
+    """Return the process-wide edge rate limiter, or ``None`` if no limit is set."""
+    global _limiter  # noqa: PLW0603
+    if _limiter is None:
+        s = settings or get_settings()
+        if not (s.api_rate_rpm or s.api_image_quota_per_hour):
+            return None
+        store: BucketStore
+        if s.api_rate_store == "sqlite":
+            store = SQLiteBucketStore(Path(s.api_rate_db) if s.api_rate_db else None)
+        else:
+            store = MemoryBucketStore()
+        _limiter = ApiRateLimiter(
+            store,
+            requests_per_minute=s.api_rate_rpm,
+            burst=s.api_rate_burst,
+            images_per_hour=s.api_image_quota_per_hour,
+        )
+    return _limiter
+
+
+def reset_api_rate_limiter() -> None:
+    """Tear down the shared edge rate limiter (useful in tests)."""
+    global _limiter  # noqa: PLW0603
+    _limiter = None
@@ -2,15 +2,18 @@
 
 from __future__ import annotations
 
+from datetime import datetime
+
 from pydantic import BaseModel, Field
 
-from labx.domain.models import AnalysisReport, LabReport
+from labx.domain.models import AnalysisReport, ExtractionError, LabReport
 
 
 class ExtractResponse(BaseModel):
     """Response for POST /extract."""
 
     reports: list[LabReport] = Field(default_factory=list)
+    errors: list[ExtractionError] = Field(default_factory=list)
     image_count: int = 0
 
 
@@ -32,3 +35,16 @@ class ErrorResponse(BaseModel):
 
     error: str
     detail: str = ""
+
+
+class JobResponse(BaseModel):
+    """Response for POST /jobs and GET /jobs/{job_id}."""
+
+    job_id: str
+    status: str  # queued | running | succeeded | failed
+    priority: str = "routine"
+    image_count: int = 0
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    error: ErrorResponse | None = None
@@ -2,32 +2,75 @@
 
 from __future__ import annotations
 
+import hmac
 import logging
 import os
 
-from fastapi import HTTPException, Security
+from fastapi import Depends, HTTPException, Security
 from fastapi.security import APIKeyHeader
 
+from labx.pipeline.concurrency import DEFAULT_TENANT
+
 logger = logging.getLogger(__name__)
 
 _API_KEY_HEADER = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 
+def configured_keys() -> list[tuple[str, str]]:
+    """Return ``(tenant, key)`` pairs from the environment.
+
+    ``LABX_API_KEYS`` holds comma-separated ``tenant:key`` entries (one per
+    ward / client); the single ``LABX_API_KEY`` is still accepted and maps
+    to the ``default`` tenant.
+    """
+    keys: list[tuple[str, str]] = []
+    single = os.environ.get("LABX_API_KEY")
+    if single:
+        keys.append((DEFAULT_TENANT, single))
+    for entry in os.environ.get("LABX_API_KEYS", "").split(","):
+        tenant, sep, key = entry.strip().partition(":")
+        if sep and tenant and key:
+            keys.append((tenant, key))
+    return keys
+
+
+def resolve_tenant(api_key: str | None, keys: list[tuple[str, str]]) -> str | None:
+    """Return the tenant owning *api_key*, or ``None`` if it matches no key.
+
+    Every configured key is compared in constant time so the response time
+    does not reveal how much of a key was right.
+    """
+    if not api_key:
+        return None
+    presented = api_key.encode("utf-8")
+    match = None
+    for tenant, key in keys:
+        if hmac.compare_digest(presented, key.encode("utf-8")) and match is None:
+            match = tenant
+    return match
+
+
 async def verify_api_key(
     api_key: str | None = Security(_API_KEY_HEADER),
 ) -> str:
-    """Validate the X-API-Key header against the configured server key.
+    """Validate the X-API-Key header against the configured server keys.
 
-    ``LABX_API_KEY`` MUST be set. Auth is never silently disabled —
-    if the env var is missing the service rejects all requests with 503.
+    ``LABX_API_KEY`` or ``LABX_API_KEYS`` MUST be set. Auth is never
+    silently disabled — if neither is set the service rejects all requests
+    with 503.
     """
-    expected = os.environ.get("LABX_API_KEY")
-    if not expected:
-        logger.error("LABX_API_KEY is not configured — all requests rejected")
+    keys = configured_keys()
+    if not keys:
+        logger.error("LABX_API_KEY(S) is not configured — all requests rejected")
         raise HTTPException(
             status_code=503,
             detail="Service misconfigured. Contact the administrator.",
         )
-    if not api_key or api_key != expected:
+    if resolve_tenant(api_key, keys) is None:
         raise HTTPException(status_code=401, detail="Invalid or missing API key")
-    return api_key
+    return api_key  # type: ignore[return-value]
+
+
+async def request_tenant(api_key: str = Depends(verify_api_key)) -> str:
+    """Tenant that this request's provider calls and quotas are charged to."""
+    return resolve_tenant(api_key, configured_keys()) or DEFAULT_TENANT
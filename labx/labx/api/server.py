@@ -2,23 +2,47 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
-import tempfile
+import shutil
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
 from pathlib import Path
 
-from fastapi import Depends, FastAPI, File, HTTPException, Query, UploadFile
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
 
 import labx
+from labx.api.admission import AdmissionMiddleware, OverloadedError, overloaded_response
 from labx.api.middleware import RequestIdMiddleware
-from labx.api.schemas import AnalyseResponse, ErrorResponse, ExtractResponse, HealthResponse
-from labx.api.security import verify_api_key
+from labx.api.quota import (
+    ApiRateLimitMiddleware,
+    RateLimitedError,
+    charge_images,
+    rate_limited_response,
+)
+from labx.api.schemas import (
+    AnalyseResponse,
+    ErrorResponse,
+    ExtractResponse,
+    HealthResponse,
+    JobResponse,
+)
+from labx.api.security import request_tenant, verify_api_key
+from labx.api.uploads import UPLOAD_OPENAPI, Upload, prepare_uploads, read_uploads
+from labx.config.constants import JOB_QUEUE_RETRY_AFTER_S
 from labx.config.settings import get_settings
-from labx.pipeline.image_io import ImageValidationError
-from labx.pipeline.orchestrator import run_extract_only, run_full_pipeline
+from labx.observability.metrics import inc_shed
+from labx.pipeline.concurrency import Priority, parse_priority
+from labx.pipeline.image_io import ImageValidationError, PreparedImage, warn_if_pillow_missing
+from labx.pipeline.orchestrator import run_extract_only, run_full_pipeline, stream_pipeline
+from labx.pipeline.worker import JobWorkerPool
+from labx.storage.jobs import FAILED, SUCCEEDED, Job, get_job_store
 
 logger = logging.getLogger(__name__)
 
@@ -34,21 +58,47 @@ _PROD = os.environ.get("LABX_ENV", "production").lower() != "development"
 
 MAX_FILES = 10
 
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Run the /jobs worker pool for the lifetime of the process."""
+    settings = get_settings()
+    warn_if_pillow_missing(settings)
+    pool: JobWorkerPool | None = None
+    if settings.jobs_enabled and settings.job_workers > 0:
+        pool = JobWorkerPool(
+            get_job_store(settings), workers=settings.job_workers, settings=settings
+        )
+        pool.start()
+    app.state.job_pool = pool
+    try:
+        yield
+    finally:
+        if pool is not None:
+            await pool.stop()
+
+
 app = FastAPI(
     title="labx — Lab Report Extraction Engine",
     version=labx.__version__,
+    lifespan=_lifespan,
     docs_url=None if _PROD else "/docs",
     redoc_url=None if _PROD else "/redoc",
     openapi_url=None if _PROD else "/openapi.json",
 )
 
 # ── Middleware ────────────────────────────────────────────────────
+# Innermost: sheds overload before the upload body is read, but inside CORS
+# and request-id so a 503 still carries their headers.  Per-key limits run
+# just outside it, so a throttled client never takes an admission slot.
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(ApiRateLimitMiddleware)
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=_ALLOWED_ORIGINS,
     allow_methods=["POST", "GET"],
-    allow_headers=["X-API-Key", "Content-Type"],
+    allow_headers=["X-API-Key", "Content-Type", "X-Priority"],
 )
 app.add_middleware(RequestIdMiddleware)
 
@@ -62,6 +112,16 @@ async def _image_validation_error(request, exc: ImageValidationError):  # type:
     )
 
 
+@app.exception_handler(OverloadedError)
+async def _overloaded(request, exc: OverloadedError):  # type: ignore[no-untyped-def]
+    return overloaded_response(exc)
+
+
+@app.exception_handler(RateLimitedError)
+async def _rate_limited(request, exc: RateLimitedError):  # type: ignore[no-untyped-def]
+    return rate_limited_response(exc)
+
+
 @app.exception_handler(Exception)
 async def _generic_error(request, exc: Exception):  # type: ignore[no-untyped-def]
     # Log full detail server-side only; never expose internal error text to callers.
@@ -72,6 +132,25 @@ async def _generic_error(request, exc: Exception):  # type: ignore[no-untyped-de
     )
 
 
+# ── Dependencies ─────────────────────────────────────────────────
+
+
+async def request_priority(
+    x_priority: str | None = Header(default=None, description="stat | routine"),
+) -> Priority:
+    """Scheduling lane for this request's provider calls (``X-Priority`` header)."""
+    try:
+        return parse_priority(x_priority)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from None
+
+
+async def require_jobs() -> None:
+    """Hide the job API on instances that do not own the job store."""
+    if not get_settings().jobs_enabled:
+        raise HTTPException(status_code=404, detail="Jobs are not served by this instance")
+
+
 # ── Routes ───────────────────────────────────────────────────────
 
 
@@ -80,76 +159,222 @@ async def health() -> HealthResponse:
     return HealthResponse(status="ok", version=labx.__version__)
 
 
-@app.post("/extract", response_model=ExtractResponse, dependencies=[Depends(verify_api_key)])
+@app.post(
+    "/extract",
+    response_model=ExtractResponse,
+    dependencies=[Depends(verify_api_key)],
+    openapi_extra=UPLOAD_OPENAPI,
+)
 async def extract(
-    files: list[UploadFile] = File(..., description="Lab report images (1-10)"),
+    request: Request,
+    priority: Priority = Depends(request_priority),
+    tenant: str = Depends(request_tenant),
 ) -> ExtractResponse:
     """Extract lab values from uploaded images (no trending/summary)."""
-    if len(files) > MAX_FILES:
-        raise HTTPException(
-            status_code=422,
-            detail=f"Too many files: maximum {MAX_FILES} allowed, got {len(files)}",
-        )
-    settings = get_settings()
-    paths = await _save_uploads(files, max_mb=settings.max_image_mb)
-    try:
-        reports = await run_extract_only(paths, settings=settings)
-        return ExtractResponse(reports=reports, image_count=len(files))
-    finally:
-        _cleanup(paths)
+    images = await _receive_images(request, tenant)
+    reports, errors = await run_extract_only(
+        images, settings=get_settings(), priority=priority, tenant=tenant
+    )
+    return ExtractResponse(reports=reports, errors=errors, image_count=len(images))
 
 
-@app.post("/analyse", response_model=AnalyseResponse, dependencies=[Depends(verify_api_key)])
+@app.post(
+    "/analyse",
+    response_model=AnalyseResponse,
+    dependencies=[Depends(verify_api_key)],
+    openapi_extra=UPLOAD_OPENAPI,
+)
 async def analyse(
-    files: list[UploadFile] = File(..., description="Lab report images (1-10)"),
+    request: Request,
     summary: bool = Query(default=True, description="Generate clinical summary"),
+    priority: Priority = Depends(request_priority),
+    tenant: str = Depends(request_tenant),
 ) -> AnalyseResponse:
     """Full pipeline: extract → normalize → merge → trend → summarize."""
-    if len(files) > MAX_FILES:
-        raise HTTPException(
-            status_code=422,
-            detail=f"Too many files: maximum {MAX_FILES} allowed, got {len(files)}",
-        )
+    images = await _receive_images(request, tenant)
+    analysis = await run_full_pipeline(
+        images, settings=get_settings(), enable_summary=summary, priority=priority, tenant=tenant
+    )
+    return AnalyseResponse(analysis=analysis)
+
+
+@app.post(
+    "/analyse/stream",
+    dependencies=[Depends(verify_api_key)],
+    openapi_extra=UPLOAD_OPENAPI,
+)
+async def analyse_stream(
+    request: Request,
+    summary: bool = Query(default=True, description="Generate clinical summary"),
+    priority: Priority = Depends(request_priority),
+    tenant: str = Depends(request_tenant),
+) -> StreamingResponse:
+    """Full pipeline as Server-Sent Events.
+
+    Emits ``image_loaded``, ``analyte_extracted``, ``image_extracted``,
+    ``image_failed``, ``report_normalized`` and ``critical_detected``
+    events as each image progresses, then a final ``complete`` event
+    carrying the ``AnalysisReport``.  A failure after the stream has
+    started is sent as an ``error`` event.
+    """
+    images = await _receive_images(request, tenant)
+    events = stream_pipeline(
+        images, settings=get_settings(), enable_summary=summary, priority=priority, tenant=tenant
+    )
+    try:
+        # Load and validate before committing to a 200 so that bad images
+        # still get a proper 422 from the exception handler.
+        first = await anext(events)
+    except BaseException:
+        await events.aclose()
+        raise
+
+    async def _body() -> AsyncGenerator[str, None]:
+        try:
+            yield _sse(first.event, first)
+            async for event in events:
+                yield _sse(event.event, event)
+        except Exception as exc:
+            logger.exception("Streaming pipeline failed: %s", type(exc).__name__)
+            yield _sse(
+                "error",
+                ErrorResponse(error="internal", detail="An unexpected error occurred"),
+            )
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        _body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post(
+    "/jobs",
+    response_model=JobResponse,
+    status_code=202,
+    dependencies=[Depends(verify_api_key), Depends(require_jobs)],
+    openapi_extra=UPLOAD_OPENAPI,
+)
+async def submit_job(
+    request: Request,
+    summary: bool = Query(default=True, description="Generate clinical summary"),
+    priority: Priority = Depends(request_priority),
+    tenant: str = Depends(request_tenant),
+) -> JobResponse:
+    """Queue a full-pipeline job and return its id immediately.
+
+    Uploads are validated before the job is accepted; poll
+    ``GET /jobs/{job_id}`` and fetch ``GET /jobs/{job_id}/result`` once it
+    has succeeded.
+    """
     settings = get_settings()
-    paths = await _save_uploads(files, max_mb=settings.max_image_mb)
+    store = get_job_store(settings)
+    if settings.job_queue_max and await asyncio.to_thread(store.queued) >= settings.job_queue_max:
+        inc_shed("job_queue_full")
+        raise OverloadedError("job_queue_full", JOB_QUEUE_RETRY_AFTER_S)
+    uploads = await read_uploads(
+        request, max_files=MAX_FILES, max_mb=settings.max_image_mb
+    )
+    await asyncio.to_thread(prepare_uploads, uploads, max_mb=settings.max_image_mb)
+    await charge_images(tenant, len(uploads))
+    job_id, job_dir = await asyncio.to_thread(store.new_job_dir)
     try:
-        analysis = await run_full_pipeline(
-            paths, settings=settings, enable_summary=summary
+        await asyncio.to_thread(_write_job_inputs, uploads, job_dir)
+        job = await asyncio.to_thread(
+            store.submit,
+            job_id,
+            image_count=len(uploads),
+            summary=summary,
+            priority=priority,
+            tenant=tenant,
         )
-        return AnalyseResponse(analysis=analysis)
-    finally:
-        _cleanup(paths)
+    except BaseException:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+
+    pool: JobWorkerPool | None = getattr(request.app.state, "job_pool", None)
+    if pool is not None:
+        pool.notify()
+    return _job_response(job)
+
+
+@app.get(
+    "/jobs/{job_id}",
+    response_model=JobResponse,
+    dependencies=[Depends(verify_api_key), Depends(require_jobs)],
+)
+async def get_job(job_id: str, tenant: str = Depends(request_tenant)) -> JobResponse:
+    """Report the status of a queued job."""
+    job = await asyncio.to_thread(get_job_store().get, job_id)
+    # Another tenant's job is reported as missing rather than forbidden.
+    if job is None or job.tenant != tenant:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+
+@app.get(
+    "/jobs/{job_id}/result",
+    response_model=AnalyseResponse,
+    dependencies=[Depends(verify_api_key), Depends(require_jobs)],
+)
+async def get_job_result(job_id: str, tenant: str = Depends(request_tenant)) -> AnalyseResponse:
+    """Return the analysis of a succeeded job (409 until then)."""
+    store = get_job_store()
+    job = await asyncio.to_thread(store.get, job_id)
+    if job is None or job.tenant != tenant:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    analysis = await asyncio.to_thread(store.result, job_id)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Job result has expired")
+    return AnalyseResponse(analysis=analysis)
 
 
 # ── Helpers ──────────────────────────────────────────────────────
 
 
-async def _save_uploads(files: list[UploadFile], *, max_mb: float) -> list[Path]:
-    """Write uploaded files to a temp directory and return their paths."""
-    tmpdir = Path(tempfile.mkdtemp(prefix="labx_"))
-    paths: list[Path] = []
-    for f in files:
-        dest = tmpdir / (f.filename or "image.bin")
-        content = await f.read()
-        size_mb = len(content) / (1024 * 1024)
-        if size_mb > max_mb:
-            raise ImageValidationError(
-                f"File {f.filename} is {size_mb:.1f} MB (limit {max_mb} MB)"
-            )
-        dest.write_bytes(content)
-        paths.append(dest)
-    return paths
+async def _receive_images(request: Request, tenant: str) -> list[PreparedImage]:
+    """Stream, validate and charge the request's uploads."""
+    settings = get_settings()
+    uploads = await read_uploads(request, max_files=MAX_FILES, max_mb=settings.max_image_mb)
+    images = await asyncio.to_thread(prepare_uploads, uploads, max_mb=settings.max_image_mb)
+    await charge_images(tenant, len(images))
+    return images
 
 
-def _cleanup(paths: list[Path]) -> None:
-    """Remove temporary files."""
-    for p in paths:
-        try:
-            p.unlink(missing_ok=True)
-        except OSError:
-            pass
-    if paths:
-        try:
-            paths[0].parent.rmdir()
-        except OSError:
-            pass
+def _write_job_inputs(uploads: list[Upload], job_dir: Path) -> None:
+    """Store a job's uploads, each in its own numbered subdirectory.
+
+    This is the layout read back by ``job_image_paths``.
+    """
+    for i, upload in enumerate(uploads):
+        dest = job_dir / f"{i:02d}" / upload.file_name
+        dest.parent.mkdir()
+        dest.write_bytes(upload.data)
+
+
+def _job_response(job: Job) -> JobResponse:
+    def ts(value: float | None) -> datetime | None:
+        return datetime.fromtimestamp(value, tz=UTC) if value is not None else None
+
+    error = None
+    if job.status == FAILED:
+        error = ErrorResponse(error=job.error or "internal", detail=job.error_detail or "")
+    return JobResponse(
+        job_id=job.id,
+        status=job.status,
+        priority=Priority(job.priority).name,
+        image_count=job.image_count,
+        created_at=datetime.fromtimestamp(job.created_at, tz=UTC),
+        started_at=ts(job.started_at),
+        finished_at=ts(job.finished_at),
+        error=error,
+    )
+
+
+def _sse(event: str, payload: BaseModel) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {payload.model_dump_json()}\n\n"
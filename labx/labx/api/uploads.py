@@ -0,0 +1,189 @@
+"""Streaming multipart upload parsing.
+
+Upload routes read the request body themselves instead of declaring
+``UploadFile`` parameters: Starlette would otherwise spool every part to
+disk before the route runs, and size checks could only happen afterwards.
+Here each chunk is checked against the per-image limit, hashed and
+(on the first bytes of a part) MIME-sniffed as it arrives, so an oversized,
+surplus or non-image file aborts the read immediately.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from labx.pipeline.image_io import (
+    ImageValidationError,
+    PreparedImage,
+    check_mime,
+    prepare_image_bytes,
+)
+
+if TYPE_CHECKING:
+    from python_multipart.multipart import MultipartCallbacks
+
+UPLOAD_FIELD = "files"
+
+# Bytes needed to recognise every supported format (RIFF....WEBP).
+_SNIFF_BYTES = 12
+
+# OpenAPI description of the multipart body the upload routes parse by hand.
+UPLOAD_OPENAPI: dict[str, Any] = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": [UPLOAD_FIELD],
+                    "properties": {
+                        UPLOAD_FIELD: {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                            "description": "Lab report images (1-10)",
+                        }
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+@dataclass
+class Upload:
+    """One uploaded image, held in its receive buffer with its SHA-256 digest."""
+
+    file_name: str
+    data: bytearray
+    sha256: str
+
+    def prepare(self, *, max_mb: float) -> PreparedImage:
+        """Build a ``PreparedImage`` over the receive buffer without copying it."""
+        return prepare_image_bytes(
+            memoryview(self.data), self.file_name, max_mb=max_mb, image_id=self.sha256
+        )
+
+
+@dataclass
+class _Part:
+    file_name: str | None = None
+    is_upload: bool = False
+    buf: bytearray = field(default_factory=bytearray)
+    hasher: Any = field(default_factory=hashlib.sha256)
+    sniffed: bool = False
+
+
+def _safe_file_name(raw: bytes) -> str:
+    """Base name of a client-supplied file name, usable as one path component."""
+    name = Path(raw.decode("utf-8", "replace").replace("\0", "")).name
+    return name if name not in ("", ".", "..") else "image.bin"
+
+
+class _UploadCollector:
+    """Multipart parser callbacks that collect the ``files`` parts."""
+
+    def __init__(self, *, max_files: int, max_mb: float) -> None:
+        self._max_files = max_files
+        self._max_mb = max_mb
+        self._max_bytes = int(max_mb * 1024 * 1024)
+        self._part = _Part()
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._headers: dict[bytes, bytes] = {}
+        self.uploads: list[Upload] = []
+
+    def callbacks(self) -> MultipartCallbacks:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": lambda d, s, e: self._header_field.extend(d[s:e]),
+            "on_header_value": lambda d, s, e: self._header_value.extend(d[s:e]),
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def _on_part_begin(self) -> None:
+        self._part = _Part()
+        self._headers = {}
+
+    def _on_header_end(self) -> None:
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        file_name = options.get(b"filename")
+        if name != UPLOAD_FIELD or file_name is None:
+            return  # other form fields are ignored
+        if len(self.uploads) >= self._max_files:
+            raise ImageValidationError(
+                f"Too many files: maximum {self._max_files} allowed"
+            )
+        self._part.is_upload = True
+        self._part.file_name = _safe_file_name(file_name)
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        part = self._part
+        if not part.is_upload:
+            return
+        if len(part.buf) + (end - start) > self._max_bytes:
+            raise ImageValidationError(
+                f"File {part.file_name} exceeds the {self._max_mb} MB limit"
+            )
+        chunk = data[start:end]
+        part.buf.extend(chunk)
+        part.hasher.update(chunk)
+        if not part.sniffed and len(part.buf) >= _SNIFF_BYTES:
+            self._sniff(part)
+
+    def _on_part_end(self) -> None:
+        part = self._part
+        if not part.is_upload:
+            return
+        if not part.sniffed:
+            self._sniff(part)
+        assert part.file_name is not None
+        self.uploads.append(Upload(part.file_name, part.buf, part.hasher.hexdigest()))
+
+    def _sniff(self, part: _Part) -> None:
+        assert part.file_name is not None
+        check_mime(part.buf[:_SNIFF_BYTES], part.file_name)
+        part.sniffed = True
+
+
+async def read_uploads(request: Request, *, max_files: int, max_mb: float) -> list[Upload]:
+    """Stream the ``files`` parts of a multipart request into memory.
+
+    Raises ``ImageValidationError`` (422) as soon as a part exceeds
+    *max_mb*, is not a supported image, or would exceed *max_files*; the
+    rest of the body is never read.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=422, detail="Expected a multipart/form-data upload")
+
+    collector = _UploadCollector(max_files=max_files, max_mb=max_mb)
+    parser = MultipartParser(boundary, collector.callbacks())
+    async for chunk in request.stream():
+        if chunk:
+            parser.write(chunk)
+    parser.finalize()
+    return collector.uploads
+
+
+def prepare_uploads(uploads: list[Upload], *, max_mb: float) -> list[PreparedImage]:
+    """Validate received uploads and build the pipeline's ``PreparedImage`` list."""
+    if not uploads:
+        raise ImageValidationError("No images provided")
+    return [u.prepare(max_mb=max_mb) for u in uploads]
@@ -10,10 +10,12 @@ import typer
 
 from labx.cli.formatters import (
     format_analysis_summary,
+    format_errors,
     format_reports_summary,
     write_json,
 )
 from labx.observability.logging import setup_logging
+from labx.pipeline.concurrency import Priority, parse_priority
 
 app = typer.Typer(
     name="labx",
@@ -32,6 +34,10 @@ def extract(
         Optional[Path],
         typer.Option("-o", "--output", help="Output JSON file (default: stdout)"),
     ] = None,
+    priority: Annotated[
+        str,
+        typer.Option("--priority", help="Scheduling lane: stat or routine"),
+    ] = "routine",
     verbose: Annotated[
         bool,
         typer.Option("-v", "--verbose", help="Enable debug logging"),
@@ -42,9 +48,12 @@ def extract(
 
     from labx.pipeline.orchestrator import run_extract_only
 
-    reports = asyncio.run(run_extract_only(files))
+    lane = _parse_priority(priority)
+    reports, errors = asyncio.run(run_extract_only(files, priority=lane))
 
     typer.echo(format_reports_summary(reports))
+    if errors:
+        typer.echo(format_errors(errors), err=True)
 
     data = [r.model_dump(mode="json") for r in reports]
     write_json(data, output)
@@ -67,6 +76,10 @@ def analyse(
         bool,
         typer.Option("--summary/--no-summary", help="Generate clinical summary"),
     ] = True,
+    priority: Annotated[
+        str,
+        typer.Option("--priority", help="Scheduling lane: stat or routine"),
+    ] = "routine",
     verbose: Annotated[
         bool,
         typer.Option("-v", "--verbose", help="Enable debug logging"),
@@ -74,6 +87,7 @@ def analyse(
 ) -> None:
     """Full analysis: extract → normalize → merge → trend → summarize."""
     setup_logging(level="DEBUG" if verbose else "INFO")
+    lane = _parse_priority(priority)
 
     # Expand directories to image files
     expanded = _expand_paths(files)
@@ -83,7 +97,9 @@ def analyse(
 
     from labx.pipeline.orchestrator import run_full_pipeline
 
-    analysis = asyncio.run(run_full_pipeline(expanded, enable_summary=summary))
+    analysis = asyncio.run(
+        run_full_pipeline(expanded, enable_summary=summary, priority=lane)
+    )
 
     typer.echo(format_analysis_summary(analysis))
 
@@ -92,6 +108,13 @@ def analyse(
         typer.echo(f"\nResults written to {output}")
 
 
+def _parse_priority(value: str) -> Priority:
+    try:
+        return parse_priority(value)
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc), param_hint="--priority") from None
+
+
 def _expand_paths(paths: list[Path]) -> list[Path]:
     """Expand directories into image files."""
     image_exts = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
@@ -6,7 +6,7 @@ import json
 import sys
 from pathlib import Path
 
-from labx.domain.models import AnalysisReport, Flag, LabReport
+from labx.domain.models import AnalysisReport, ExtractionError, Flag, LabReport
 
 
 def write_json(data: dict | list, path: Path | None) -> None:
@@ -29,6 +29,15 @@ def format_reports_summary(reports: list[LabReport]) -> str:
     return "\n".join(lines)
 
 
+def format_errors(errors: list[ExtractionError]) -> str:
+    """Return a human-readable list of images that failed extraction."""
+    lines = ["FAILED IMAGES:"]
+    for e in errors:
+        hint = " (retryable)" if e.retryable else ""
+        lines.append(f"  {e.file_name}: {e.message}{hint}")
+    return "\n".join(lines)
+
+
 def format_analysis_summary(analysis: AnalysisReport) -> str:
     """Return a human-readable summary of the full analysis."""
     lines: list[str] = []
@@ -59,6 +68,10 @@ def format_analysis_summary(analysis: AnalysisReport) -> str:
             )
         lines.append("")
 
+    if analysis.errors:
+        lines.append(format_errors(analysis.errors))
+        lines.append("")
+
     lines.append(
         f"Total: {len(analysis.merged_timeline)} analytes, "
         f"{len(analysis.trends)} trends, "
@@ -45,6 +45,38 @@ CRITICAL_MULTIPLIER_OVERRIDES: dict[str, float] = {
 MAX_RETRIES = 3
 RETRY_BASE_DELAY_S = 1.0
 RETRY_MAX_DELAY_S = 30.0
+RETRY_AFTER_MAX_S = 60.0  # cap on server-provided retry-after hints
+
+# HTTP statuses worth retrying, and the subset that signals back-pressure
+RETRYABLE_STATUS_CODES: frozenset[int] = frozenset({429, 500, 502, 503, 529})
+OVERLOAD_STATUS_CODES: frozenset[int] = frozenset({429, 529})
 
 # ── Image processing ────────────────────────────────────────────
 RECOMMENDED_MAX_WIDTH_PX = 1920
+
+# ── Token estimation (pre-flight, for rate limiting) ───────────
+# Claude downsizes images to fit these bounds, then bills ~(w * h) / 750 tokens.
+IMAGE_MAX_LONG_EDGE_PX = 1568
+IMAGE_MAX_PIXELS = 1_150_000
+IMAGE_PIXELS_PER_TOKEN = 750
+IMAGE_MAX_TOKENS = 1600  # also used when dimensions are unknown
+CHARS_PER_TOKEN = 3.5
+# Extraction output: a printed report fits about this many rows per page
+# width of height, each costing about this many tokens of report JSON.
+REPORT_ROWS_PER_WIDTH = 40
+REPORT_TOKENS_PER_ROW = 100
+REPORT_BASE_TOKENS = 300  # patient block and JSON framing
+# Slowest output rate assumed when sizing a non-streamed call's timeout.
+MIN_OUTPUT_TOKENS_PER_S = 40
+
+# ── Async jobs ──────────────────────────────────────────────────
+JOB_HEARTBEAT_S = 10.0  # running jobs renew their lease this often
+JOB_LEASE_S = 60.0  # a running job with an older heartbeat is requeued
+JOB_MAX_ATTEMPTS = 3
+JOB_POLL_INTERVAL_S = 2.0  # idle workers re-check the queue this often
+JOB_QUEUE_RETRY_AFTER_S = 30  # Retry-After sent when the job queue is full
+
+# ── Admission control ───────────────────────────────────────────
+SHED_RETRY_AFTER_MAX_S = 120  # cap on the Retry-After sent with a 503
+ADMISSION_INITIAL_SERVICE_S = 20.0  # service-time estimate before any request completes
+ADMISSION_ROUTINE_BYTE_SHARE = 0.8  # routine uploads shed at this share of the byte budget
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -17,19 +19,94 @@ class Settings(BaseSettings):
 
     model_vision: str = "claude-sonnet-4-20250514"
     model_text: str = "claude-haiku-4-20250414"
+    prompt_cache: bool = True  # cache the system + extraction prompt prefix
+    # "tool": the model fills a tool input schema built from LabReport;
+    # "text": free-text JSON, parsed locally and repaired by a second call
+    vision_output_mode: Literal["tool", "text"] = "tool"
+    # Stream extraction calls: analytes surface mid-generation, no long-body
+    # timeouts, and a truncated response is cut back to exactly its whole analytes
+    vision_streaming: bool = True
+    # Output budget per extraction, sized from the page shape within these bounds
+    vision_output_tokens_min: int = 4096
+    vision_output_tokens_max: int = 16384
+    vision_max_continuations: int = 2  # follow-up calls when output hits max_tokens
 
     # ── Concurrency / rate-limiting ──────────────────────────────
-    concurrency: int = 4
+    concurrency: int = 4  # initial limit when adaptive
     request_timeout_s: int = 60
+    adaptive_concurrency: bool = True
+    concurrency_min: int = 1
+    concurrency_max: int = 16
+    concurrency_latency_target_s: float = 30.0
+    priority_aging_s: float = 30.0  # queued routine calls gain one lane per interval
+    # Fair share of provider calls across tenants (API keys), keyed by tenant id
+    tenant_weights: dict[str, float] = {}  # unlisted tenants weigh 1.0
+    tenant_concurrency_caps: dict[str, int] = {}
+    tenant_default_concurrency_cap: int = 0  # 0 = no per-tenant cap
+    # Anthropic org budgets (0 disables the bucket)
+    rate_limit_rpm: int = 0
+    rate_limit_itpm: int = 0
+    rate_limit_otpm: int = 0
+
+    # ── Admission control (per API process; 0 disables each limit) ──
+    admission_max_active: int = 8  # requests running the pipeline at once
+    admission_stat_reserved: int = 1  # of those, slots only STAT requests may take
+    admission_max_queued: int = 32  # requests waiting for a slot
+    admission_max_bytes: int = 256 * 1024**2  # upload bytes held by requests in flight
+    admission_queue_timeout_s: float = 30.0  # shed a queued request after this
+
+    # ── Per-API-key limits at the edge (0 disables each limit) ───
+    api_rate_rpm: int = 60  # upload requests per minute per key
+    api_rate_burst: int = 20  # requests a key may make back to back
+    api_image_quota_per_hour: int = 600  # images per hour per key
+    api_rate_store: Literal["memory", "sqlite"] = "memory"  # sqlite shares across workers
+    api_rate_db: str = ""  # default: ~/.labx/ratelimit.sqlite3
 
     # ── Image constraints ────────────────────────────────────────
     max_images: int = 10
     max_image_mb: float = 12.0
+    # Downscale + re-encode before vision calls (needs the [imaging] extra)
+    image_downscale: bool = True
+    image_max_width_px: int = 1920  # RECOMMENDED_MAX_WIDTH_PX
+    image_max_pixels: int = 1_150_000  # the model's own resize budget
+    image_grayscale: bool = True
+    image_jpeg_quality: int = 85
+    # Extract very tall images (long cumulative reports) in overlapping bands
+    tile_tall_images: bool = True
+    tile_min_aspect: float = 2.5  # tile images taller than this many widths
+    tile_band_aspect: float = 1.4  # band height, in widths
+    tile_overlap: float = 0.15  # fraction of a band shared with the next
+    tile_max_bands: int = 8
 
     # ── Feature flags ────────────────────────────────────────────
     enable_summary: bool = True
     cache_enabled: bool = False
 
+    # ── Extraction cache ─────────────────────────────────────────
+    cache_backend: Literal["sqlite", "disk"] = "sqlite"
+    cache_dir: str = ""  # default: ~/.labx/cache
+    cache_memory_entries: int = 256  # in-process LRU in front of the store (0 disables)
+    cache_max_bytes: int = 2 * 1024**3  # sqlite backend: compressed payload budget
+    cache_eviction_policy: Literal["lru", "lfu"] = "lru"
+    cache_max_entries: int = 100_000  # disk backend
+    cache_ttl_s: int = 7 * 24 * 3600  # 0 disables expiry
+    # Fingerprints of earlier prompt/model revisions whose entries stay valid
+    cache_compatible_fingerprints: list[str] = []
+    # Near-duplicate images (same page photographed again), matched by dHash
+    # within a tenant: "verify" reuses an earlier extraction only when the
+    # patient ID and dates read off the page match it exactly and a short
+    # yes/no vision check agrees.
+    near_duplicate_mode: Literal["off", "verify"] = "off"
+    near_duplicate_max_distance: int = 6  # Hamming distance out of 64 bits
+
+    # ── Async jobs ───────────────────────────────────────────────
+    # The job store is local SQLite: serve /jobs from exactly one instance
+    jobs_enabled: bool = True
+    job_workers: int = 2  # per API process; 0 disables the /jobs worker pool
+    jobs_dir: str = ""  # default: ~/.labx/jobs
+    job_retention_s: int = 24 * 3600  # finished jobs are purged after this
+    job_queue_max: int = 500  # POST /jobs is shed beyond this many queued jobs
+
     # ── Safety ───────────────────────────────────────────────────
     phi_logging: bool = False
 
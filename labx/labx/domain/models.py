@@ -118,6 +118,19 @@ class LabTrend(BaseModel):
     observations: list[Observation] = Field(default_factory=list)
 
 
+# ── Errors ───────────────────────────────────────────────────────
+
+
+class ExtractionError(BaseModel):
+    """A per-image extraction failure returned alongside partial results."""
+
+    image_id: str = ""
+    file_name: str = ""
+    error_type: str = ""  # e.g. "provider_http_529", "invalid_json"
+    message: str = ""  # safe for clients: never raw exception text
+    retryable: bool = False
+
+
 # ── Analysis (top-level output) ──────────────────────────────────
 
 
@@ -128,4 +141,5 @@ class AnalysisReport(BaseModel):
     merged_timeline: list[LabAnalyte] = Field(default_factory=list)
     trends: list[LabTrend] = Field(default_factory=list)
     critical_flags: list[LabTrend] = Field(default_factory=list)
+    errors: list[ExtractionError] = Field(default_factory=list)
     summary: str = ""
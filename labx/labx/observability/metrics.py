@@ -10,11 +10,27 @@ logger = logging.getLogger(__name__)
 _extractions_total = None
 _extraction_duration = None
 _active_extractions = None
+_cache_lookups = None
+_coalesced_total = None
+_concurrency_limit = None
+_ratelimit_wait = None
+_admission_requests = None
+_shed_total = None
+_lane_wait = None
+_rate_limited_total = None
+_preprocess_saved = None
+_prompt_cache_tokens = None
+_json_repairs_total = None
+_continuations_total = None
 
 
 def _ensure_metrics() -> bool:
     """Create Prometheus metrics if the client library is available."""
     global _extractions_total, _extraction_duration, _active_extractions  # noqa: PLW0603
+    global _cache_lookups, _coalesced_total, _concurrency_limit  # noqa: PLW0603
+    global _ratelimit_wait, _admission_requests, _shed_total, _lane_wait  # noqa: PLW0603
+    global _rate_limited_total, _preprocess_saved, _prompt_cache_tokens  # noqa: PLW0603
+    global _json_repairs_total, _continuations_total  # noqa: PLW0603
     if _extractions_total is not None:
         return True
     try:
@@ -37,6 +53,65 @@ def _ensure_metrics() -> bool:
         "labx_active_extractions",
         "Number of extractions currently in progress",
     )
+    _cache_lookups = Counter(
+        "labx_cache_lookups_total",
+        "Extraction cache lookups by tier and result",
+        ["tier", "result"],
+    )
+    _coalesced_total = Counter(
+        "labx_extractions_coalesced_total",
+        "Extractions served by joining an identical in-flight call",
+    )
+    _concurrency_limit = Gauge(
+        "labx_concurrency_limit",
+        "Current adaptive concurrency limit for provider calls",
+    )
+    _ratelimit_wait = Histogram(
+        "labx_ratelimit_wait_seconds",
+        "Time a provider call waited for RPM/TPM budget",
+        buckets=[0, 0.1, 0.5, 1, 5, 15, 30, 60],
+    )
+    _admission_requests = Gauge(
+        "labx_admission_requests",
+        "Requests admitted to the pipeline or waiting for a slot",
+        ["state"],
+    )
+    _shed_total = Counter(
+        "labx_requests_shed_total",
+        "Requests rejected with 503 by admission control",
+        ["reason"],
+    )
+    _lane_wait = Histogram(
+        "labx_limiter_wait_seconds",
+        "Time a provider call waited for a concurrency slot, by priority lane",
+        ["lane"],
+        buckets=[0, 0.1, 0.5, 1, 5, 15, 30, 60, 120],
+    )
+    _rate_limited_total = Counter(
+        "labx_requests_rate_limited_total",
+        "Requests rejected with 429 by per-API-key limits",
+        ["reason"],
+    )
+    _preprocess_saved = Counter(
+        "labx_image_preprocess_saved_total",
+        "Bytes and estimated input tokens saved by downscaling images",
+        ["unit"],
+    )
+    _prompt_cache_tokens = Counter(
+        "labx_prompt_cache_tokens_total",
+        "Provider input tokens read from or written to the prompt cache",
+        ["model", "kind"],
+    )
+    _json_repairs_total = Counter(
+        "labx_json_repairs_total",
+        "Malformed extraction outputs, by output mode and repair method (local or model)",
+        ["mode", "method"],
+    )
+    _continuations_total = Counter(
+        "labx_extraction_continuations_total",
+        "Follow-up extraction calls after output hit max_tokens, by outcome",
+        ["result"],
+    )
     return True
 
 
@@ -53,3 +128,66 @@ def observe_duration(seconds: float) -> None:
 def set_active(count: int) -> None:
     if _ensure_metrics() and _active_extractions is not None:
         _active_extractions.set(count)
+
+
+def inc_cache_lookup(tier: str, result: str) -> None:
+    if _ensure_metrics() and _cache_lookups is not None:
+        _cache_lookups.labels(tier=tier, result=result).inc()
+
+
+def inc_coalesced() -> None:
+    if _ensure_metrics() and _coalesced_total is not None:
+        _coalesced_total.inc()
+
+
+def set_concurrency_limit(limit: int) -> None:
+    if _ensure_metrics() and _concurrency_limit is not None:
+        _concurrency_limit.set(limit)
+
+
+def observe_ratelimit_wait(seconds: float) -> None:
+    if _ensure_metrics() and _ratelimit_wait is not None:
+        _ratelimit_wait.observe(seconds)
+
+
+def set_admission(active: int, queued: int) -> None:
+    if _ensure_metrics() and _admission_requests is not None:
+        _admission_requests.labels(state="active").set(active)
+        _admission_requests.labels(state="queued").set(queued)
+
+
+def inc_shed(reason: str) -> None:
+    if _ensure_metrics() and _shed_total is not None:
+        _shed_total.labels(reason=reason).inc()
+
+
+def observe_lane_wait(lane: str, seconds: float) -> None:
+    if _ensure_metrics() and _lane_wait is not None:
+        _lane_wait.labels(lane=lane).observe(seconds)
+
+
+def inc_rate_limited(reason: str) -> None:
+    if _ensure_metrics() and _rate_limited_total is not None:
+        _rate_limited_total.labels(reason=reason).inc()
+
+
+def inc_preprocess_saved(bytes_saved: int, tokens_saved: int) -> None:
+    if _ensure_metrics() and _preprocess_saved is not None:
+        _preprocess_saved.labels(unit="bytes").inc(max(0, bytes_saved))
+        _preprocess_saved.labels(unit="tokens").inc(max(0, tokens_saved))
+
+
+def inc_prompt_cache_tokens(model: str, read: int, written: int) -> None:
+    if _ensure_metrics() and _prompt_cache_tokens is not None:
+        _prompt_cache_tokens.labels(model=model, kind="read").inc(max(0, read))
+        _prompt_cache_tokens.labels(model=model, kind="write").inc(max(0, written))
+
+
+def inc_json_repair(mode: str, method: str) -> None:
+    if _ensure_metrics() and _json_repairs_total is not None:
+        _json_repairs_total.labels(mode=mode, method=method).inc()
+
+
+def inc_continuation(result: str) -> None:
+    if _ensure_metrics() and _continuations_total is not None:
+        _continuations_total.labels(result=result).inc()
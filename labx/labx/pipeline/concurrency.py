@@ -1,36 +1,172 @@
-"""Concurrency control — semaphore, retry with exponential backoff, rate limiting."""
+"""Concurrency control — adaptive limiter, header-aware retry, shared back-off."""
 
 from __future__ import annotations
 
 import asyncio
 import logging
-from collections.abc import Awaitable, Callable
-from typing import TypeVar
+import time
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    Mapping,
+    Sequence,
+)
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import Generic, TypeVar
 
 from tenacity import (
+    RetryCallState,
     retry,
-    retry_if_exception_type,
+    retry_if_exception,
     stop_after_attempt,
     wait_exponential,
 )
 
-from labx.config.constants import MAX_RETRIES, RETRY_BASE_DELAY_S, RETRY_MAX_DELAY_S
+from labx.config.constants import (
+    MAX_RETRIES,
+    OVERLOAD_STATUS_CODES,
+    RETRY_AFTER_MAX_S,
+    RETRY_BASE_DELAY_S,
+    RETRY_MAX_DELAY_S,
+    RETRYABLE_STATUS_CODES,
+)
+from labx.config.settings import Settings, get_settings
+from labx.observability.metrics import observe_lane_wait, set_active, set_concurrency_limit
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
 
-def with_retry() -> Callable:  # type: ignore[type-arg]
+def is_retryable_error(exc: BaseException) -> bool:
+    """True for transient provider failures: timeouts, network errors, 429/5xx."""
+    try:
+        from anthropic import APIConnectionError, APIStatusError
+    except ImportError:
+        return False
+    if isinstance(exc, APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """Seconds the API asked us to wait, from the error response headers.
+
+    Honours ``retry-after`` (seconds or HTTP-date) first, then the
+    ``anthropic-ratelimit-*-reset`` timestamp of whichever budget is
+    exhausted.  Returns ``None`` when the response carries no hint.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    now = datetime.now(tz=UTC)
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, (parsedate_to_datetime(retry_after) - now).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    resets: list[float] = []
+    for budget in ("requests", "tokens", "input-tokens", "output-tokens"):
+        if headers.get(f"anthropic-ratelimit-{budget}-remaining") != "0":
+            continue
+        reset = headers.get(f"anthropic-ratelimit-{budget}-reset")
+        if not reset:
+            continue
+        try:
+            reset_at = datetime.fromisoformat(reset.replace("Z", "+00:00"))
+        except ValueError:
+            continue
+        resets.append(max(0.0, (reset_at - now).total_seconds()))
+    return max(resets) if resets else None
+
+
+class BackoffGate:
+    """Shared pause for every caller in a provider lane.
+
+    When one call is told to back off, ``pause`` pushes the lane's resume
+    time forward and every other caller blocks in ``wait`` until then,
+    instead of each coroutine discovering the 429 on its own schedule.
+    """
+
+    def __init__(self) -> None:
+        self._resume_at = 0.0
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self._resume_at - time.monotonic())
+
+    def pause(self, seconds: float) -> None:
+        resume_at = time.monotonic() + seconds
+        if resume_at > self._resume_at:
+            self._resume_at = resume_at
+            logger.warning("Provider lane paused for %.1fs", seconds)
+
+    async def wait(self) -> None:
+        while (delay := self.remaining) > 0:
+            await asyncio.sleep(delay)
+
+
+_gate: BackoffGate | None = None
+
+
+def get_backoff_gate() -> BackoffGate:
+    """Return the process-wide provider back-off gate."""
+    global _gate  # noqa: PLW0603
+    if _gate is None:
+        _gate = BackoffGate()
+    return _gate
+
+
+def wait_retry_after(gate: BackoffGate | None = None) -> Callable[[RetryCallState], float]:
+    """Tenacity wait strategy: server hint if present, else exponential backoff.
+
+    A server-provided delay is also applied to *gate* so that the whole lane
+    pauses, not just the coroutine that received the 429.
+    """
+    fallback = wait_exponential(multiplier=RETRY_BASE_DELAY_S, max=RETRY_MAX_DELAY_S)
+
+    def _wait(retry_state: RetryCallState) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        hinted = retry_after_seconds(exc) if exc is not None else None
+        if hinted is None:
+            return float(fallback(retry_state))
+        delay = min(hinted, RETRY_AFTER_MAX_S)
+        if gate is not None:
+            gate.pause(delay)
+        return delay
+
+    return _wait
+
+
+def with_retry(gate: BackoffGate | None = None) -> Callable:  # type: ignore[type-arg]
     """Tenacity retry decorator for transient API errors.
 
     Retries on:
-      - 429 rate-limit (via anthropic.RateLimitError)
-      - 5xx server errors (via anthropic.InternalServerError)
+      - 429 rate-limit / 529 overloaded, waiting as long as the API asks
+      - 5xx server errors
       - Network / timeout errors
+
+    Pass the shared *gate* to make server back-off hints pause every caller.
     """
     try:
-        from anthropic import APIStatusError, APITimeoutError
+        import anthropic  # noqa: F401
     except ImportError:
         # Fallback if anthropic isn't installed — retry on generic exceptions
         return retry(
@@ -41,21 +177,10 @@ def with_retry() -> Callable:  # type: ignore[type-arg]
             reraise=True,
         )
 
-    def _is_retryable(exc: BaseException) -> bool:
-        if isinstance(exc, APITimeoutError):
-            return True
-        if isinstance(exc, APIStatusError):
-            return exc.status_code in (429, 500, 502, 503, 529)
-        return False
-
     return retry(
-        retry=retry_if_exception_type((APITimeoutError, APIStatusError)).wraps(
-            lambda rs: _is_retryable(rs.outcome.exception())  # type: ignore[union-attr]
-            if rs.outcome and rs.outcome.exception()
-            else False
-        ),
+        retry=retry_if_exception(is_retryable_error),
         stop=stop_after_attempt(MAX_RETRIES),
-        wait=wait_exponential(multiplier=RETRY_BASE_DELAY_S, max=RETRY_MAX_DELAY_S),
+        wait=wait_retry_after(gate),
         reraise=True,
         before_sleep=lambda rs: logger.warning(
             "Retry attempt %d after %s", rs.attempt_number, rs.outcome.exception()  # type: ignore[union-attr]
@@ -63,33 +188,440 @@ def with_retry() -> Callable:  # type: ignore[type-arg]
     )
 
 
+def _is_overload(exc: BaseException) -> bool:
+    """True for provider back-pressure (429 rate-limited / 529 overloaded)."""
+    return getattr(exc, "status_code", None) in OVERLOAD_STATUS_CODES
+
+
+class Priority(IntEnum):
+    """Scheduling lane for provider calls; lower values are served first."""
+
+    stat = 0  # ED / ICU — jumps the queue
+    routine = 1
+
+
+_priority: ContextVar[Priority] = ContextVar("labx_priority", default=Priority.routine)
+
+
+def parse_priority(value: str | None) -> Priority:
+    """Parse a lane name (``stat`` / ``routine``); ``None`` or empty means routine."""
+    if not value:
+        return Priority.routine
+    try:
+        return Priority[value.strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown priority '{value}'") from None
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+@contextmanager
+def priority_scope(priority: Priority) -> Iterator[None]:
+    """Run provider calls made in this context (and tasks it spawns) in *priority*'s lane."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+DEFAULT_TENANT = "default"
+
+_tenant: ContextVar[str] = ContextVar("labx_tenant", default=DEFAULT_TENANT)
+
+
+def current_tenant() -> str:
+    return _tenant.get()
+
+
+@contextmanager
+def tenant_scope(tenant: str) -> Iterator[None]:
+    """Attribute provider calls made in this context to *tenant* for fair queueing."""
+    token = _tenant.set(tenant)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+@dataclass(eq=False)
+class _Waiter:
+    future: asyncio.Future[None]
+    priority: Priority
+    tenant: str
+    tag: float
+    enqueued: float = field(default_factory=time.monotonic)
+
+    def lane(self, now: float, aging_s: float) -> int:
+        """Lane after promotion for time waited (see ``FairQueue``)."""
+        if aging_s <= 0:
+            return int(self.priority)
+        return max(0, int(self.priority) - int((now - self.enqueued) / aging_s))
+
+
+class FairQueue:
+    """Waiter queue ordered by priority lane, then weighted fair share per tenant.
+
+    Within a lane, waiters are served in order of their virtual finish tag
+    (start-time fair queueing): each call advances its tenant's virtual
+    clock by ``1 / weight``, so a tenant with a deep backlog cannot push
+    a light tenant's next call behind more than one round of its own.
+    Waiters are promoted one lane per *aging_s* waited, so routine calls
+    cannot starve behind a stream of STAT calls.
+    """
+
+    def __init__(
+        self, *, aging_s: float = 30.0, weights: Mapping[str, float] | None = None
+    ) -> None:
+        self._aging_s = aging_s
+        self._weights = dict(weights or {})
+        self._waiters: list[_Waiter] = []
+        self._vtime = 0.0
+        self._finish: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return sum(1 for w in self._waiters if not w.future.done())
+
+    def __bool__(self) -> bool:
+        return bool(self._waiters)
+
+    def __contains__(self, waiter: object) -> bool:
+        return waiter in self._waiters
+
+    def _cost(self, tenant: str) -> float:
+        return 1.0 / max(self._weights.get(tenant, 1.0), 1e-6)
+
+    def push(self, future: asyncio.Future[None]) -> _Waiter:
+        """Enqueue *future* under the ambient priority and tenant."""
+        tenant = current_tenant()
+        tag = max(self._vtime, self._finish.get(tenant, 0.0)) + self._cost(tenant)
+        self._finish[tenant] = tag
+        waiter = _Waiter(future, current_priority(), tenant, tag)
+        self._waiters.append(waiter)
+        return waiter
+
+    def remove(self, waiter: _Waiter) -> None:
+        self._waiters.remove(waiter)
+
+    def pop(self, eligible: Callable[[str], bool] | None = None) -> _Waiter | None:
+        """Remove and return the next waiter whose tenant is *eligible*."""
+        self._waiters[:] = [w for w in self._waiters if not w.future.done()]
+        candidates = [w for w in self._waiters if eligible is None or eligible(w.tenant)]
+        if not candidates:
+            if not self._waiters:
+                self._finish.clear()  # idle: restart virtual time
+                self._vtime = 0.0
+            return None
+        now = time.monotonic()
+        best = min(candidates, key=lambda w: (w.lane(now, self._aging_s), w.tag, w.enqueued))
+        self._waiters.remove(best)
+        # Virtual time follows the start tag of the call entering service.
+        self._vtime = max(self._vtime, best.tag - self._cost(best.tenant))
+        return best
+
+
+class PriorityLock:
+    """Mutex that grants waiters by priority lane and tenant fair share instead of FIFO."""
+
+    def __init__(
+        self, *, aging_s: float = 30.0, weights: Mapping[str, float] | None = None
+    ) -> None:
+        self._locked = False
+        self._queue = FairQueue(aging_s=aging_s, weights=weights)
+
+    async def acquire(self) -> None:
+        if not self._locked and not self._queue:
+            self._locked = True
+            return
+        waiter = self._queue.push(asyncio.get_running_loop().create_future())
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release()
+            elif waiter in self._queue:
+                self._queue.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        waiter = self._queue.pop()
+        if waiter is None:
+            self._locked = False
+        else:
+            waiter.future.set_result(None)
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self.release()
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter.
+
+    Grows the limit by roughly one slot per window of successful calls that
+    finish under *latency_target_s* (additive increase) and multiplies it by
+    *backoff* when a call fails with 429/529 (multiplicative decrease).  Only
+    one decrease is applied per congestion event: failures from calls that
+    started before the last decrease are ignored.  With
+    ``min_limit == max_limit`` it behaves like a fixed ``asyncio.Semaphore``.
+
+    Waiters are queued in a ``FairQueue`` (see ``priority_scope`` and
+    ``tenant_scope``).  *tenant_caps* bounds how many slots one tenant
+    may hold at once (*default_tenant_cap* for unlisted tenants; 0 = no cap).
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        *,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        latency_target_s: float = 30.0,
+        backoff: float = 0.5,
+        aging_s: float = 30.0,
+        tenant_weights: Mapping[str, float] | None = None,
+        tenant_caps: Mapping[str, int] | None = None,
+        default_tenant_cap: int = 0,
+    ) -> None:
+        self._min = max(1, min_limit)
+        self._max = max(self._min, max_limit)
+        self._limit = float(min(max(initial, self._min), self._max))
+        self._latency_target_s = latency_target_s
+        self._backoff = backoff
+        self._inflight = 0
+        self._waiters = FairQueue(aging_s=aging_s, weights=tenant_weights)
+        self._tenant_caps = dict(tenant_caps or {})
+        self._default_tenant_cap = default_tenant_cap
+        self._tenant_inflight: dict[str, int] = {}
+        self._last_decrease = 0.0
+        set_concurrency_limit(self.limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def tenant_inflight(self, tenant: str) -> int:
+        return self._tenant_inflight.get(tenant, 0)
+
+    def _under_cap(self, tenant: str) -> bool:
+        cap = self._tenant_caps.get(tenant, self._default_tenant_cap)
+        return cap <= 0 or self.tenant_inflight(tenant) < cap
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns the monotonic time the slot was granted.
+
+        The slot is charged to the ambient tenant; release it from the
+        same context.
+        """
+        priority = current_priority()
+        tenant = current_tenant()
+        if self._inflight < self.limit and not self._waiters and self._under_cap(tenant):
+            self._take(tenant)
+            observe_lane_wait(priority.name, 0.0)
+            return time.monotonic()
+
+        waiter = self._waiters.push(asyncio.get_running_loop().create_future())
+        self._wake()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just as we were cancelled: pass it on.
+                self._give_back(tenant)
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        granted = time.monotonic()
+        observe_lane_wait(priority.name, granted - waiter.enqueued)
+        return granted
+
+    def release(self, started: float, exc: BaseException | None = None) -> None:
+        """Return a slot and adjust the limit from the call's outcome."""
+        now = time.monotonic()
+        if exc is not None and _is_overload(exc):
+            if started >= self._last_decrease:
+                self._set_limit(self._limit * self._backoff)
+                self._last_decrease = now
+                logger.warning("Provider overloaded — concurrency limit now %d", self.limit)
+        elif exc is None and now - started <= self._latency_target_s:
+            self._set_limit(self._limit + 1.0 / self._limit)
+        self._give_back(current_tenant())
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """``async with limiter.slot():`` — acquire, run, release with outcome."""
+        started = await self.acquire()
+        try:
+            yield
+        except BaseException as exc:
+            self.release(started, exc)
+            raise
+        self.release(started)
+
+    def _set_limit(self, value: float) -> None:
+        before = self.limit
+        self._limit = min(max(value, float(self._min)), float(self._max))
+        if self.limit != before:
+            set_concurrency_limit(self.limit)
+            self._wake()
+
+    def _take(self, tenant: str) -> None:
+        self._inflight += 1
+        self._tenant_inflight[tenant] = self._tenant_inflight.get(tenant, 0) + 1
+        set_active(self._inflight)
+
+    def _give_back(self, tenant: str) -> None:
+        self._inflight -= 1
+        remaining = self._tenant_inflight.get(tenant, 0) - 1
+        if remaining > 0:
+            self._tenant_inflight[tenant] = remaining
+        else:
+            self._tenant_inflight.pop(tenant, None)
+        set_active(self._inflight)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._inflight < self.limit:
+            waiter = self._waiters.pop(self._under_cap)
+            if waiter is None:
+                return
+            self._take(waiter.tenant)
+            waiter.future.set_result(None)
+
+
+_limiter: AdaptiveLimiter | None = None
+
+
+def get_limiter(settings: Settings | None = None) -> AdaptiveLimiter:
+    """Return (and lazily create) the process-wide provider-call limiter.
+
+    With ``adaptive_concurrency`` disabled the limit is pinned at
+    ``concurrency``.
+    """
+    global _limiter  # noqa: PLW0603
+    if _limiter is None:
+        s = settings or get_settings()
+        if s.adaptive_concurrency:
+            _limiter = AdaptiveLimiter(
+                s.concurrency,
+                min_limit=s.concurrency_min,
+                max_limit=s.concurrency_max,
+                latency_target_s=s.concurrency_latency_target_s,
+                aging_s=s.priority_aging_s,
+                tenant_weights=s.tenant_weights,
+                tenant_caps=s.tenant_concurrency_caps,
+                default_tenant_cap=s.tenant_default_concurrency_cap,
+            )
+        else:
+            _limiter = AdaptiveLimiter(
+                s.concurrency,
+                min_limit=s.concurrency,
+                max_limit=s.concurrency,
+                aging_s=s.priority_aging_s,
+                tenant_weights=s.tenant_weights,
+                tenant_caps=s.tenant_concurrency_caps,
+                default_tenant_cap=s.tenant_default_concurrency_cap,
+            )
+    return _limiter
+
+
+def reset_limiter() -> None:
+    """Tear down the shared limiter (useful in tests)."""
+    global _limiter  # noqa: PLW0603
+    _limiter = None
+
+
+@dataclass
+class TaskResult(Generic[T]):
+    """Outcome envelope for one task run by ``run_settled``."""
+
+    index: int
+    value: T | None = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def iter_settled(
+    tasks: Sequence[Callable[[], Awaitable[T]]],
+    *,
+    max_concurrent: int = 4,
+    limiter: AdaptiveLimiter | None = None,
+) -> AsyncGenerator[TaskResult[T], None]:
+    """Run *tasks* with bounded concurrency, yielding envelopes as they complete.
+
+    Same semantics as ``run_settled`` but in completion order, so callers can
+    start downstream work on early results while slower tasks are in flight.
+    Closing the iterator early cancels the tasks that have not finished.
+    """
+    lim = limiter or AdaptiveLimiter(
+        max_concurrent, min_limit=max_concurrent, max_limit=max_concurrent
+    )
+
+    async def _guarded(idx: int, fn: Callable[[], Awaitable[T]]) -> TaskResult[T]:
+        async with lim.slot():
+            logger.debug("Starting task %d (concurrency limit: %d)", idx, lim.limit)
+            try:
+                return TaskResult(idx, value=await fn())
+            except Exception as exc:
+                return TaskResult(idx, error=exc)
+
+    pending = [asyncio.ensure_future(_guarded(i, fn)) for i, fn in enumerate(tasks)]
+    try:
+        for next_done in asyncio.as_completed(pending):
+            yield await next_done
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def run_settled(
+    tasks: Sequence[Callable[[], Awaitable[T]]],
+    *,
+    max_concurrent: int = 4,
+    limiter: AdaptiveLimiter | None = None,
+) -> list[TaskResult[T]]:
+    """Run *tasks* with bounded concurrency and return one envelope per task.
+
+    Each element in *tasks* is a zero-arg async callable (e.g. a lambda or partial).
+    Slots come from *limiter* when given (typically the shared one from
+    ``get_limiter``); otherwise a fixed limit of *max_concurrent* applies.
+    A failing task never discards its siblings' results: its exception is
+    captured in its envelope.  Cancellation still propagates.
+    """
+    results = [
+        r async for r in iter_settled(tasks, max_concurrent=max_concurrent, limiter=limiter)
+    ]
+    return sorted(results, key=lambda r: r.index)
+
+
 async def run_concurrently(
-    tasks: list[Callable[[], Awaitable[T]]],
+    tasks: Sequence[Callable[[], Awaitable[T]]],
     *,
     max_concurrent: int = 4,
+    limiter: AdaptiveLimiter | None = None,
 ) -> list[T]:
-    """Run *tasks* with bounded concurrency via an ``asyncio.Semaphore``.
+    """Run *tasks* with bounded concurrency; all-or-nothing.
 
-    Each element in *tasks* is a zero-arg async callable (e.g. a lambda or partial).
-    Returns results in the same order as *tasks*.
+    Returns results in the same order as *tasks*, or re-raises the first
+    exception.  Use ``run_settled`` to keep partial results.
     """
-    semaphore = asyncio.Semaphore(max_concurrent)
-
-    async def _guarded(idx: int, fn: Callable[[], Awaitable[T]]) -> tuple[int, T]:
-        async with semaphore:
-            logger.debug("Starting task %d (semaphore slots: %d)", idx, max_concurrent)
-            result = await fn()
-            return idx, result
-
-    coros = [_guarded(i, fn) for i, fn in enumerate(tasks)]
-    completed = await asyncio.gather(*coros, return_exceptions=True)
-
-    # Preserve order and re-raise first exception
-    ordered: list[T | BaseException] = [None] * len(tasks)  # type: ignore[list-item]
-    for item in completed:
-        if isinstance(item, BaseException):
-            raise item
-        idx, val = item
-        ordered[idx] = val
-
-    return ordered  # type: ignore[return-value]
+    results = await run_settled(tasks, max_concurrent=max_concurrent, limiter=limiter)
+    for r in results:
+        if r.error is not None:
+            raise r.error
+    return [r.value for r in results]  # type: ignore[misc]
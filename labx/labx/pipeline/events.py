@@ -0,0 +1,108 @@
+"""Pipeline progress events yielded by ``stream_pipeline``.
+
+Events are emitted in the order the work happens: every image is announced
+once loaded, analytes are reported while the model is still generating
+(when the extractor streams), then each extraction is reported the moment
+it completes (successful or not), and the assembled ``AnalysisReport``
+arrives last.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Literal
+
+from pydantic import BaseModel
+
+from labx.domain.models import AnalysisReport, ExtractionError, Flag, LabAnalyte
+
+
+class ImageLoaded(BaseModel):
+    """An image passed validation and is queued for extraction."""
+
+    event: Literal["image_loaded"] = "image_loaded"
+    index: int
+    image_id: str
+    file_name: str
+    bytes_saved: int = 0  # by downscaling / re-encoding before the vision call
+    tokens_saved: int = 0  # estimated input tokens
+
+
+class CriticalValue(BaseModel):
+    """A single critical observation found in one report."""
+
+    analyte_key: str
+    display_name: str = ""
+    value: float
+    unit: str = ""
+    flag: Flag
+    date: date
+
+
+class AnalyteExtracted(BaseModel):
+    """One analyte finished streaming, normalized, before its report is complete.
+
+    Provisional: the image's final report is authoritative.  Overlapping
+    bands of a tiled image may stream the same row twice, and a cache hit
+    streams nothing.
+    """
+
+    event: Literal["analyte_extracted"] = "analyte_extracted"
+    index: int
+    image_id: str
+    panel_index: int
+    analyte: LabAnalyte
+    critical_values: list[CriticalValue] = []
+
+
+class ImageExtracted(BaseModel):
+    """The vision model returned a report for an image."""
+
+    event: Literal["image_extracted"] = "image_extracted"
+    index: int
+    image_id: str
+    file_name: str
+
+
+class ImageFailed(BaseModel):
+    """Extraction failed for an image; the rest of the batch continues."""
+
+    event: Literal["image_failed"] = "image_failed"
+    index: int
+    error: ExtractionError
+
+
+class ReportNormalized(BaseModel):
+    """An extracted report was post-processed and merged into the timeline."""
+
+    event: Literal["report_normalized"] = "report_normalized"
+    index: int
+    image_id: str
+    analyte_count: int
+
+
+class CriticalDetected(BaseModel):
+    """A normalized report contains one or more critical values."""
+
+    event: Literal["critical_detected"] = "critical_detected"
+    index: int
+    image_id: str
+    values: list[CriticalValue]
+
+
+class PipelineComplete(BaseModel):
+    """Final event: the full analysis for the batch."""
+
+    event: Literal["complete"] = "complete"
+    analysis: AnalysisReport
+
+
+PipelineEvent = (
+    ImageLoaded
+    | AnalyteExtracted
+    | ImageExtracted
+    | ImageFailed
+    | ReportNormalized
+    | CriticalDetected
+    | PipelineComplete
+)
@@ -1,28 +1,65 @@
-"""Image ingestion — load, validate, MIME sniff, base64 encode, hash."""
+"""Image ingestion — load, validate, MIME sniff, hash, measure.
+
+A ``PreparedImage`` keeps the original bytes (a memory map for files on
+disk, a view over the received buffer for uploads) and only base64-encodes
+them when a vision request is built, so cache hits never pay for encoding
+and no encoded copy outlives the call.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import base64
 import hashlib
+import io
+import logging
+import math
 import mimetypes
-from dataclasses import dataclass
+import mmap
+from collections.abc import Sequence
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from labx.config.constants import (
+    IMAGE_MAX_PIXELS,
+    RECOMMENDED_MAX_WIDTH_PX,
+    SUPPORTED_MIME_TYPES,
+)
 
-from labx.config.constants import SUPPORTED_MIME_TYPES
+if TYPE_CHECKING:
+    from labx.config.settings import Settings
+
+logger = logging.getLogger(__name__)
 
 
 class ImageValidationError(Exception):
     """Raised when an image fails validation."""
 
 
+# Any buffer the image bytes can live in without being copied.
+ImageBuffer = bytes | bytearray | memoryview | mmap.mmap
+
+
 @dataclass(frozen=True)
 class PreparedImage:
     """An image ready for the Anthropic Messages API."""
 
-    image_id: str  # SHA-256 hex digest
+    image_id: str  # SHA-256 hex digest of the original bytes
     media_type: str  # e.g. "image/jpeg"
-    base64_data: str  # raw base64 (no data:image/... prefix)
-    file_name: str
+    data: ImageBuffer = field(repr=False, compare=False)
+    file_name: str = ""
+    width: int = 0  # pixels, 0 if the header could not be parsed
+    height: int = 0
+    size_bytes: int = 0
+
+    def encode_base64(self) -> str:
+        """Raw base64 of the image (no ``data:`` prefix), encoded on every call.
+
+        The result is not cached: callers build the request block from it
+        and drop it once the call returns.
+        """
+        return base64.standard_b64encode(self.data).decode("ascii")
 
 
 # ── Magic-byte signatures ────────────────────────────────────────
@@ -35,7 +72,7 @@ _MAGIC: list[tuple[bytes, str]] = [
 ]
 
 
-def _sniff_mime(data: bytes) -> str | None:
+def _sniff_mime(data: ImageBuffer) -> str | None:
     """Detect MIME type from magic bytes."""
     for magic, mime in _MAGIC:
         if data[: len(magic)] == magic:
@@ -46,61 +83,381 @@ def _sniff_mime(data: bytes) -> str | None:
     return None
 
 
-def load_image(
-    path: Path,
+def _be16(data: ImageBuffer, offset: int) -> int:
+    return int.from_bytes(data[offset : offset + 2], "big")
+
+
+def _le16(data: ImageBuffer, offset: int) -> int:
+    return int.from_bytes(data[offset : offset + 2], "little")
+
+
+def _jpeg_dimensions(data: ImageBuffer) -> tuple[int, int]:
+    """Walk JPEG segments to the first SOFn marker."""
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return 0, 0
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # standalone markers
+            i += 2
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return _be16(data, i + 7), _be16(data, i + 5)
+        seg_len = _be16(data, i + 2)
+        if seg_len < 2:
+            return 0, 0
+        i += 2 + seg_len
+    return 0, 0
+
+
+def _image_dimensions(data: ImageBuffer, mime: str) -> tuple[int, int]:
+    """Read (width, height) from the image header without decoding pixels."""
+    if mime == "image/png" and len(data) >= 24:
+        return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+    if mime == "image/gif" and len(data) >= 10:
+        return _le16(data, 6), _le16(data, 8)
+    if mime == "image/jpeg":
+        return _jpeg_dimensions(data)
+    if mime == "image/webp" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            return _le16(data, 26) & 0x3FFF, _le16(data, 28) & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return (
+                int.from_bytes(data[24:27], "little") + 1,
+                int.from_bytes(data[27:30], "little") + 1,
+            )
+    return 0, 0
+
+
+def detect_mime(head: ImageBuffer, file_name: str) -> str | None:
+    """MIME type from the leading bytes, falling back to the file extension.
+
+    *head* only needs the first 12 bytes, so uploads can be rejected while
+    they are still streaming in.
+    """
+    mime = _sniff_mime(head)
+    if mime is None:
+        mime, _ = mimetypes.guess_type(file_name)
+    return mime
+
+
+def check_mime(head: ImageBuffer, file_name: str) -> str:
+    """Return the detected MIME type or raise if it is not supported."""
+    mime = detect_mime(head, file_name)
+    if mime not in SUPPORTED_MIME_TYPES:
+        raise ImageValidationError(
+            f"Unsupported image type '{mime}' for {file_name}. "
+            f"Supported: {', '.join(sorted(SUPPORTED_MIME_TYPES))}"
+        )
+    return mime
+
+
+def prepare_image_bytes(
+    data: ImageBuffer,
+    file_name: str,
     *,
     max_mb: float = 12.0,
+    image_id: str | None = None,
 ) -> PreparedImage:
-    """Load and validate a single image file.
+    """Validate image bytes and build a ``PreparedImage`` that references them.
 
-    Returns a ``PreparedImage`` ready for the Anthropic vision block.
+    *data* is not copied.  *image_id* may carry a SHA-256 digest already
+    computed while the bytes were received, to avoid hashing them twice.
     """
-    if not path.is_file():
-        raise ImageValidationError(f"File not found: {path}")
-
-    data = path.read_bytes()
     size_mb = len(data) / (1024 * 1024)
     if size_mb > max_mb:
         raise ImageValidationError(
-            f"Image {path.name} is {size_mb:.1f} MB (limit {max_mb} MB)"
-        )
-
-    # MIME detection: magic bytes first, then extension fallback
-    mime = _sniff_mime(data)
-    if mime is None:
-        mime, _ = mimetypes.guess_type(str(path))
-    if mime not in SUPPORTED_MIME_TYPES:
-        raise ImageValidationError(
-            f"Unsupported image type '{mime}' for {path.name}. "
-            f"Supported: {', '.join(sorted(SUPPORTED_MIME_TYPES))}"
+            f"Image {file_name} is {size_mb:.1f} MB (limit {max_mb} MB)"
         )
+    mime = check_mime(data[:12], file_name)
 
-    sha = hashlib.sha256(data).hexdigest()
-    b64 = base64.standard_b64encode(data).decode("ascii")
+    sha = image_id or hashlib.sha256(data).hexdigest()
+    width, height = _image_dimensions(data, mime)
 
     return PreparedImage(
         image_id=sha,
         media_type=mime,
-        base64_data=b64,
-        file_name=path.name,
+        data=data,
+        file_name=file_name,
+        width=width,
+        height=height,
+        size_bytes=len(data),
     )
 
 
+def load_image(
+    path: Path,
+    *,
+    max_mb: float = 12.0,
+) -> PreparedImage:
+    """Load and validate a single image file.
+
+    The file is memory-mapped rather than read, so its pages are only
+    resident while they are being hashed or encoded.
+    Returns a ``PreparedImage`` ready for the Anthropic vision block.
+    """
+    if not path.is_file():
+        raise ImageValidationError(f"File not found: {path}")
+    size = path.stat().st_size
+    if size > max_mb * 1024 * 1024:
+        raise ImageValidationError(
+            f"Image {path.name} is {size / (1024 * 1024):.1f} MB (limit {max_mb} MB)"
+        )
+    return prepare_image_bytes(_map_file(path), path.name, max_mb=max_mb)
+
+
+def _map_file(path: Path) -> ImageBuffer:
+    with path.open("rb") as fh:
+        try:
+            return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return b""
+
+
 def load_images(
-    paths: list[Path],
+    sources: Sequence[Path | PreparedImage],
     *,
     max_images: int = 10,
     max_mb: float = 12.0,
 ) -> list[PreparedImage]:
     """Load and validate multiple images.
 
-    Raises ``ImageValidationError`` if count exceeds *max_images*.
+    Paths are read from disk; images that are already prepared (such as
+    streamed uploads) are passed through.  Raises ``ImageValidationError``
+    if the count exceeds *max_images*.
     """
-    if len(paths) > max_images:
+    if len(sources) > max_images:
         raise ImageValidationError(
-            f"Too many images ({len(paths)}); max allowed is {max_images}"
+            f"Too many images ({len(sources)}); max allowed is {max_images}"
         )
-    if not paths:
+    if not sources:
         raise ImageValidationError("No images provided")
 
-    return [load_image(p, max_mb=max_mb) for p in paths]
+    return [
+        src if isinstance(src, PreparedImage) else load_image(src, max_mb=max_mb)
+        for src in sources
+    ]
+
+
+# ── Preprocessing ────────────────────────────────────────────────
+
+
+def _reencode(
+    im: Any, *, max_width_px: int, max_pixels: int, grayscale: bool, quality: int
+) -> tuple[memoryview, int, int]:
+    """Resize a decoded Pillow image to the pixel budget and encode it as JPEG."""
+    from PIL import Image
+
+    width, height = im.size
+    scale = min(1.0, max_width_px / width, math.sqrt(max_pixels / (width * height)))
+    if grayscale:
+        im = im.convert("L")
+    elif im.mode not in ("L", "RGB"):
+        im = im.convert("RGB")
+    if scale < 1.0:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        im = im.resize(size, Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    im.save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getbuffer(), im.width, im.height
+
+
+def downscale_image(
+    image: PreparedImage,
+    *,
+    max_width_px: int = RECOMMENDED_MAX_WIDTH_PX,
+    max_pixels: int = IMAGE_MAX_PIXELS,
+    grayscale: bool = True,
+    quality: int = 85,
+) -> PreparedImage:
+    """Resize *image* to the pixel budget and re-encode it as JPEG.
+
+    EXIF orientation is applied first, so rotated phone photos stay upright.
+    The result keeps the original ``image_id``, so cache and coalescing
+    keys are unchanged.  The original is returned unchanged when Pillow is
+    not installed, the image is a GIF, it cannot be decoded, or
+    re-encoding would not make it smaller.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return image
+    if image.media_type == "image/gif":
+        return image
+
+    try:
+        with Image.open(io.BytesIO(image.data)) as src:
+            data, width, height = _reencode(
+                ImageOps.exif_transpose(src),
+                max_width_px=max_width_px,
+                max_pixels=max_pixels,
+                grayscale=grayscale,
+                quality=quality,
+            )
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning("Could not preprocess image %s: %s", image.image_id[:12], exc)
+        return image
+
+    if len(data) >= image.size_bytes:
+        return image
+    return PreparedImage(
+        image_id=image.image_id,
+        media_type="image/jpeg",
+        data=data,
+        file_name=image.file_name,
+        width=width,
+        height=height,
+        size_bytes=len(data),
+    )
+
+
+async def downscale_images(images: list[PreparedImage], **kwargs: Any) -> list[PreparedImage]:
+    """Run ``downscale_image`` over *images* in the default thread pool.
+
+    Pillow releases the GIL while decoding, resampling and encoding, so the
+    images are processed in parallel without blocking the event loop.
+    """
+    return list(
+        await asyncio.gather(*(asyncio.to_thread(downscale_image, img, **kwargs) for img in images))
+    )
+
+
+def tile_bands(
+    width: int, height: int, *, band_aspect: float, overlap: float, max_bands: int
+) -> list[tuple[int, int]]:
+    """Split *height* into overlapping ``(top, bottom)`` bands.
+
+    Bands are ``band_aspect`` widths tall and share ``overlap`` of their
+    height with the next band, so a row cut by one band edge appears whole
+    in the neighbouring band.  Bands grow when more than *max_bands* would
+    be needed.
+    """
+    band = max(1, round(width * band_aspect))
+    if height <= band:
+        return [(0, height)]
+    count = min(max_bands, math.ceil((height - band * overlap) / (band * (1 - overlap))))
+    band = max(band, math.ceil(height / (count - (count - 1) * overlap)))
+    step = band * (1 - overlap)
+    bands = [(round(i * step), min(height, round(i * step) + band)) for i in range(count)]
+    bands[-1] = (max(0, height - band), height)
+    return bands
+
+
+def split_image(
+    image: PreparedImage,
+    *,
+    band_aspect: float,
+    overlap: float,
+    max_bands: int,
+    max_width_px: int = RECOMMENDED_MAX_WIDTH_PX,
+    max_pixels: int = IMAGE_MAX_PIXELS,
+    grayscale: bool = True,
+    quality: int = 85,
+) -> list[PreparedImage]:
+    """Crop a tall image into overlapping horizontal bands (see ``tile_bands``).
+
+    The image is decoded once at full resolution; each band is then
+    downscaled and encoded like ``downscale_image``, so small text keeps the
+    resolution a single whole-page call would lose.  Each band's
+    ``image_id`` is derived from the original's and its position.  Returns
+    ``[image]`` when Pillow is not installed or the image cannot be decoded.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return [image]
+
+    tiles: list[PreparedImage] = []
+    try:
+        with Image.open(io.BytesIO(image.data)) as src:
+            im = ImageOps.exif_transpose(src)
+            bands = tile_bands(
+                im.width, im.height, band_aspect=band_aspect, overlap=overlap, max_bands=max_bands
+            )
+            for n, (top, bottom) in enumerate(bands):
+                data, width, height = _reencode(
+                    im.crop((0, top, im.width, bottom)),
+                    max_width_px=max_width_px,
+                    max_pixels=max_pixels,
+                    grayscale=grayscale,
+                    quality=quality,
+                )
+                tiles.append(
+                    PreparedImage(
+                        image_id=hashlib.sha256(
+                            f"{image.image_id}:{top}:{bottom}".encode()
+                        ).hexdigest(),
+                        media_type="image/jpeg",
+                        data=data,
+                        file_name=f"{image.file_name}#{n}",
+                        width=width,
+                        height=height,
+                        size_bytes=len(data),
+                    )
+                )
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning("Could not tile image %s: %s", image.image_id[:12], exc)
+        return [image]
+    return tiles
+
+
+def warn_if_pillow_missing(settings: Settings) -> None:
+    """Warn when a Pillow-backed feature is enabled but Pillow is not installed.
+
+    Downscaling, tiling and near-duplicate hashing all fall back silently
+    to a no-op without it, which is easy to miss in a slim container.
+    """
+    enabled = [
+        name
+        for name, on in (
+            ("image_downscale", settings.image_downscale),
+            ("tile_tall_images", settings.tile_tall_images),
+            ("near_duplicate_mode", settings.near_duplicate_mode != "off"),
+        )
+        if on
+    ]
+    if not enabled:
+        return
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        logger.warning(
+            "Pillow is not installed, so %s will have no effect; install labx[imaging]",
+            ", ".join(enabled),
+        )
+
+
+def dhash(image: PreparedImage) -> int | None:
+    """64-bit difference hash of *image*, or ``None`` without Pillow.
+
+    The image is reduced to a 9x8 grayscale thumbnail and each bit records
+    whether a pixel is darker than its right neighbour, so the hash
+    survives rescaling, recompression and small lighting changes.  Two
+    photos of the same page typically differ in only a few bits.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(image.data)) as src:
+            src.draft("L", (64, 64))  # JPEG: decode at reduced size
+            thumb = ImageOps.exif_transpose(src).convert("L").resize(
+                (9, 8), Image.Resampling.LANCZOS
+            )
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning("Could not hash image %s: %s", image.image_id[:12], exc)
+        return None
+    px = thumb.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] < px[row * 9 + col + 1])
+    return bits
@@ -2,14 +2,22 @@
 
 Kuwait MOH cumulative layouts often repeat rows across images.
 This module merges observations from multiple ``LabReport`` objects into
-a unified timeline keyed by (analyte_key, unit_canonical, ref_range_signature).
+a unified timeline keyed by (analyte_key, unit_canonical, ref_range_signature),
+and stitches the partial reports of one tiled image back into one report.
 """
 
 from __future__ import annotations
 
 import logging
 
-from labx.domain.models import LabAnalyte, LabReport, Observation, ReferenceRange
+from labx.domain.models import (
+    LabAnalyte,
+    LabPanel,
+    LabReport,
+    Observation,
+    PatientMeta,
+    ReferenceRange,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -31,50 +39,151 @@ def _merge_key(analyte: LabAnalyte) -> str:
     return f"{analyte.analyte_key}|{analyte.unit_canonical}|{_range_signature(analyte.ref_range)}"
 
 
-def merge_reports(reports: list[LabReport]) -> list[LabAnalyte]:
-    """Merge analytes from multiple reports into a unified timeline.
+class TimelineMerger:
+    """Incrementally maintained merged timeline.
 
-    De-duplication rules:
-      - Key by (analyte_key, unit_canonical, ref_range_signature).
-      - For each observation: if same date+value exists, keep the one from the
-        later source image (last-image-wins).
-      - Preserve ``source_image_id`` on each observation for audit.
-
-    Returns a flat list of ``LabAnalyte`` objects with merged observations.
+    Reports can be added in any order (e.g. as their extractions complete);
+    passing each report's batch position as *order* keeps last-image-wins
+    de-duplication deterministic regardless of arrival order.
     """
-    # Accumulator: merge_key → LabAnalyte (template) + obs dict
-    merged: dict[str, tuple[LabAnalyte, dict[str, Observation]]] = {}
 
-    for report in reports:
+    def __init__(self) -> None:
+        # merge_key → (template analyte, obs_key → (order, observation))
+        self._merged: dict[str, tuple[LabAnalyte, dict[str, tuple[int, Observation]]]] = {}
+        self._reports = 0
+
+    def __len__(self) -> int:
+        return len(self._merged)
+
+    def add(self, report: LabReport, order: int | None = None) -> None:
+        """Fold *report* into the timeline.
+
+        *order* defaults to the number of reports added so far.
+        """
+        if order is None:
+            order = self._reports
+        self._reports += 1
+
         for panel in report.panels:
             for analyte in panel.results:
                 key = _merge_key(analyte)
 
-                if key not in merged:
+                if key not in self._merged:
                     # Clone the analyte without observations as the template
                     template = analyte.model_copy(update={"observations": []})
-                    merged[key] = (template, {})
+                    self._merged[key] = (template, {})
 
-                _, obs_dict = merged[key]
+                _, obs_dict = self._merged[key]
 
                 for obs in analyte.observations:
                     # Tag with source image
                     obs.source_image_id = report.source_image_id
                     ok = _obs_key(obs)
                     # Last-image-wins for duplicates
-                    obs_dict[ok] = obs
+                    existing = obs_dict.get(ok)
+                    if existing is None or order >= existing[0]:
+                        obs_dict[ok] = (order, obs)
+
+    def timeline(self) -> list[LabAnalyte]:
+        """Return the merged analytes, observations sorted by date."""
+        result: list[LabAnalyte] = []
+        for template, obs_dict in self._merged.values():
+            observations = sorted((o for _, o in obs_dict.values()), key=lambda o: o.date)
+            result.append(template.model_copy(update={"observations": observations}))
+
+        logger.info(
+            "Merged %d reports → %d unique analytes, %d total observations",
+            self._reports,
+            len(result),
+            sum(len(a.observations) for a in result),
+        )
+        return result
+
+
+def merge_reports(reports: list[LabReport]) -> list[LabAnalyte]:
+    """Merge analytes from multiple reports into a unified timeline.
+
+    De-duplication rules:
+      - Key by (analyte_key, unit_canonical, ref_range_signature).
+      - For each observation: if same date+value exists, keep the one from the
+        later source image (last-image-wins).
+      - Preserve ``source_image_id`` on each observation for audit.
+
+    Returns a flat list of ``LabAnalyte`` objects with merged observations.
+    """
+    merger = TimelineMerger()
+    for report in reports:
+        merger.add(report)
+    return merger.timeline()
+
+
+def _norm(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _stitch_key(analyte: LabAnalyte) -> str:
+    """Key for matching one row across bands of the same page.
+
+    Bands are stitched before post-processing, so the merge key's
+    normalized fields are still blank; the printed name, unit and range
+    text identify the row instead.
+    """
+    name = _norm(analyte.raw_name) or analyte.analyte_key
+    return f"{name}|{_norm(analyte.raw_unit)}|{_norm(analyte.raw_range_text)}"
+
+
+# Panel name the extraction prompt uses when no header is visible.
+_UNNAMED_PANEL = "General"
 
-    # Assemble final list
-    result: list[LabAnalyte] = []
-    for template, obs_dict in merged.values():
-        observations = sorted(obs_dict.values(), key=lambda o: o.date)
-        template.observations = observations
-        result.append(template)
+
+def stitch_reports(parts: list[LabReport], *, source_image_id: str = "") -> LabReport:
+    """Stitch the reports extracted from overlapping bands of one image.
+
+    Parts must be in top-to-bottom order.  Rows repeated in the overlap
+    between bands are matched on their printed name, unit and range (see
+    ``_stitch_key``) and their observations de-duplicated on date + value;
+    the first band's reading is kept.  An
+    unnamed panel in a later band continues the previous band's last
+    panel, because a table cut by a band edge loses its header.  Patient
+    fields are taken from the first band that has them.
+    """
+    panels: dict[str, LabPanel] = {}
+    # stitch key → (analyte, obs keys already present)
+    rows: dict[str, tuple[LabAnalyte, set[str]]] = {}
+    patient: dict[str, object] = {}
+
+    for n, part in enumerate(parts):
+        for name, value in part.patient.model_dump().items():
+            if value and not patient.get(name):
+                patient[name] = value
+
+        for panel in part.panels:
+            name = panel.panel_name or _UNNAMED_PANEL
+            if n > 0 and name == _UNNAMED_PANEL and panels:
+                target = list(panels.values())[-1]
+            else:
+                target = panels.setdefault(name, LabPanel(panel_name=name))
+
+            for analyte in panel.results:
+                key = _stitch_key(analyte)
+                if key not in rows:
+                    row = analyte.model_copy(update={"observations": []})
+                    target.results.append(row)
+                    rows[key] = (row, set())
+                row, seen = rows[key]
+                for obs in analyte.observations:
+                    ok = _obs_key(obs)
+                    if ok not in seen:
+                        seen.add(ok)
+                        row.observations.append(obs)
 
     logger.info(
-        "Merged %d reports → %d unique analytes, %d total observations",
-        len(reports),
-        len(result),
-        sum(len(a.observations) for a in result),
+        "Stitched %d band(s) → %d panel(s), %d analyte(s)", len(parts), len(panels), len(rows)
+    )
+    return LabReport(
+        source_image_id=source_image_id,
+        captured_at=next((p.captured_at for p in parts if p.captured_at), None),
+        patient=PatientMeta.model_validate(patient),
+        panels=list(panels.values()),
+        raw_json={"tiles": [p.raw_json for p in parts]},
     )
-    return result
@@ -1,48 +1,110 @@
-"""Pipeline orchestrator — run_full_pipeline().
+"""Pipeline orchestrator — run_full_pipeline() / stream_pipeline().
 
 This is the single source of truth for the end-to-end extraction flow:
   1. Load & validate images
-  2. Extract lab data (concurrent, with retry)
-  3. Post-process (normalize, recompute flags)
-  4. Merge across images
+  2. Extract lab data (concurrent, with retry; per-image failures are kept
+     as ``ExtractionError`` entries instead of failing the whole batch)
+  3. Post-process (normalize, recompute flags) each report as it completes
+  4. Fold it into the incrementally merged timeline
   5. Compute trends & severity
   6. (Optional) Generate clinical summary
 """
 
 from __future__ import annotations
 
+import asyncio
+import functools
+import json
 import logging
+import time
+from collections.abc import AsyncGenerator, Callable, Sequence
+from contextlib import aclosing, nullcontext
+from dataclasses import dataclass
 from pathlib import Path
 
+from pydantic import ValidationError
+
 from labx.config.settings import Settings, get_settings
-from labx.domain.models import AnalysisReport, LabReport, LabTrend
+from labx.domain.models import AnalysisReport, ExtractionError, Flag, LabAnalyte, LabReport
 from labx.domain.severity import sort_trends_by_severity
 from labx.domain.trends import compute_trend
-from labx.pipeline.concurrency import run_concurrently
-from labx.pipeline.image_io import PreparedImage, load_images
-from labx.pipeline.merge import merge_reports
-from labx.pipeline.postprocess import postprocess_reports
+from labx.observability.metrics import (
+    inc_coalesced,
+    inc_extraction,
+    inc_preprocess_saved,
+    observe_duration,
+)
+from labx.pipeline.concurrency import (
+    DEFAULT_TENANT,
+    Priority,
+    current_priority,
+    current_tenant,
+    is_retryable_error,
+    iter_settled,
+    priority_scope,
+    tenant_scope,
+)
+from labx.pipeline.events import (
+    AnalyteExtracted,
+    CriticalDetected,
+    CriticalValue,
+    ImageExtracted,
+    ImageFailed,
+    ImageLoaded,
+    PipelineComplete,
+    PipelineEvent,
+    ReportNormalized,
+)
+from labx.pipeline.image_io import PreparedImage, downscale_images, load_images
+from labx.pipeline.merge import TimelineMerger
+from labx.pipeline.postprocess import (
+    postprocess_analyte,
+    postprocess_report,
+    postprocess_reports,
+)
+from labx.pipeline.ratelimit import estimate_image_tokens
+from labx.pipeline.singleflight import SingleFlight
 from labx.providers.anthropic_text import AnthropicTextSummarizer
 from labx.providers.anthropic_vision import AnthropicVisionExtractor
-from labx.providers.base import TextSummarizer, VisionExtractor
+from labx.providers.base import TextSummarizer, VisionExtractor, analyte_scope
+from labx.providers.cached import CachedVisionExtractor
+from labx.providers.tiled import TilingVisionExtractor, should_tile
+from labx.storage.cache import get_cache
+from labx.storage.phash import get_hash_index
 
 logger = logging.getLogger(__name__)
 
+# Process-wide: coalesces identical extractions across concurrent requests.
+_inflight: SingleFlight[LabReport] = SingleFlight()
+
+# (image index, report or None, error or None) for one finished extraction.
+_Outcome = tuple[int, LabReport | None, Exception | None]
+
+
+@dataclass(frozen=True)
+class _StreamedAnalyte:
+    index: int
+    panel_index: int
+    analyte: LabAnalyte
+
 
 async def run_full_pipeline(
-    image_paths: list[Path],
+    image_paths: Sequence[Path | PreparedImage],
     *,
     settings: Settings | None = None,
     extractor: VisionExtractor | None = None,
     summarizer: TextSummarizer | None = None,
     enable_summary: bool | None = None,
+    priority: Priority | None = None,
+    tenant: str | None = None,
 ) -> AnalysisReport:
     """Execute the full lab extraction and analysis pipeline.
 
     Parameters
     ----------
     image_paths:
-        Paths to lab report images (1–10).
+        Paths to lab report images (1–10), or images already prepared in
+        memory (such as streamed uploads).
     settings:
         Override application settings (uses env defaults if ``None``).
     extractor:
@@ -51,34 +113,131 @@ async def run_full_pipeline(
         Override the text summarizer.
     enable_summary:
         Whether to generate a clinical summary. Defaults to ``settings.enable_summary``.
+    priority:
+        Scheduling lane for this batch's provider calls. Defaults to the
+        ambient ``priority_scope`` (routine unless set).
+    tenant:
+        Tenant the provider calls are charged to for fair queueing.
+        Defaults to the ambient ``tenant_scope``.
+    """
+    async with aclosing(
+        stream_pipeline(
+            image_paths,
+            settings=settings,
+            extractor=extractor,
+            summarizer=summarizer,
+            enable_summary=enable_summary,
+            priority=priority,
+            tenant=tenant,
+        )
+    ) as events:
+        async for event in events:
+            if isinstance(event, PipelineComplete):
+                return event.analysis
+    raise RuntimeError("Pipeline ended without a result")  # pragma: no cover
+
+
+async def stream_pipeline(
+    image_paths: Sequence[Path | PreparedImage],
+    *,
+    settings: Settings | None = None,
+    extractor: VisionExtractor | None = None,
+    summarizer: TextSummarizer | None = None,
+    enable_summary: bool | None = None,
+    priority: Priority | None = None,
+    tenant: str | None = None,
+) -> AsyncGenerator[PipelineEvent, None]:
+    """Run the pipeline, yielding progress events as work completes.
+
+    Each report is post-processed and folded into the merged timeline the
+    moment its extraction finishes, so the CPU stages overlap the remaining
+    vision calls instead of waiting for the slowest one.  The final event is
+    always ``PipelineComplete``; if every image fails, the first extraction
+    error is raised after the ``ImageFailed`` events.
+
+    Parameters are the same as ``run_full_pipeline``.
     """
     s = settings or get_settings()
     if enable_summary is None:
         enable_summary = s.enable_summary
+    if priority is None:
+        priority = current_priority()
+    if tenant is None:
+        tenant = current_tenant()
 
     # ── 1. Load & validate images ────────────────────────────────
     logger.info("Loading %d image(s)…", len(image_paths))
-    images = load_images(image_paths, max_images=s.max_images, max_mb=s.max_image_mb)
+    images, savings = await _preprocess(
+        load_images(image_paths, max_images=s.max_images, max_mb=s.max_image_mb), s
+    )
+    for i, (img, (bytes_saved, tokens_saved)) in enumerate(zip(images, savings, strict=True)):
+        yield ImageLoaded(
+            index=i,
+            image_id=img.image_id,
+            file_name=img.file_name,
+            bytes_saved=bytes_saved,
+            tokens_saved=tokens_saved,
+        )
+
+    # ── 2–4. Extract, post-process and merge as each image completes ──
+    ext = _wrap_extractor(extractor or AnthropicVisionExtractor(s), s)
+    logger.info("Extracting lab data from %d image(s)…", len(images))
 
-    # ── 2. Extract (concurrent) ──────────────────────────────────
-    ext = extractor or AnthropicVisionExtractor(s)
-    logger.info("Extracting lab data from %d image(s) (concurrency=%d)…", len(images), s.concurrency)
+    merger = TimelineMerger()
+    reports: dict[int, LabReport] = {}
+    errors: dict[int, ExtractionError] = {}
+    streamed: asyncio.Queue[_Outcome | _StreamedAnalyte | None] = asyncio.Queue()
+    outcomes = _iter_outcomes(
+        ext,
+        images,
+        concurrency=s.concurrency_max,
+        priority=priority,
+        tenant=tenant,
+        on_analyte=lambda i, panel, analyte: streamed.put_nowait(
+            _StreamedAnalyte(i, panel, analyte)
+        ),
+    )
+    async with aclosing(_interleave(outcomes, streamed)) as items:
+        async for item in items:
+            if isinstance(item, _StreamedAnalyte):
+                analyte = postprocess_analyte(item.analyte)
+                yield AnalyteExtracted(
+                    index=item.index,
+                    image_id=images[item.index].image_id,
+                    panel_index=item.panel_index,
+                    analyte=analyte,
+                    critical_values=_analyte_critical_values(analyte),
+                )
+                continue
+            i, report, exc = item
+            img = images[i]
+            if exc is not None:
+                errors[i] = _describe_error(img, exc)
+                yield ImageFailed(index=i, error=errors[i])
+                continue
+            assert report is not None
+            yield ImageExtracted(index=i, image_id=img.image_id, file_name=img.file_name)
 
-    reports = await _extract_all(ext, images, concurrency=s.concurrency)
-    logger.info("Extracted %d report(s)", len(reports))
+            report = postprocess_report(report)
+            merger.add(report, order=i)
+            reports[i] = report
+            yield ReportNormalized(
+                index=i,
+                image_id=img.image_id,
+                analyte_count=sum(len(p.results) for p in report.panels),
+            )
 
-    # ── 3. Post-process ──────────────────────────────────────────
-    reports = postprocess_reports(reports)
+            critical_values = _critical_values(report)
+            if critical_values:
+                yield CriticalDetected(index=i, image_id=img.image_id, values=critical_values)
+    logger.info("Extracted %d report(s), %d failed", len(reports), len(errors))
 
-    # ── 4. Merge ─────────────────────────────────────────────────
-    merged_timeline = merge_reports(reports)
+    merged_timeline = merger.timeline()
 
     # ── 5. Trends & severity ─────────────────────────────────────
     trends = [compute_trend(a) for a in merged_timeline]
     trends = sort_trends_by_severity(trends)
 
-    from labx.domain.models import Flag
-
     critical = [
         t
         for t in trends
@@ -87,39 +246,125 @@ async def run_full_pipeline(
 
     # ── 6. Assemble report ───────────────────────────────────────
     analysis = AnalysisReport(
-        reports=reports,
+        reports=[reports[i] for i in sorted(reports)],
         merged_timeline=merged_timeline,
         trends=trends,
         critical_flags=critical,
+        errors=[errors[i] for i in sorted(errors)],
     )
 
     # ── 7. Optional summary ──────────────────────────────────────
     if enable_summary:
         logger.info("Generating clinical summary…")
         summ = summarizer or AnthropicTextSummarizer(s)
-        analysis.summary = await summ.summarize(analysis)
+        with priority_scope(priority), tenant_scope(tenant):
+            analysis.summary = await summ.summarize(analysis)
 
     logger.info(
-        "Pipeline complete: %d analytes, %d trends, %d critical",
+        "Pipeline complete: %d analytes, %d trends, %d critical, %d failed image(s)",
         len(merged_timeline),
         len(trends),
         len(critical),
+        len(errors),
     )
-    return analysis
+    yield PipelineComplete(analysis=analysis)
 
 
 async def run_extract_only(
-    image_paths: list[Path],
+    image_paths: Sequence[Path | PreparedImage],
     *,
     settings: Settings | None = None,
     extractor: VisionExtractor | None = None,
-) -> list[LabReport]:
-    """Extract and post-process without merging or trending."""
+    priority: Priority | None = None,
+    tenant: str | None = None,
+) -> tuple[list[LabReport], list[ExtractionError]]:
+    """Extract and post-process without merging or trending.
+
+    Returns the successful reports plus one ``ExtractionError`` per failed image.
+    """
     s = settings or get_settings()
-    images = load_images(image_paths, max_images=s.max_images, max_mb=s.max_image_mb)
-    ext = extractor or AnthropicVisionExtractor(s)
-    reports = await _extract_all(ext, images, concurrency=s.concurrency)
-    return postprocess_reports(reports)
+    images, _ = await _preprocess(
+        load_images(image_paths, max_images=s.max_images, max_mb=s.max_image_mb), s
+    )
+    ext = _wrap_extractor(extractor or AnthropicVisionExtractor(s), s)
+    reports, errors = await _extract_all(
+        ext,
+        images,
+        concurrency=s.concurrency_max,
+        priority=priority if priority is not None else current_priority(),
+        tenant=tenant if tenant is not None else current_tenant(),
+    )
+    return postprocess_reports(reports), errors
+
+
+async def _preprocess(
+    images: list[PreparedImage], settings: Settings
+) -> tuple[list[PreparedImage], list[tuple[int, int]]]:
+    """Downscale images for the vision call when enabled.
+
+    Returns the images to extract from plus ``(bytes_saved,
+    tokens_saved)`` per image.  The originals are not kept.
+    """
+    if not settings.image_downscale:
+        return images, [(0, 0)] * len(images)
+    # Images that will be tiled keep full resolution; each band is
+    # downscaled on its own by the tiling extractor.
+    small = iter(
+        await downscale_images(
+            [img for img in images if not should_tile(img, settings)],
+            max_width_px=settings.image_max_width_px,
+            max_pixels=settings.image_max_pixels,
+            grayscale=settings.image_grayscale,
+            quality=settings.image_jpeg_quality,
+        )
+    )
+    scaled = [img if should_tile(img, settings) else next(small) for img in images]
+    savings = []
+    for before, after in zip(images, scaled, strict=True):
+        saved = (
+            before.size_bytes - after.size_bytes,
+            estimate_image_tokens(before.width, before.height)
+            - estimate_image_tokens(after.width, after.height),
+        )
+        if after is not before:
+            logger.info(
+                "Image %s: %dx%d → %dx%d, %d bytes and ~%d tokens saved",
+                before.image_id[:12],
+                before.width,
+                before.height,
+                after.width,
+                after.height,
+                *saved,
+            )
+            inc_preprocess_saved(*saved)
+        savings.append(saved)
+    return scaled, savings
+
+
+def _wrap_extractor(extractor: VisionExtractor, settings: Settings) -> VisionExtractor:
+    """Put tiling and the shared extraction cache in front of *extractor* when enabled.
+
+    The cache sits outside the tiler, so a tiled image is cached as one
+    stitched report under its own ``image_id``.
+    """
+    if settings.tile_tall_images:
+        extractor = TilingVisionExtractor(extractor, settings)
+    cache = get_cache(settings)
+    if cache is None:
+        return extractor
+    s = settings
+    return CachedVisionExtractor(
+        extractor,
+        cache,
+        index=get_hash_index(settings),
+        mode=settings.near_duplicate_mode,
+        max_distance=settings.near_duplicate_max_distance,
+        # Downscaled images and tiled bands are prepared with these.
+        preprocessing=(
+            f"{s.image_downscale}\0{s.image_max_width_px}\0{s.image_max_pixels}"
+            f"\0{s.image_grayscale}\0{s.image_jpeg_quality}"
+        ),
+    )
 
 
 async def _extract_all(
@@ -127,7 +372,191 @@ async def _extract_all(
     images: list[PreparedImage],
     *,
     concurrency: int = 4,
-) -> list[LabReport]:
-    """Extract from all images with bounded concurrency."""
-    tasks = [lambda img=img: extractor.extract(img) for img in images]
-    return await run_concurrently(tasks, max_concurrent=concurrency)
+    priority: Priority = Priority.routine,
+    tenant: str = DEFAULT_TENANT,
+) -> tuple[list[LabReport], list[ExtractionError]]:
+    """Extract from all images; reports and errors are returned in input order."""
+    reports: dict[int, LabReport] = {}
+    errors: dict[int, ExtractionError] = {}
+    outcomes = _iter_outcomes(
+        extractor, images, concurrency=concurrency, priority=priority, tenant=tenant
+    )
+    async with aclosing(outcomes):
+        async for i, report, exc in outcomes:
+            if exc is not None:
+                errors[i] = _describe_error(images[i], exc)
+            elif report is not None:
+                reports[i] = report
+    return [reports[i] for i in sorted(reports)], [errors[i] for i in sorted(errors)]
+
+
+async def _interleave(
+    outcomes: AsyncGenerator[_Outcome, None],
+    queue: asyncio.Queue[_Outcome | _StreamedAnalyte | None],
+) -> AsyncGenerator[_Outcome | _StreamedAnalyte, None]:
+    """Yield *outcomes* merged with the analytes streamed onto *queue* meanwhile.
+
+    Outcomes go through the same queue, so an image's streamed analytes
+    always come before its outcome.  Errors raised by *outcomes* are
+    re-raised once everything queued has been yielded.
+    """
+
+    async def pump() -> None:
+        try:
+            async with aclosing(outcomes):
+                async for outcome in outcomes:
+                    queue.put_nowait(outcome)
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.ensure_future(pump())
+    try:
+        while (item := await queue.get()) is not None:
+            yield item
+        await task
+    finally:
+        task.cancel()
+
+
+async def _iter_outcomes(
+    extractor: VisionExtractor,
+    images: list[PreparedImage],
+    *,
+    concurrency: int = 4,
+    priority: Priority = Priority.routine,
+    tenant: str = DEFAULT_TENANT,
+    on_analyte: Callable[[int, int, LabAnalyte], None] | None = None,
+) -> AsyncGenerator[_Outcome, None]:
+    """Extract from all images, yielding ``(index, report, error)`` as each completes.
+
+    *concurrency* caps this batch only; provider calls across all batches
+    are throttled by the shared adaptive limiter inside the extractor.
+    *on_analyte* receives ``(index, panel index, analyte)`` for analytes
+    streamed before their report completes (see ``analyte_scope``).
+
+    Repeated images within the batch are extracted once (each position gets
+    its own copy of the report), and extractions already in flight for
+    another request are joined rather than duplicated.  Successful results
+    are cached, so retrying the request only re-extracts the failures.
+    If every image fails, the first error is raised once all have settled.
+    """
+    positions: dict[str, list[int]] = {}
+    for i, img in enumerate(images):
+        positions.setdefault(img.image_id, []).append(i)
+    if len(positions) < len(images):
+        logger.info("Skipping %d duplicate image(s) in batch", len(images) - len(positions))
+
+    groups = list(positions.values())
+    tasks = [
+        functools.partial(
+            _extract_one,
+            extractor,
+            images[group[0]],
+            priority,
+            tenant,
+            on_analyte=functools.partial(on_analyte, group[0]) if on_analyte else None,
+        )
+        for group in groups
+    ]
+
+    first_error: Exception | None = None
+    succeeded = False
+    async with aclosing(iter_settled(tasks, max_concurrent=concurrency)) as results:
+        async for result in results:
+            group = groups[result.index]
+            if result.error is not None:
+                first_error = first_error or result.error
+                for i in group:
+                    yield i, None, result.error
+                continue
+            succeeded = True
+            report = result.value
+            assert report is not None
+            for n, i in enumerate(group):
+                yield i, (report if n == 0 else report.model_copy(deep=True)), None
+
+    if not succeeded and first_error is not None:
+        raise first_error
+
+
+def _critical_values(report: LabReport) -> list[CriticalValue]:
+    """Critical observations in one post-processed report."""
+    return [
+        value
+        for panel in report.panels
+        for analyte in panel.results
+        for value in _analyte_critical_values(analyte)
+    ]
+
+
+def _analyte_critical_values(analyte: LabAnalyte) -> list[CriticalValue]:
+    """Critical observations of one post-processed analyte."""
+    return [
+        CriticalValue(
+            analyte_key=analyte.analyte_key,
+            display_name=analyte.display_name,
+            value=obs.value,
+            unit=analyte.unit_canonical or analyte.unit,
+            flag=obs.flag_computed,
+            date=obs.date,
+        )
+        for obs in analyte.observations
+        if obs.flag_computed in (Flag.critical_high, Flag.critical_low)
+    ]
+
+
+def _describe_error(image: PreparedImage, exc: Exception) -> ExtractionError:
+    """Map an extraction exception to a client-safe ``ExtractionError``."""
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        error_type, message = f"provider_http_{status}", f"Provider returned HTTP {status}"
+    elif isinstance(exc, ValidationError):
+        error_type, message = "invalid_schema", "Model output did not match the report schema"
+    elif isinstance(exc, json.JSONDecodeError | ValueError):
+        error_type, message = "invalid_json", "Model output was not valid JSON"
+    elif is_retryable_error(exc):
+        error_type, message = "provider_unavailable", "Provider could not be reached"
+    else:
+        error_type, message = "internal", "Extraction failed"
+    return ExtractionError(
+        image_id=image.image_id,
+        file_name=image.file_name,
+        error_type=error_type,
+        message=message,
+        retryable=is_retryable_error(exc),
+    )
+
+
+async def _extract_one(
+    extractor: VisionExtractor,
+    image: PreparedImage,
+    priority: Priority = Priority.routine,
+    tenant: str = DEFAULT_TENANT,
+    *,
+    on_analyte: Callable[[int, LabAnalyte], None] | None = None,
+) -> LabReport:
+    """Extract one image, sharing the call with any identical in-flight extraction.
+
+    Provider calls made for this image are scheduled in *priority*'s lane
+    and charged to *tenant*.  *on_analyte* receives analytes the extractor
+    streams; a call joined from another request streams nothing here.
+    """
+    key = f"{extractor.fingerprint or id(extractor)}:{image.image_id}"
+    start = time.perf_counter()
+    listening = analyte_scope(on_analyte) if on_analyte is not None else nullcontext()
+    try:
+        with priority_scope(priority), tenant_scope(tenant), listening:
+            report, shared = await _inflight.do(key, lambda: extractor.extract(image))
+    except Exception as exc:
+        inc_extraction(status="error")
+        # Exception text can echo model output (PHI); log the type only.
+        logger.warning(
+            "Extraction failed for image %s: %s", image.image_id[:12], type(exc).__name__
+        )
+        raise
+    inc_extraction(status="success")
+    observe_duration(time.perf_counter() - start)
+    if shared:
+        inc_coalesced()
+        return report.model_copy(deep=True)
+    return report
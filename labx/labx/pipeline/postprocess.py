@@ -218,6 +218,12 @@ def postprocess_report(report: LabReport) -> LabReport:
     return report
 
 
+def postprocess_analyte(analyte: LabAnalyte) -> LabAnalyte:
+    """Normalize one analyte and recompute its flags (e.g. as it streams in)."""
+    _normalize_analyte(analyte)
+    return analyte
+
+
 def postprocess_reports(reports: list[LabReport]) -> list[LabReport]:
     """Post-process a batch of reports."""
     return [postprocess_report(r) for r in reports]
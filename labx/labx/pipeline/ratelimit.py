@@ -0,0 +1,223 @@
+"""Provider rate limiting — token buckets for requests, input and output tokens per minute.
+
+Anthropic org limits are expressed as RPM, ITPM and OTPM.  Before each call
+the caller estimates input tokens (image + prompt) and reserves *max_tokens*
+output tokens; after the call the reservation is reconciled against the
+``usage`` block the API returns, so estimation error never accumulates.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+
+from labx.config.constants import (
+    CHARS_PER_TOKEN,
+    IMAGE_MAX_LONG_EDGE_PX,
+    IMAGE_MAX_PIXELS,
+    IMAGE_MAX_TOKENS,
+    IMAGE_PIXELS_PER_TOKEN,
+    REPORT_BASE_TOKENS,
+    REPORT_ROWS_PER_WIDTH,
+    REPORT_TOKENS_PER_ROW,
+)
+from labx.config.settings import Settings, get_settings
+from labx.observability.metrics import observe_ratelimit_wait
+from labx.pipeline.concurrency import PriorityLock
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Estimate input tokens for an image of *width* x *height* pixels."""
+    if width <= 0 or height <= 0:
+        return IMAGE_MAX_TOKENS
+    scale = min(
+        1.0,
+        IMAGE_MAX_LONG_EDGE_PX / max(width, height),
+        math.sqrt(IMAGE_MAX_PIXELS / (width * height)),
+    )
+    tokens = math.ceil((width * scale) * (height * scale) / IMAGE_PIXELS_PER_TOKEN)
+    return min(tokens, IMAGE_MAX_TOKENS)
+
+
+def estimate_report_tokens(width: int, height: int) -> int:
+    """Estimate output tokens to extract a report image of *width* x *height* pixels.
+
+    Row count scales with the page's height in page widths, so the estimate
+    holds whether or not the image was downscaled.
+    """
+    if width <= 0 or height <= 0:
+        return REPORT_BASE_TOKENS + REPORT_ROWS_PER_WIDTH * REPORT_TOKENS_PER_ROW
+    rows = math.ceil(height / width * REPORT_ROWS_PER_WIDTH)
+    return REPORT_BASE_TOKENS + rows * REPORT_TOKENS_PER_ROW
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Rough token count for *text* (chars / 3.5, rounded up)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class TokenBucket:
+    """Continuous-refill token bucket sized for one minute of budget.
+
+    ``consume`` may drive the level negative (debt) so that a single request
+    larger than the whole bucket can still proceed once the bucket is full.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self._rate = per_minute / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self._rate)
+        self._updated = now
+
+    @property
+    def level(self) -> float:
+        self._refill()
+        return self._level
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until *amount* (capped at capacity) is available."""
+        self._refill()
+        deficit = min(amount, self.capacity) - self._level
+        return max(0.0, deficit / self._rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self._level -= amount
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self._level = min(self.capacity, self._level + amount)
+
+
+@dataclass
+class Reservation:
+    """Tokens reserved for one call, to be reconciled with actual usage."""
+
+    input_tokens: int
+    output_tokens: int
+
+
+class ProviderRateLimiter:
+    """Schedule provider calls under RPM / ITPM / OTPM budgets.
+
+    A budget of 0 disables that bucket.  Callers are served one at a time,
+    in ``FairQueue`` order; the head of the queue sleeps until every bucket
+    can cover its estimate, so a large request is never starved by a stream
+    of small ones.
+    """
+
+    def __init__(
+        self,
+        *,
+        rpm: int = 0,
+        itpm: int = 0,
+        otpm: int = 0,
+        aging_s: float = 30.0,
+        tenant_weights: Mapping[str, float] | None = None,
+    ) -> None:
+        self._requests = TokenBucket(rpm) if rpm > 0 else None
+        self._input = TokenBucket(itpm) if itpm > 0 else None
+        self._output = TokenBucket(otpm) if otpm > 0 else None
+        self._aging_s = aging_s
+        self._tenant_weights = tenant_weights
+        self._lock: PriorityLock | None = None
+        self._lock_loop: asyncio.AbstractEventLoop | None = None
+
+    def _queue_lock(self) -> PriorityLock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = PriorityLock(aging_s=self._aging_s, weights=self._tenant_weights)
+            self._lock_loop = loop
+        return self._lock
+
+    def _wait_time(self, input_tokens: int, output_tokens: int) -> float:
+        waits = [0.0]
+        if self._requests is not None:
+            waits.append(self._requests.wait_time(1))
+        if self._input is not None:
+            waits.append(self._input.wait_time(input_tokens))
+        if self._output is not None:
+            waits.append(self._output.wait_time(output_tokens))
+        return max(waits)
+
+    async def reserve(self, input_tokens: int, output_tokens: int) -> Reservation:
+        """Wait until the budgets can cover the estimate, then debit them."""
+        started = time.monotonic()
+        async with self._queue_lock():
+            while (delay := self._wait_time(input_tokens, output_tokens)) > 0:
+                await asyncio.sleep(delay)
+            if self._requests is not None:
+                self._requests.consume(1)
+            if self._input is not None:
+                self._input.consume(input_tokens)
+            if self._output is not None:
+                self._output.consume(output_tokens)
+
+        waited = time.monotonic() - started
+        observe_ratelimit_wait(waited)
+        if waited > 1.0:
+            logger.info("Rate limiter delayed call by %.1fs", waited)
+        return Reservation(input_tokens, output_tokens)
+
+    def reconcile(self, reservation: Reservation, input_tokens: int, output_tokens: int) -> None:
+        """Correct the buckets once the API reports actual usage."""
+        if self._input is not None:
+            self._adjust(self._input, reservation.input_tokens - input_tokens)
+        if self._output is not None:
+            self._adjust(self._output, reservation.output_tokens - output_tokens)
+        logger.debug(
+            "Token estimate in=%d/%d out=%d/%d (estimated/actual)",
+            reservation.input_tokens,
+            input_tokens,
+            reservation.output_tokens,
+            output_tokens,
+        )
+
+    def cancel(self, reservation: Reservation) -> None:
+        """Return the output reservation of a call that produced no tokens."""
+        if self._output is not None:
+            self._output.refund(reservation.output_tokens)
+
+    @staticmethod
+    def _adjust(bucket: TokenBucket, surplus: int) -> None:
+        if surplus > 0:
+            bucket.refund(surplus)
+        elif surplus < 0:
+            bucket.consume(-surplus)
+
+
+_rate_limiter: ProviderRateLimiter | None = None
+
+
+def get_rate_limiter(settings: Settings | None = None) -> ProviderRateLimiter | None:
+    """Return the process-wide provider rate limiter, or ``None`` if no budget is set."""
+    global _rate_limiter  # noqa: PLW0603
+    if _rate_limiter is None:
+        s = settings or get_settings()
+        if not (s.rate_limit_rpm or s.rate_limit_itpm or s.rate_limit_otpm):
+            return None
+        _rate_limiter = ProviderRateLimiter(
+            rpm=s.rate_limit_rpm,
+            itpm=s.rate_limit_itpm,
+            otpm=s.rate_limit_otpm,
+            aging_s=s.priority_aging_s,
+            tenant_weights=s.tenant_weights,
+        )
+    return _rate_limiter
+
+
+def reset_rate_limiter() -> None:
+    """Tear down the shared rate limiter (useful in tests)."""
+    global _rate_limiter  # noqa: PLW0603
+    _rate_limiter = None
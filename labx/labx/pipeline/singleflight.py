@@ -0,0 +1,63 @@
+"""Single-flight coalescing — concurrent callers for the same key share one call."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Call(Generic[T]):
+    task: asyncio.Future[T]
+    followers: int = 0
+
+
+class SingleFlight(Generic[T]):
+    """Coalesce concurrent async calls that share a key.
+
+    The first caller for a key starts *fn* as a task; callers arriving while
+    it is in flight await the same task instead of starting their own.  The
+    task is shielded, so cancelling one caller never cancels the work the
+    others are waiting on.  Keys are forgotten as soon as the call finishes —
+    this is coalescing, not caching.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Run *fn* once per in-flight *key*.
+
+        Returns ``(result, shared)`` where *shared* is ``True`` if more than
+        one caller received this result; callers that mutate the result must
+        copy it when shared.
+        """
+        loop = asyncio.get_running_loop()
+        call = self._calls.get(key)
+        if call is not None and call.task.get_loop() is loop:
+            call.followers += 1
+            logger.debug("Coalescing call for %s (%d waiting)", key[:24], call.followers)
+            return await asyncio.shield(call.task), True
+
+        call = _Call(asyncio.ensure_future(fn()))
+        self._calls[key] = call
+        call.task.add_done_callback(lambda task: self._forget(key, call))
+        result = await asyncio.shield(call.task)
+        return result, call.followers > 0
+
+    def _forget(self, key: str, call: _Call[T]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the exception retrieved in case every caller was cancelled.
+        if not call.task.cancelled():
+            call.task.exception()
@@ -0,0 +1,139 @@
+"""Job worker pool — drains the job queue through the full pipeline."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from pathlib import Path
+
+from labx.config.constants import JOB_HEARTBEAT_S, JOB_LEASE_S, JOB_POLL_INTERVAL_S
+from labx.config.settings import Settings, get_settings
+from labx.pipeline.concurrency import Priority
+from labx.pipeline.image_io import ImageValidationError
+from labx.pipeline.orchestrator import run_full_pipeline
+from labx.providers.base import TextSummarizer, VisionExtractor
+from labx.storage.jobs import Job, JobStore
+
+logger = logging.getLogger(__name__)
+
+
+def job_image_paths(job_dir: Path) -> list[Path]:
+    """Upload paths for a job, in submission order.
+
+    Each upload is stored in its own numbered subdirectory so that the
+    original file name survives and duplicate names cannot collide.
+    """
+    return [f for d in sorted(job_dir.iterdir()) if d.is_dir() for f in sorted(d.iterdir())]
+
+
+class JobWorkerPool:
+    """A fixed number of asyncio workers that claim and run queued jobs.
+
+    Workers sleep until ``notify`` is called or the poll interval elapses,
+    so jobs submitted by another process are still picked up.  Idle workers
+    also requeue jobs abandoned by crashed workers and purge expired ones.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        *,
+        workers: int = 2,
+        settings: Settings | None = None,
+        extractor: VisionExtractor | None = None,
+        summarizer: TextSummarizer | None = None,
+        poll_interval_s: float = JOB_POLL_INTERVAL_S,
+    ) -> None:
+        self._store = store
+        self._workers = workers
+        self._settings = settings or get_settings()
+        self._extractor = extractor
+        self._summarizer = summarizer
+        self._poll = poll_interval_s
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task[None]] = []
+        self._last_maintenance = 0.0
+
+    def start(self) -> None:
+        logger.info("Starting %d job worker(s)", self._workers)
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"labx-job-worker-{n}")
+            for n in range(self._workers)
+        ]
+
+    async def stop(self) -> None:
+        """Cancel the workers; jobs they were running are requeued after their lease."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers after a job is submitted."""
+        self._wake.set()
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self._store.claim)
+            except Exception:
+                logger.exception("Worker %d could not claim a job", n)
+                job = None
+            if job is None:
+                await self._idle()
+                continue
+            try:
+                await self._run(job)
+            except Exception:
+                logger.exception("Worker %d could not record job %s", n, job.id[:12])
+
+    async def _idle(self) -> None:
+        now = time.monotonic()
+        if now - self._last_maintenance > JOB_LEASE_S:
+            self._last_maintenance = now
+            try:
+                await asyncio.to_thread(self._store.recover, JOB_LEASE_S)
+                await asyncio.to_thread(self._store.purge, self._settings.job_retention_s)
+            except Exception:
+                logger.exception("Job queue maintenance failed")
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._wake.wait(), self._poll)
+        self._wake.clear()
+
+    async def _run(self, job: Job) -> None:
+        logger.info("Running job %s (attempt %d)", job.id[:12], job.attempts)
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            paths = await asyncio.to_thread(job_image_paths, self._store.input_dir(job.id))
+            analysis = await run_full_pipeline(
+                paths,
+                settings=self._settings,
+                extractor=self._extractor,
+                summarizer=self._summarizer,
+                enable_summary=job.summary,
+                priority=Priority(job.priority),
+                tenant=job.tenant,
+            )
+        except ImageValidationError as exc:
+            await asyncio.to_thread(self._store.fail, job, "image_validation", str(exc))
+        except Exception as exc:
+            # Exception text can echo model output (PHI); log the type only.
+            logger.error("Job %s failed: %s", job.id[:12], type(exc).__name__)
+            await asyncio.to_thread(
+                self._store.fail, job, "internal", "An unexpected error occurred"
+            )
+        else:
+            if await asyncio.to_thread(self._store.complete, job, analysis):
+                logger.info("Job %s succeeded", job.id[:12])
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: Job) -> None:
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_S)
+            try:
+                await asyncio.to_thread(self._store.heartbeat, job)
+            except Exception:
+                logger.warning("Heartbeat failed for job %s", job.id[:12])
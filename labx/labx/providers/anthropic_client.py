@@ -15,9 +15,12 @@ def get_client(settings: Settings | None = None) -> AsyncAnthropic:
     global _client  # noqa: PLW0603
     if _client is None:
         s = settings or get_settings()
+        # SDK-level retries are disabled: ``with_retry`` owns retry policy so
+        # that back-off is shared across all in-flight calls.
         _client = AsyncAnthropic(
             api_key=s.anthropic_api_key,
             timeout=float(s.request_timeout_s),
+            max_retries=0,
         )
     return _client
 
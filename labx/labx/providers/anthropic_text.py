@@ -4,9 +4,17 @@ from __future__ import annotations
 
 import logging
 from pathlib import Path
+from typing import Any
 
 from labx.config.settings import Settings, get_settings
 from labx.domain.models import AnalysisReport
+from labx.pipeline.concurrency import (
+    AdaptiveLimiter,
+    get_backoff_gate,
+    get_limiter,
+    with_retry,
+)
+from labx.pipeline.ratelimit import ProviderRateLimiter, estimate_text_tokens, get_rate_limiter
 from labx.providers.anthropic_client import get_client
 from labx.providers.base import TextSummarizer
 
@@ -14,6 +22,8 @@ logger = logging.getLogger(__name__)
 
 _SUMMARY_PROMPT_PATH = Path(__file__).resolve().parent.parent / "prompts" / "summary.md"
 
+_MAX_TOKENS = 2048
+
 
 def _load_summary_prompt() -> str:
     if _SUMMARY_PROMPT_PATH.exists():
@@ -26,31 +36,59 @@ def _load_summary_prompt() -> str:
 
 
 class AnthropicTextSummarizer(TextSummarizer):
-    """Generate a clinical summary from an ``AnalysisReport``."""
+    """Generate a clinical summary from an ``AnalysisReport``.
+
+    Calls share the extraction calls' back-off gate, rate limiter and
+    concurrency limiter, and are retried the same way.
+    """
 
-    def __init__(self, settings: Settings | None = None) -> None:
+    def __init__(
+        self,
+        settings: Settings | None = None,
+        *,
+        limiter: AdaptiveLimiter | None = None,
+        rate_limiter: ProviderRateLimiter | None = None,
+    ) -> None:
         self._settings = settings or get_settings()
         self._prompt = _load_summary_prompt()
+        self._limiter = limiter or get_limiter(self._settings)
+        self._rate_limiter = rate_limiter or get_rate_limiter(self._settings)
+        self._gate = get_backoff_gate()
+        self._create = with_retry(self._gate)(self._attempt)
 
     async def summarize(self, report: AnalysisReport) -> str:
-        client = get_client(self._settings)
-
         # Serialize the analysis (excluding raw_json to save tokens)
         payload = report.model_dump(exclude={"reports": {"__all__": {"raw_json"}}})
+        content = f"Analyze the following lab results:\n\n{payload}"
 
-        resp = await client.messages.create(
+        resp = await self._create(
+            estimate_text_tokens(self._prompt + content),
             model=self._settings.model_text,
-            max_tokens=2048,
+            max_tokens=_MAX_TOKENS,
             temperature=0,
             system=self._prompt,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"Analyze the following lab results:\n\n{payload}",
-                }
-            ],
+            messages=[{"role": "user", "content": content}],
         )
 
-        summary = resp.content[0].text  # type: ignore[union-attr]
+        summary: str = resp.content[0].text
         logger.debug("Summary length: %d chars", len(summary))
         return summary
+
+    async def _attempt(self, input_estimate: int, **kwargs: Any) -> Any:
+        """One attempt under the shared back-off gate, rate and concurrency limits."""
+        await self._gate.wait()
+        client = get_client(self._settings)
+        reservation = None
+        if self._rate_limiter is not None:
+            reservation = await self._rate_limiter.reserve(input_estimate, kwargs["max_tokens"])
+        try:
+            async with self._limiter.slot():
+                response = await client.messages.create(**kwargs)
+        except BaseException:
+            if reservation is not None and self._rate_limiter is not None:
+                self._rate_limiter.cancel(reservation)
+            raise
+        if reservation is not None and self._rate_limiter is not None:
+            usage = response.usage
+            self._rate_limiter.reconcile(reservation, usage.input_tokens, usage.output_tokens)
+        return response
@@ -2,47 +2,225 @@
 
 from __future__ import annotations
 
+import functools
+import hashlib
 import json
 import logging
+from datetime import date
 from pathlib import Path
 from typing import Any
 
+from pydantic import ValidationError
+
+import labx
+from labx.config.constants import MIN_OUTPUT_TOKENS_PER_S
 from labx.config.settings import Settings, get_settings
-from labx.domain.models import LabReport
+from labx.domain.models import LabAnalyte, LabReport
+from labx.observability.metrics import (
+    inc_continuation,
+    inc_json_repair,
+    inc_prompt_cache_tokens,
+)
+from labx.pipeline.concurrency import (
+    AdaptiveLimiter,
+    get_backoff_gate,
+    get_limiter,
+    with_retry,
+)
 from labx.pipeline.image_io import PreparedImage
+from labx.pipeline.merge import stitch_reports
+from labx.pipeline.ratelimit import (
+    ProviderRateLimiter,
+    estimate_image_tokens,
+    estimate_report_tokens,
+    estimate_text_tokens,
+    get_rate_limiter,
+)
 from labx.providers.anthropic_client import get_client
-from labx.providers.base import VisionExtractor
+from labx.providers.base import (
+    AnalyteListener,
+    PageIdentity,
+    VisionExtractor,
+    current_analyte_listener,
+    current_column_dates,
+)
+from labx.providers.json_stream import ANALYTE_PATH, JSONStreamParser
 
 logger = logging.getLogger(__name__)
 
 _PROMPT_PATH = Path(__file__).resolve().parent.parent / "prompts" / "vision_extract.md"
+_VERIFY_PROMPT_PATH = Path(__file__).resolve().parent.parent / "prompts" / "vision_verify.md"
+_IDENTITY_PROMPT_PATH = Path(__file__).resolve().parent.parent / "prompts" / "vision_identity.md"
+_CONTINUE_PROMPT_PATH = Path(__file__).resolve().parent.parent / "prompts" / "vision_continue.md"
+_BAND_PROMPT_PATH = Path(__file__).resolve().parent.parent / "prompts" / "vision_band.md"
 
+_SYSTEM = (
+    "You are a clinical lab report extraction engine. "
+    "Output ONLY valid JSON. No markdown, no explanation."
+)
+_TOOL_SYSTEM = (
+    "You are a clinical lab report extraction engine. "
+    "Record the report by calling the record_lab_report tool exactly once."
+)
+# Last extraction rule, text mode only: a tool call has no output format to police.
+_JSON_ONLY_RULE = "9. Output ONLY valid JSON. No markdown fences, no explanation, no commentary.\n"
+_REPAIR_SYSTEM = "Fix the following broken JSON so it is valid. Output ONLY the corrected JSON."
+_VERIFY_SYSTEM = "You are a clinical lab report auditor. Answer only YES or NO."
+_IDENTITY_SYSTEM = "You are a clinical lab report reader. Output ONLY valid JSON."
 
-def _load_prompt() -> str:
-    return _PROMPT_PATH.read_text(encoding="utf-8")
-
-
-def _build_messages(image: PreparedImage, prompt: str) -> list[dict[str, Any]]:
-    """Build the Messages API ``messages`` array with an image block."""
-    return [
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": image.media_type,
-                        "data": image.base64_data,
-                    },
-                },
-                {
-                    "type": "text",
-                    "text": prompt,
-                },
-            ],
-        }
-    ]
+# Shortest prefix the API will cache (larger for some models); shorter
+# prefixes are accepted but simply not cached.
+_MIN_CACHEABLE_TOKENS = 1024
+
+
+_TOOL_NAME = "record_lab_report"
+
+# LabReport fields the pipeline fills in itself; the model is never asked for them.
+_PIPELINE_FIELDS = frozenset(
+    {"source_image_id", "captured_at", "raw_json", "flag_computed", "unit_canonical", "ref_range"}
+)
+
+
+def _model_facing(node: Any, defs: dict[str, Any]) -> Any:
+    """Inline ``$ref``s and drop titles and pipeline-only fields from a JSON schema."""
+    if isinstance(node, list):
+        return [_model_facing(item, defs) for item in node]
+    if not isinstance(node, dict):
+        return node
+    if "$ref" in node:
+        return _model_facing(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+    out: dict[str, Any] = {}
+    for key, value in node.items():
+        if key == "title":
+            continue
+        if key == "properties":
+            out[key] = {
+                name: _model_facing(prop, defs)
+                for name, prop in value.items()
+                if name not in _PIPELINE_FIELDS
+            }
+        elif key == "required":
+            out[key] = [name for name in value if name not in _PIPELINE_FIELDS]
+        else:
+            out[key] = _model_facing(value, defs)
+    return out
+
+
+@functools.cache
+def _report_tool() -> dict[str, Any]:
+    """Tool definition whose input schema is generated from ``LabReport``."""
+    schema = LabReport.model_json_schema()
+    defs = schema.pop("$defs", {})
+    return {
+        "name": _TOOL_NAME,
+        "description": "Record every lab value extracted from the report image.",
+        "input_schema": _model_facing(schema, defs),
+    }
+
+
+def _tool_input(response: Any) -> dict[str, Any] | None:
+    """The input of the report tool call in *response*, if the model made one."""
+    for block in response.content:
+        if getattr(block, "type", None) == "tool_use" and block.name == _TOOL_NAME:
+            return block.input  # type: ignore[no-any-return]
+    return None
+
+
+def _response_text(response: Any) -> str:
+    return "".join(
+        block.text for block in response.content if getattr(block, "type", "text") == "text"
+    )
+
+
+@functools.cache
+def _warn_uncacheable_prefix(model: str, tokens: int) -> None:
+    """Warn once per process (and prefix size) that prompt caching cannot apply."""
+    logger.warning(
+        "Extraction prompt prefix for %s (~%d tokens) is below the %d-token caching "
+        "minimum; prompt_cache is on but cache reads will stay at zero",
+        model,
+        tokens,
+        _MIN_CACHEABLE_TOKENS,
+    )
+
+
+def _load_prompt(*, tool_mode: bool = False) -> str:
+    prompt = _PROMPT_PATH.read_text(encoding="utf-8")
+    return prompt if tool_mode else prompt + _JSON_ONLY_RULE
+
+
+def _load_verify_prompt() -> str:
+    return _VERIFY_PROMPT_PATH.read_text(encoding="utf-8")
+
+
+def _load_identity_prompt() -> str:
+    return _IDENTITY_PROMPT_PATH.read_text(encoding="utf-8")
+
+
+def _load_continue_prompt() -> str:
+    return _CONTINUE_PROMPT_PATH.read_text(encoding="utf-8")
+
+
+def _load_band_prompt() -> str:
+    return _BAND_PROMPT_PATH.read_text(encoding="utf-8")
+
+
+def _drop_partial_analyte(data: dict[str, Any]) -> dict[str, Any]:
+    """Drop the last analyte of truncated tool input that was not streamed.
+
+    The parsed input does not show where generation stopped, so the last
+    analyte cannot be told apart from one cut short; the continuation
+    call extracts it again.
+    """
+    panels = data.get("panels")
+    if isinstance(panels, list) and panels and isinstance(panels[-1], dict):
+        results = panels[-1].get("results")
+        if isinstance(results, list) and results:
+            results.pop()
+    return data
+
+
+def _extracted_rows(parts: list[LabReport]) -> str:
+    """One line per analyte already extracted, for the continuation prompt."""
+    return "\n".join(
+        f"- {panel.panel_name or 'General'}: "
+        f"{analyte.raw_name or analyte.display_name or analyte.analyte_key}"
+        for part in parts
+        for panel in part.panels
+        for analyte in panel.results
+    )
+
+
+def _build_messages(
+    image: PreparedImage, prompt: str, *, cache_prompt: bool = False, suffix: str = ""
+) -> list[dict[str, Any]]:
+    """Build the Messages API ``messages`` array with an image block.
+
+    With *cache_prompt* the prompt comes first and carries a cache
+    breakpoint, so the system string and prompt form a prefix that is
+    identical for every image; the image follows the cached prefix.
+    A per-call *suffix* goes after the image.
+    The image is base64-encoded here; the encoded copy lives only as long
+    as the returned messages.
+    """
+    image_block = {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": image.media_type,
+            "data": image.encode_base64(),
+        },
+    }
+    if cache_prompt:
+        content = [
+            {"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}},
+            image_block,
+        ]
+    else:
+        content = [image_block, {"type": "text", "text": prompt}]
+    if suffix:
+        content.append({"type": "text", "text": suffix})
+    return [{"role": "user", "content": content}]
 
 
 def _extract_json(text: str) -> dict[str, Any]:
@@ -62,47 +240,405 @@ def _extract_json(text: str) -> dict[str, Any]:
     raise ValueError("No JSON object found in model response")
 
 
+# Truncated output is cut back only at element boundaries this many
+# containers deep (report › panels › panel › results), so a salvaged report
+# holds whole analytes and never one with half its observations.
+_SALVAGE_CUT_DEPTH = 4
+
+
+def _strip_trailing_comma(out: list[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _salvage_json(text: str, *, max_cut_depth: int = _SALVAGE_CUT_DEPTH) -> dict[str, Any] | None:
+    """Recover a JSON object from malformed model output without another call.
+
+    Skips prose and fences around the first object, drops trailing commas,
+    and, if the output stops mid-object (``max_tokens``), cuts back to the
+    last complete element no deeper than *max_cut_depth* and closes the
+    open brackets.  Returns ``None`` when nothing parseable is left.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    out: list[str] = []
+    closers: list[str] = []
+    cut: tuple[int, list[str]] | None = None
+    in_string = escaped = False
+    for ch in text[start:]:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            out.append(ch)
+            # An empty list is a valid cut; an empty object would be a blank record.
+            if ch == "[" and len(closers) <= max_cut_depth:
+                cut = (len(out), closers.copy())
+            continue
+        if ch in "}]":
+            if not closers or ch != closers[-1]:
+                return None
+            _strip_trailing_comma(out)
+            closers.pop()
+            out.append(ch)
+            if not closers:
+                break  # anything after the root object is prose
+            if len(closers) <= max_cut_depth:
+                cut = (len(out), closers.copy())
+            continue
+        if ch == ",":
+            _strip_trailing_comma(out)
+            if len(closers) <= max_cut_depth:
+                cut = (len(out), closers.copy())
+        elif ch == '"':
+            in_string = True
+        out.append(ch)
+
+    if closers:
+        if cut is None:
+            return None
+        end, closers = cut
+        del out[end:]
+        _strip_trailing_comma(out)
+        out.extend(reversed(closers))
+    try:
+        data = json.loads("".join(out))
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class _AnalyteSink:
+    """Collect a streamed response and pass each completed analyte to a listener.
+
+    The raw text is kept so a truncated response can be cut back to its
+    whole analytes.  ``reset`` starts afresh for a retried attempt;
+    analytes at positions already reported are not reported again.
+    """
+
+    def __init__(self, listener: AnalyteListener | None) -> None:
+        self._listener = listener
+        self._reported: set[tuple[str | int, ...]] = set()
+        self.reset()
+
+    def reset(self) -> None:
+        self._parser = JSONStreamParser(ANALYTE_PATH)
+        self._chunks: list[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> None:
+        self._chunks.append(chunk)
+        if self._listener is None:
+            return
+        for path, value in self._parser.feed(chunk):
+            if path in self._reported:
+                continue
+            self._reported.add(path)
+            try:
+                analyte = LabAnalyte.model_validate(value)
+            except ValidationError:
+                continue  # the final report validation will report it
+            panel_index = path[1]
+            assert isinstance(panel_index, int)
+            self._listener(panel_index, analyte)
+
+
 class AnthropicVisionExtractor(VisionExtractor):
     """Extract lab data from a single image using Claude Vision."""
 
-    def __init__(self, settings: Settings | None = None) -> None:
+    def __init__(
+        self,
+        settings: Settings | None = None,
+        *,
+        limiter: AdaptiveLimiter | None = None,
+        rate_limiter: ProviderRateLimiter | None = None,
+    ) -> None:
         self._settings = settings or get_settings()
-        self._prompt = _load_prompt()
+        self._prompt = _load_prompt(tool_mode=self._tool_mode)
+        self._verify_prompt = _load_verify_prompt()
+        self._identity_prompt = _load_identity_prompt()
+        self._continue_prompt = _load_continue_prompt()
+        self._band_prompt = _load_band_prompt()
+        self._limiter = limiter or get_limiter(self._settings)
+        self._rate_limiter = rate_limiter or get_rate_limiter(self._settings)
+        self._gate = get_backoff_gate()
+        self._create_with_retry = with_retry(self._gate)(self._attempt)
+        system, tool_kwargs = self._request_prefix()
+        self._prefix_tokens = estimate_text_tokens(
+            system + self._prompt + json.dumps(tool_kwargs.get("tools", []))
+        )
+        if self._settings.prompt_cache and self._prefix_tokens < _MIN_CACHEABLE_TOKENS:
+            _warn_uncacheable_prefix(self._settings.model_vision, self._prefix_tokens)
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of labx version, vision model id, output mode, system and extraction prompts."""
+        system, tool_kwargs = self._request_prefix()
+        prompt = "\0".join([system, self._prompt, self._band_prompt, self._continue_prompt])
+        if tool_kwargs:
+            prompt += json.dumps(tool_kwargs, sort_keys=True)
+        prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+        digest = hashlib.sha256(
+            f"{labx.__version__}\0{self._settings.model_vision}\0{prompt_hash}".encode()
+        ).hexdigest()
+        return digest[:16]
+
+    @property
+    def _tool_mode(self) -> bool:
+        return self._settings.vision_output_mode == "tool"
+
+    def _request_prefix(self) -> tuple[str, dict[str, Any]]:
+        """System string and tool arguments shared by every extraction call."""
+        if not self._tool_mode:
+            return _SYSTEM, {}
+        return _TOOL_SYSTEM, {
+            "tools": [_report_tool()],
+            "tool_choice": {"type": "tool", "name": _TOOL_NAME},
+        }
 
     async def extract(self, image: PreparedImage) -> LabReport:
-        client = get_client(self._settings)
-        messages = _build_messages(image, self._prompt)
+        """Extract *image*, continuing in follow-up calls if output is cut off.
+
+        ``max_tokens`` is sized from the page shape, so dense reports get
+        room up front.  When a response still stops at ``max_tokens``, the
+        complete analytes are kept and up to ``vision_max_continuations``
+        further calls extract only the rows not yet listed; the parts are
+        stitched like the bands of a tiled image.
+        """
+        s = self._settings
+        max_tokens = min(
+            max(estimate_report_tokens(image.width, image.height), s.vision_output_tokens_min),
+            s.vision_output_tokens_max,
+        )
+        parts: list[LabReport] = []
+        for _ in range(s.vision_max_continuations + 1):
+            report, truncated = await self._extract_pass(image, max_tokens, parts)
+            parts.append(report)
+            if not truncated:
+                if len(parts) > 1:
+                    inc_continuation("complete")
+                break
+            logger.warning(
+                "Extraction of image %s hit max_tokens=%d after %d analyte(s)",
+                image.image_id[:12],
+                max_tokens,
+                sum(len(p.results) for part in parts for p in part.panels),
+            )
+            max_tokens = s.vision_output_tokens_max
+        else:
+            inc_continuation("incomplete")
 
-        response = await client.messages.create(
+        if len(parts) == 1:
+            return parts[0]
+        report = stitch_reports(parts, source_image_id=image.image_id)
+        report.raw_json = {"continuations": [p.raw_json for p in parts]}
+        return report
+
+    async def _extract_pass(
+        self, image: PreparedImage, max_tokens: int, earlier: list[LabReport]
+    ) -> tuple[LabReport, bool]:
+        """One extraction call; returns the report and whether it was truncated.
+
+        A truncated response keeps only its complete analytes.  With
+        *earlier* parts, the call asks only for rows they do not contain.
+        A band of a tiled page is told the column dates from the page header.
+        """
+        system, tool_kwargs = self._request_prefix()
+        suffix = self._continue_prompt + _extracted_rows(earlier) if earlier else ""
+        column_dates = current_column_dates()
+        if column_dates:
+            dates = ", ".join(d.isoformat() for d in column_dates)
+            suffix = f"{self._band_prompt}{dates}\n\n{suffix}"
+        input_estimate = (
+            estimate_image_tokens(image.width, image.height)
+            + self._prefix_tokens
+            + estimate_text_tokens(suffix)
+        )
+        sink = _AnalyteSink(current_analyte_listener()) if self._settings.vision_streaming else None
+
+        response = await self._create(
+            input_estimate,
+            sink=sink,
             model=self._settings.model_vision,
-            max_tokens=4096,
+            max_tokens=max_tokens,
             temperature=0,
-            system="You are a clinical lab report extraction engine. Output ONLY valid JSON. No markdown, no explanation.",
-            messages=messages,
+            system=system,
+            # Built inline so the base64 payload is released when the call
+            # returns rather than held through parsing and repair.
+            messages=_build_messages(
+                image, self._prompt, cache_prompt=self._settings.prompt_cache, suffix=suffix
+            ),
+            **tool_kwargs,
         )
+        truncated = getattr(response, "stop_reason", None) == "max_tokens"
 
-        raw_text = response.content[0].text  # type: ignore[union-attr]
-        logger.debug("Vision raw response length: %d chars", len(raw_text))
+        data = _tool_input(response) if self._tool_mode else None
+        if data is not None and truncated:
+            # The stream shows exactly where output stopped; without it the
+            # last analyte has to be assumed cut short.
+            data = (_salvage_json(sink.text) or {}) if sink else _drop_partial_analyte(data)
+        elif data is None:
+            raw_text = _response_text(response)
+            logger.debug("Vision raw response length: %d chars", len(raw_text))
+            if truncated:
+                # Cut off mid-document: keep whole analytes; a model repair
+                # cannot recover rows that were never generated.
+                data = _salvage_json(raw_text) or {}
+            else:
+                data = await self._parse_text(raw_text)
 
+        report = LabReport.model_validate(data)
+        report.source_image_id = image.image_id
+        report.raw_json = data
+        return report, truncated
+
+    async def _parse_text(self, raw_text: str) -> dict[str, Any]:
+        """Parse a complete text response, salvaging or repairing malformed JSON."""
         try:
-            data = _extract_json(raw_text)
+            return _extract_json(raw_text)
         except (json.JSONDecodeError, ValueError) as exc:
+            data = _salvage_json(raw_text)
+            if data is not None:
+                logger.warning("JSON parse failed, salvaged locally: %s", exc)
+                inc_json_repair(self._settings.vision_output_mode, "local")
+                return data
             logger.warning("JSON parse failed, attempting repair pass: %s", exc)
-            data = await self._repair_json(raw_text)
+            inc_json_repair(self._settings.vision_output_mode, "model")
+            return await self._repair_json(raw_text)
 
-        report = LabReport.model_validate(data)
-        report.source_image_id = image.image_id
-        report.raw_json = data
-        return report
+    async def read_identity(self, image: PreparedImage) -> PageIdentity | None:
+        """Ask the vision model for the MRN and collection dates printed on *image*.
+
+        Returns ``None`` if the answer is not a well-formed identity, so an
+        unreadable page never matches an earlier extraction.
+        """
+        response = await self._create(
+            estimate_image_tokens(image.width, image.height)
+            + estimate_text_tokens(_IDENTITY_SYSTEM + self._identity_prompt),
+            model=self._settings.model_vision,
+            max_tokens=256,
+            temperature=0,
+            system=_IDENTITY_SYSTEM,
+            messages=_build_messages(image, self._identity_prompt),
+        )
+        try:
+            data = _extract_json(_response_text(response))
+            return PageIdentity(
+                patient_id=str(data.get("mrn") or ""),
+                dates=frozenset(date.fromisoformat(d) for d in data.get("dates") or []),
+            )
+        except (json.JSONDecodeError, ValueError, TypeError) as exc:
+            logger.warning("Unreadable page identity: %s", exc)
+            return None
+
+    async def verify(self, image: PreparedImage, report: LabReport) -> bool:
+        """Ask the vision model whether *report* matches *image* (a one-word answer).
+
+        Far cheaper than a fresh extraction: the output is a single token
+        instead of the full report JSON.
+        """
+        extraction = report.model_dump_json(
+            include={"patient", "panels"}, exclude_defaults=True
+        )
+        prompt = self._verify_prompt + extraction
+        response = await self._create(
+            estimate_image_tokens(image.width, image.height)
+            + estimate_text_tokens(_VERIFY_SYSTEM + prompt),
+            model=self._settings.model_vision,
+            max_tokens=4,
+            temperature=0,
+            system=_VERIFY_SYSTEM,
+            messages=_build_messages(image, prompt),
+        )
+        return _response_text(response).strip().upper().startswith("YES")
+
+    async def _create(
+        self, input_estimate: int, *, sink: _AnalyteSink | None = None, **kwargs: Any
+    ) -> Any:
+        """Issue one Messages API call, retrying transient errors.
+
+        With a *sink* the response is streamed and fed to it as it arrives.
+        """
+        return await self._create_with_retry(input_estimate, sink=sink, **kwargs)
+
+    async def _attempt(
+        self, input_estimate: int, *, sink: _AnalyteSink | None = None, **kwargs: Any
+    ) -> Any:
+        """One attempt under the shared back-off gate, rate and concurrency limits.
+
+        Token budget is reserved before a concurrency slot is taken, so calls
+        waiting on the rate limiter never hold a slot.
+        """
+        await self._gate.wait()
+        client = get_client(self._settings)
+        reservation = None
+        if self._rate_limiter is not None:
+            reservation = await self._rate_limiter.reserve(input_estimate, kwargs["max_tokens"])
+        try:
+            async with self._limiter.slot():
+                if sink is None:
+                    # The whole body arrives at the end, so allow for the
+                    # slowest generation of max_tokens.
+                    timeout = (
+                        self._settings.request_timeout_s
+                        + kwargs["max_tokens"] / MIN_OUTPUT_TOKENS_PER_S
+                    )
+                    response = await client.messages.create(**kwargs, timeout=timeout)
+                else:
+                    response = await self._stream(client, sink, kwargs)
+        except BaseException:
+            if reservation is not None and self._rate_limiter is not None:
+                self._rate_limiter.cancel(reservation)
+            raise
+        usage = response.usage
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        if cache_read or cache_write:
+            logger.debug("Prompt cache: %d tokens read, %d written", cache_read, cache_write)
+            inc_prompt_cache_tokens(kwargs["model"], cache_read, cache_write)
+        if reservation is not None and self._rate_limiter is not None:
+            # Cache reads do not count towards the input-token rate limit;
+            # cache writes do.
+            self._rate_limiter.reconcile(
+                reservation, usage.input_tokens + cache_write, usage.output_tokens
+            )
+        return response
+
+    @staticmethod
+    async def _stream(client: Any, sink: _AnalyteSink, kwargs: dict[str, Any]) -> Any:
+        """Stream one call, feeding text and tool-input deltas to *sink*."""
+        sink.reset()
+        async with client.messages.stream(**kwargs) as stream:
+            async for event in stream:
+                if event.type != "content_block_delta":
+                    continue
+                if event.delta.type == "text_delta":
+                    sink.feed(event.delta.text)
+                elif event.delta.type == "input_json_delta":
+                    sink.feed(event.delta.partial_json)
+            return await stream.get_final_message()
 
     async def _repair_json(self, broken: str) -> dict[str, Any]:
         """Ask the model to fix malformed JSON output."""
-        client = get_client(self._settings)
-        resp = await client.messages.create(
+        resp = await self._create(
+            estimate_text_tokens(_REPAIR_SYSTEM + broken),
             model=self._settings.model_text,
             max_tokens=4096,
             temperature=0,
-            system="Fix the following broken JSON so it is valid. Output ONLY the corrected JSON.",
+            system=_REPAIR_SYSTEM,
             messages=[{"role": "user", "content": broken}],
         )
-        return json.loads(resp.content[0].text)  # type: ignore[union-attr, no-any-return]
+        return json.loads(_response_text(resp))  # type: ignore[no-any-return]
@@ -3,18 +3,105 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import date
 
-from labx.domain.models import AnalysisReport, LabReport
+from labx.domain.models import AnalysisReport, LabAnalyte, LabReport
 from labx.pipeline.image_io import PreparedImage
 
+# Called with (panel index, analyte) for each analyte completed mid-response.
+AnalyteListener = Callable[[int, LabAnalyte], None]
+
+_analyte_listener: ContextVar[AnalyteListener | None] = ContextVar(
+    "labx_analyte_listener", default=None
+)
+
+
+def current_analyte_listener() -> AnalyteListener | None:
+    return _analyte_listener.get()
+
+
+@contextmanager
+def analyte_scope(listener: AnalyteListener) -> Iterator[None]:
+    """Hand analytes to *listener* as extractions in this context stream them.
+
+    Extractors that stream their response call the listener once per
+    analyte, before the report is complete.  Streamed analytes are
+    provisional: the returned ``LabReport`` is authoritative, and an
+    extractor that does not stream (or a cache hit) never calls it.
+    """
+    token = _analyte_listener.set(listener)
+    try:
+        yield
+    finally:
+        _analyte_listener.reset(token)
+
+
+_column_dates: ContextVar[tuple[date, ...]] = ContextVar("labx_column_dates", default=())
+
+
+def current_column_dates() -> tuple[date, ...]:
+    return _column_dates.get()
+
+
+@contextmanager
+def column_dates_scope(dates: Sequence[date]) -> Iterator[None]:
+    """Tell extractions in this context the dates heading their result columns.
+
+    Used for the lower bands of a tiled page, which are cut off from the
+    header row that prints the dates; *dates* are left to right.
+    """
+    token = _column_dates.set(tuple(dates))
+    try:
+        yield
+    finally:
+        _column_dates.reset(token)
+
+
+@dataclass(frozen=True)
+class PageIdentity:
+    """Identifiers printed on a report page, read without extracting its values."""
+
+    patient_id: str = ""  # MRN or equivalent, as printed
+    dates: frozenset[date] = frozenset()  # collection dates of the result columns
+
 
 class VisionExtractor(ABC):
     """Takes one or more images and returns a validated ``LabReport``."""
 
+    @property
+    def fingerprint(self) -> str | None:
+        """Identify the extraction configuration (model, prompt) for caching.
+
+        Extractors returning ``None`` are never cached.
+        """
+        return None
+
     @abstractmethod
     async def extract(self, image: PreparedImage) -> LabReport:
         """Extract lab data from a single image."""
 
+    async def read_identity(self, image: PreparedImage) -> PageIdentity | None:
+        """Read the patient identifier and collection dates printed on *image*.
+
+        A near-duplicate's extraction is only considered when these match
+        it exactly: pages on the same template hash alike whoever the
+        patient is.  Extractors that cannot read them return ``None``.
+        """
+        return None
+
+    async def verify(self, image: PreparedImage, report: LabReport) -> bool:
+        """Check that *report* is a faithful extraction of *image*.
+
+        Used before reusing the extraction of a near-duplicate image, after
+        ``read_identity`` has matched it.  Extractors that cannot check
+        return ``False``.
+        """
+        return False
+
     async def extract_many(self, images: list[PreparedImage]) -> list[LabReport]:
         """Default: sequential extraction. Override for batch support."""
         return [await self.extract(img) for img in images]
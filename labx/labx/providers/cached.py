@@ -0,0 +1,175 @@
+"""Caching extractor — serve repeat and near-duplicate images from the extraction cache."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from typing import Literal
+
+from labx.domain.models import LabReport
+from labx.observability.metrics import inc_cache_lookup
+from labx.pipeline.concurrency import current_tenant
+from labx.pipeline.image_io import PreparedImage, dhash
+from labx.providers.base import PageIdentity, VisionExtractor
+from labx.storage.cache import TieredCache
+from labx.storage.phash import HashIndex
+
+logger = logging.getLogger(__name__)
+
+# Strong references to in-flight sweep tasks so they are not garbage-collected.
+_background: set[asyncio.Task[int]] = set()
+
+# Near-duplicate candidates tried per image, nearest first.
+_MAX_CANDIDATES = 3
+
+
+def _normalize_id(value: str) -> str:
+    return "".join(value.split()).casefold()
+
+
+def _identity_matches(page: PageIdentity, report: LabReport) -> bool:
+    """True if *page* shows exactly the patient identifier and dates of *report*.
+
+    Both must agree (a field missing on one side but not the other is a
+    mismatch), and at least one of them must be present to compare.
+    """
+    patient_id = _normalize_id(report.patient.mrn)
+    dates = {
+        obs.date
+        for panel in report.panels
+        for analyte in panel.results
+        for obs in analyte.observations
+    }
+    if not patient_id and not dates:
+        return False
+    return patient_id == _normalize_id(page.patient_id) and dates == page.dates
+
+
+class CachedVisionExtractor(VisionExtractor):
+    """Wrap another ``VisionExtractor`` with a read-through ``TieredCache``.
+
+    Entries are keyed on ``PreparedImage.image_id`` and stamped with the
+    wrapped extractor's fingerprint combined with *preprocessing*, a
+    description of how images were prepared before they reached it (the
+    ``image_id`` survives downscaling); extractors without a fingerprint
+    bypass the cache.  The first lookup for a fingerprint schedules a background
+    sweep of stale persistent entries.
+
+    With a perceptual-hash *index* (``"verify"`` mode), an exact miss is
+    matched against the same tenant's earlier images within *max_distance*
+    bits; the index forgets images as the cache drops them.  A dHash mostly
+    captures page layout, so two patients' reports on one template hash
+    alike: a near-duplicate's extraction is only reused when the patient
+    identifier and collection dates read off the new page
+    (``read_identity``) match it exactly, and ``verify`` then confirms
+    the values.
+    """
+
+    def __init__(
+        self,
+        inner: VisionExtractor,
+        cache: TieredCache,
+        *,
+        index: HashIndex | None = None,
+        mode: Literal["off", "verify"] = "off",
+        max_distance: int = 6,
+        preprocessing: str = "",
+    ) -> None:
+        self._inner = inner
+        self._cache = cache
+        self._preprocessing = preprocessing
+        self._index = index if mode != "off" else None
+        self._max_distance = max_distance
+        if self._index is not None:
+            cache.set_remove_listener(self._index.remove)
+
+    @property
+    def fingerprint(self) -> str | None:
+        inner = self._inner.fingerprint
+        if inner is None or not self._preprocessing:
+            return inner
+        return hashlib.sha256(f"{inner}\0{self._preprocessing}".encode()).hexdigest()[:16]
+
+    async def extract(self, image: PreparedImage) -> LabReport:
+        fingerprint = self.fingerprint
+        if fingerprint is None:
+            return await self._inner.extract(image)
+
+        if self._cache.claim_sweep(fingerprint):
+            logger.info("Extraction cache fingerprint %s", fingerprint)
+            task = asyncio.create_task(asyncio.to_thread(self._cache.purge_stale, fingerprint))
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+
+        cached = await asyncio.to_thread(self._cache.get, image.image_id, fingerprint)
+        if cached is not None:
+            logger.info("Cache hit for image %s", image.image_id[:12])
+            return cached
+
+        phash = None
+        if self._index is not None:
+            phash = await asyncio.to_thread(dhash, image)
+            if phash is not None:
+                report = await self._near_duplicate(image, fingerprint, phash)
+                if report is not None:
+                    return report
+
+        report = await self._inner.extract(image)
+        await asyncio.to_thread(self._cache.put, image.image_id, fingerprint, report)
+        if self._index is not None and phash is not None:
+            await asyncio.to_thread(
+                self._index.add, image.image_id, phash, tenant=current_tenant()
+            )
+        return report
+
+    async def _near_duplicate(
+        self, image: PreparedImage, fingerprint: str, phash: int
+    ) -> LabReport | None:
+        """Reuse the extraction of a near-duplicate image, if one is accepted."""
+        assert self._index is not None
+        tenant = current_tenant()
+        matches = await asyncio.to_thread(
+            self._index.search, phash, self._max_distance, tenant=tenant
+        )
+        identity: PageIdentity | None = None
+        for distance, key in matches[:_MAX_CANDIDATES]:
+            if key == image.image_id:
+                continue
+            earlier = await asyncio.to_thread(self._cache.get, key, fingerprint)
+            if earlier is None:
+                continue
+            if identity is None:
+                identity = await self._inner.read_identity(image)
+                if identity is None:
+                    break
+            if not _identity_matches(identity, earlier):
+                logger.info(
+                    "Near-duplicate %s of image %s rejected: patient or dates differ",
+                    key[:12],
+                    image.image_id[:12],
+                )
+                inc_cache_lookup(tier="near_duplicate", result="rejected")
+                continue
+            if not await self._inner.verify(image, earlier):
+                logger.info(
+                    "Near-duplicate %s of image %s rejected by verification",
+                    key[:12],
+                    image.image_id[:12],
+                )
+                inc_cache_lookup(tier="near_duplicate", result="rejected")
+                continue
+
+            logger.info(
+                "Image %s reuses near-duplicate %s (distance %d)",
+                image.image_id[:12],
+                key[:12],
+                distance,
+            )
+            inc_cache_lookup(tier="near_duplicate", result="hit")
+            report = earlier.model_copy(deep=True, update={"source_image_id": image.image_id})
+            await asyncio.to_thread(self._cache.put, image.image_id, fingerprint, report)
+            await asyncio.to_thread(self._index.add, image.image_id, phash, tenant=tenant)
+            return report
+        inc_cache_lookup(tier="near_duplicate", result="miss")
+        return None
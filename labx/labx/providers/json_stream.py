@@ -0,0 +1,125 @@
+"""Incremental JSON scanning for streamed model output.
+
+``JSONStreamParser`` is fed the response text delta by delta and returns
+each object or array at a chosen path as soon as its closing bracket
+arrives, while the rest of the document is still being generated.  It only
+tracks structure (brackets, strings, keys and array positions); completed
+values are decoded with ``json.loads``.  The final, authoritative parse of
+the whole response is left to the caller.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+from dataclasses import dataclass
+from typing import Any
+
+PathPart = str | int
+
+# ``None`` in a pattern matches any array index.
+ANALYTE_PATH: tuple[str | None, ...] = ("panels", None, "results", None)
+
+
+@dataclass
+class _Frame:
+    closer: str
+    start: int
+    path: tuple[PathPart, ...]
+    key: str | None = None
+    expect_key: bool = False
+    index: int = 0
+
+
+class JSONStreamParser:
+    """Return values completed at *pattern* as the document streams in.
+
+    Text before the first ``{`` (prose, a code fence) and after the root
+    object closes is ignored.
+    """
+
+    def __init__(self, pattern: tuple[str | None, ...] = ANALYTE_PATH) -> None:
+        self._pattern = pattern
+        self._buf = ""
+        self._stack: list[_Frame] = []
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+
+    def feed(self, chunk: str) -> list[tuple[tuple[PathPart, ...], Any]]:
+        """Consume *chunk*; return ``(path, value)`` for each value it completed."""
+        if self._done:
+            return []
+        if not self._started:
+            start = chunk.find("{")
+            if start < 0:
+                return []
+            chunk = chunk[start:]
+            self._started = True
+
+        found: list[tuple[tuple[PathPart, ...], Any]] = []
+        offset = len(self._buf)
+        self._buf += chunk
+        for pos in range(offset, len(self._buf)):
+            ch = self._buf[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(pos)
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch in "{[":
+                path = self._stack[-1].path + (self._child(),) if self._stack else ()
+                self._stack.append(
+                    _Frame("}" if ch == "{" else "]", pos, path, expect_key=ch == "{")
+                )
+            elif ch in "}]":
+                if not self._stack:
+                    break
+                frame = self._stack.pop()
+                if self._matches(frame.path):
+                    # A value that does not decode is left to the final parse.
+                    with contextlib.suppress(json.JSONDecodeError):
+                        found.append((frame.path, json.loads(self._buf[frame.start : pos + 1])))
+                if not self._stack:
+                    self._done = True
+                    break
+            elif ch == "," and self._stack:
+                top = self._stack[-1]
+                if top.closer == "]":
+                    top.index += 1
+                else:
+                    top.expect_key = True
+            elif ch == ":" and self._stack:
+                self._stack[-1].expect_key = False
+        return found
+
+    def _child(self) -> PathPart:
+        top = self._stack[-1]
+        if top.closer == "]":
+            return top.index
+        return top.key if top.key is not None else ""
+
+    def _end_string(self, end: int) -> None:
+        top = self._stack[-1] if self._stack else None
+        if top is not None and top.closer == "}" and top.expect_key:
+            try:
+                top.key = json.loads(self._buf[self._string_start : end + 1])
+            except json.JSONDecodeError:
+                top.key = ""
+
+    def _matches(self, path: tuple[PathPart, ...]) -> bool:
+        if len(path) != len(self._pattern):
+            return False
+        return all(
+            isinstance(part, int) if want is None else part == want
+            for part, want in zip(path, self._pattern, strict=True)
+        )
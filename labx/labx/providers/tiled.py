@@ -0,0 +1,108 @@
+"""Tiling extractor — split very tall images into bands and stitch the results."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from datetime import date
+
+from labx.config.settings import Settings
+from labx.domain.models import LabReport
+from labx.pipeline.image_io import PreparedImage, split_image
+from labx.pipeline.merge import stitch_reports
+from labx.providers.base import PageIdentity, VisionExtractor, column_dates_scope
+
+logger = logging.getLogger(__name__)
+
+
+def should_tile(image: PreparedImage, settings: Settings) -> bool:
+    """True if *image* is tall enough to be extracted in bands."""
+    return (
+        settings.tile_tall_images
+        and image.width > 0
+        and image.height / image.width > settings.tile_min_aspect
+    )
+
+
+def _column_dates(report: LabReport) -> list[date]:
+    """Observation dates of *report* in order of first appearance (column order)."""
+    seen: dict[date, None] = {}
+    for panel in report.panels:
+        for analyte in panel.results:
+            for obs in analyte.observations:
+                seen.setdefault(obs.date)
+    return list(seen)
+
+
+class TilingVisionExtractor(VisionExtractor):
+    """Wrap another ``VisionExtractor`` to extract tall images band by band.
+
+    One very tall screenshot (a long cumulative report) either overflows the
+    output budget of a single call or is shrunk until small text is lost.
+    Images taller than ``tile_min_aspect`` widths are cropped at full
+    resolution into overlapping bands and extracted through the wrapped
+    extractor, and the partial reports are stitched with
+    ``stitch_reports``.  Only the first band shows the header row with the
+    column dates, so it is extracted first and its dates are handed to the
+    remaining bands (see ``column_dates_scope``), which run concurrently.
+    If any band fails the image fails, rather than silently dropping its
+    rows.
+    """
+
+    def __init__(self, inner: VisionExtractor, settings: Settings) -> None:
+        self._inner = inner
+        self._settings = settings
+
+    @property
+    def fingerprint(self) -> str | None:
+        inner = self._inner.fingerprint
+        if inner is None or not self._settings.tile_tall_images:
+            return inner
+        s = self._settings
+        params = f"{inner}\0{s.tile_min_aspect}\0{s.tile_band_aspect}\0{s.tile_overlap}"
+        return hashlib.sha256(f"{params}\0{s.tile_max_bands}".encode()).hexdigest()[:16]
+
+    async def read_identity(self, image: PreparedImage) -> PageIdentity | None:
+        if should_tile(image, self._settings):
+            return None
+        return await self._inner.read_identity(image)
+
+    async def verify(self, image: PreparedImage, report: LabReport) -> bool:
+        # A whole tall page is too small to check digit by digit.
+        if should_tile(image, self._settings):
+            return False
+        return await self._inner.verify(image, report)
+
+    async def extract(self, image: PreparedImage) -> LabReport:
+        if not should_tile(image, self._settings):
+            return await self._inner.extract(image)
+
+        s = self._settings
+        tiles = await asyncio.to_thread(
+            split_image,
+            image,
+            band_aspect=s.tile_band_aspect,
+            overlap=s.tile_overlap,
+            max_bands=s.tile_max_bands,
+            max_width_px=s.image_max_width_px,
+            max_pixels=s.image_max_pixels,
+            grayscale=s.image_grayscale,
+            quality=s.image_jpeg_quality,
+        )
+        if len(tiles) == 1:
+            report = await self._inner.extract(tiles[0])
+            report.source_image_id = image.image_id
+            return report
+
+        logger.info("Extracting image %s in %d bands", image.image_id[:12], len(tiles))
+        first = await self._inner.extract(tiles[0])
+        with column_dates_scope(_column_dates(first)):
+            tasks = [asyncio.ensure_future(self._inner.extract(tile)) for tile in tiles[1:]]
+        try:
+            rest = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return stitch_reports([first, *rest], source_image_id=image.image_id)
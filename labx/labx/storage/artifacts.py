@@ -7,9 +7,11 @@ import logging
 from datetime import datetime, timezone
 from pathlib import Path
 
+from labx.storage.sqlite import DATA_DIR
+
 logger = logging.getLogger(__name__)
 
-_ARTIFACTS_DIR = Path.home() / ".labx" / "artifacts"
+_ARTIFACTS_DIR = DATA_DIR / "artifacts"
 
 
 class ArtifactStore:
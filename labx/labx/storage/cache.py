@@ -1,60 +1,641 @@
-"""Optional disk/redis cache keyed by image SHA-256 hash.
+"""Tiered extraction cache keyed by image SHA-256 hash.
 
-When enabled, extraction results for a given image are cached so that
-re-uploading the same image skips the API call entirely.
+Extraction results for a given image are cached so that re-uploading the
+same image skips the API call entirely.  Lookups go through a bounded
+in-process LRU first and fall back to a persistent store on disk — a
+SQLite database in WAL mode by default, or the legacy one-file-per-image
+``DiskCache``.
+
+Every entry carries the fingerprint (labx version, model id, prompt hash)
+of the extractor that produced it.  Entries with a different fingerprint
+are treated as stale and dropped on read, unless the fingerprint has been
+declared compatible, in which case they are re-stamped and served.
 """
 
 from __future__ import annotations
 
+import contextlib
 import json
 import logging
+import os
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
 from pathlib import Path
 
+from labx.config.settings import Settings, get_settings
 from labx.domain.models import LabReport
+from labx.observability.metrics import inc_cache_lookup
+from labx.storage.sqlite import CACHE_DIR, ThreadLocalConnection
 
 logger = logging.getLogger(__name__)
 
-_CACHE_DIR = Path.home() / ".labx" / "cache"
+_PURGE_BATCH = 500  # rows per DELETE, so the write lock is never held for long
+_SWEEP_MARKER = ".swept"
+
+
+def _keep_marker(keep: frozenset[str]) -> str:
+    """Stable text form of a fingerprint set, stored to skip repeated sweeps."""
+    return "\n".join(sorted(keep))
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """A cached report plus the fingerprint of the extractor that produced it."""
+
+    fingerprint: str
+    report: LabReport
+
+
+RemoveListener = Callable[[list[str]], None]
+
+
+class _RemovalNotifier:
+    """Report the keys a cache tier drops, e.g. to prune an index built on it."""
+
+    _on_remove: RemoveListener | None = None
+
+    def set_remove_listener(self, listener: RemoveListener | None) -> None:
+        """Call *listener* with the keys of entries deleted, expired or evicted."""
+        self._on_remove = listener
+
+    def _removed(self, keys: list[str]) -> None:
+        if not keys or self._on_remove is None:
+            return
+        try:
+            self._on_remove(keys)
+        except Exception:
+            logger.warning("Cache removal listener failed for %d key(s)", len(keys))
+
+
+class MemoryCache(_RemovalNotifier):
+    """Bounded in-process LRU with an optional per-entry TTL.
+
+    Reports are copied on the way in and out because the pipeline mutates
+    them in place during post-processing and merging.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_s: float | None = None) -> None:
+        self._max = max_entries
+        self._ttl = ttl_s
+        self._entries: OrderedDict[str, tuple[float, CacheEntry]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            stored_at, entry = item
+            expired = self._ttl is not None and time.monotonic() - stored_at > self._ttl
+            if expired:
+                del self._entries[key]
+            else:
+                self._entries.move_to_end(key)
+        if expired:
+            self._removed([key])
+            return None
+        return CacheEntry(entry.fingerprint, entry.report.model_copy(deep=True))
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        if self._max <= 0:
+            return
+        copy = CacheEntry(entry.fingerprint, entry.report.model_copy(deep=True))
+        evicted: list[str] = []
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max:
+                evicted.append(self._entries.popitem(last=False)[0])
+        self._removed(evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            found = self._entries.pop(key, None) is not None
+        if found:
+            self._removed([key])
+
+    def clear(self) -> int:
+        """Remove all entries. Returns count of removed entries."""
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+        self._removed(keys)
+        return len(keys)
+
 
+class PersistentCache(_RemovalNotifier, ABC):
+    """Interface for the on-disk tier of a ``TieredCache``.
 
-class DiskCache:
-    """Simple file-system cache: one JSON file per image hash."""
+    Implementations report every key they drop through ``_removed``.
+    """
 
-    def __init__(self, cache_dir: Path | None = None) -> None:
-        self._dir = cache_dir or _CACHE_DIR
+    @abstractmethod
+    def get(self, key: str) -> CacheEntry | None:
+        """Return the entry for *key*, or ``None`` if absent or expired."""
+
+    @abstractmethod
+    def put(self, key: str, entry: CacheEntry) -> None:
+        """Insert or replace the entry for *key*."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove the entry for *key* if present."""
+
+    @abstractmethod
+    def purge(self, keep: frozenset[str]) -> int:
+        """Remove entries whose fingerprint is not in *keep*. Returns count removed.
+
+        The last *keep* set is recorded in the store, so a purge with the
+        same set (every restart of an unchanged deployment) is a no-op.
+        """
+
+    @abstractmethod
+    def clear(self) -> int:
+        """Remove all entries. Returns count removed."""
+
+
+class DiskCache(PersistentCache):
+    """Simple file-system cache: one JSON envelope file per image hash."""
+
+    def __init__(
+        self,
+        cache_dir: Path | None = None,
+        *,
+        ttl_s: float | None = None,
+        max_entries: int | None = None,
+    ) -> None:
+        self._dir = cache_dir or CACHE_DIR
         self._dir.mkdir(parents=True, exist_ok=True)
+        self._ttl = ttl_s
+        self._max = max_entries
 
-    def _path(self, image_id: str) -> Path:
-        return self._dir / f"{image_id}.json"
+    def _path(self, key: str) -> Path:
+        return self._dir / f"{key}.json"
 
-    def get(self, image_id: str) -> LabReport | None:
-        p = self._path(image_id)
+    def get(self, key: str) -> CacheEntry | None:
+        p = self._path(key)
         if not p.exists():
             return None
         try:
+            if self._ttl is not None and time.time() - p.stat().st_mtime > self._ttl:
+                p.unlink(missing_ok=True)
+                logger.debug("Cache entry expired for %s", key[:12])
+                self._removed([key])
+                return None
             data = json.loads(p.read_text(encoding="utf-8"))
-            report = LabReport.model_validate(data)
-            logger.debug("Cache hit for %s", image_id[:12])
-            return report
+            # Pre-fingerprint entries are bare reports; they read as stale.
+            entry = CacheEntry(
+                fingerprint=data.get("fingerprint", ""),
+                report=LabReport.model_validate(data.get("report", data)),
+            )
+            logger.debug("Cache hit for %s", key[:12])
+            return entry
         except Exception:
-            logger.warning("Cache read failed for %s, ignoring", image_id[:12])
+            logger.warning("Cache read failed for %s, ignoring", key[:12])
             return None
 
-    def put(self, image_id: str, report: LabReport) -> None:
-        p = self._path(image_id)
+    def put(self, key: str, entry: CacheEntry) -> None:
+        p = self._path(key)
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
         try:
-            p.write_text(
-                report.model_dump_json(indent=2),
+            tmp.write_text(
+                json.dumps(
+                    {
+                        "fingerprint": entry.fingerprint,
+                        "report": entry.report.model_dump(mode="json"),
+                    },
+                    indent=2,
+                ),
                 encoding="utf-8",
             )
-            logger.debug("Cached result for %s", image_id[:12])
+            os.replace(tmp, p)
+            logger.debug("Cached result for %s", key[:12])
         except Exception:
-            logger.warning("Cache write failed for %s", image_id[:12])
+            logger.warning("Cache write failed for %s", key[:12])
+            tmp.unlink(missing_ok=True)
+            return
+        if self._max is not None:
+            self._evict(self._max)
+
+    def delete(self, key: str) -> None:
+        p = self._path(key)
+        if p.exists():
+            p.unlink(missing_ok=True)
+            self._removed([key])
+
+    def purge(self, keep: frozenset[str]) -> int:
+        marker_path = self._dir / _SWEEP_MARKER
+        marker = _keep_marker(keep)
+        with contextlib.suppress(OSError):
+            if marker_path.read_text(encoding="utf-8") == marker:
+                return 0
+        tmp = marker_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(marker, encoding="utf-8")
+        os.replace(tmp, marker_path)
+
+        removed: list[str] = []
+        for f in self._dir.glob("*.json"):
+            try:
+                fingerprint = json.loads(f.read_text(encoding="utf-8")).get("fingerprint", "")
+            except Exception:
+                fingerprint = ""
+            if fingerprint not in keep:
+                f.unlink(missing_ok=True)
+                removed.append(f.stem)
+        self._removed(removed)
+        return len(removed)
+
+    def _evict(self, max_entries: int) -> None:
+        """Drop the oldest files once the directory exceeds *max_entries*."""
+        files = list(self._dir.glob("*.json"))
+        excess = len(files) - max_entries
+        if excess <= 0:
+            return
+        files.sort(key=lambda f: f.stat().st_mtime)
+        for f in files[:excess]:
+            f.unlink(missing_ok=True)
+        logger.debug("Evicted %d cache entries", excess)
+        self._removed([f.stem for f in files[:excess]])
 
     def clear(self) -> int:
         """Remove all cached entries. Returns count of removed files."""
-        count = 0
+        removed: list[str] = []
         for f in self._dir.glob("*.json"):
             f.unlink(missing_ok=True)
-            count += 1
-        return count
+            removed.append(f.stem)
+        self._removed(removed)
+        return len(removed)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    key         TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    payload     BLOB NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS extractions_lru ON extractions (accessed_at);
+CREATE INDEX IF NOT EXISTS extractions_lfu ON extractions (hits, accessed_at);
+
+CREATE TABLE IF NOT EXISTS extractions_meta (
+    id          INTEGER PRIMARY KEY CHECK (id = 0),
+    total_bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO extractions_meta (id, total_bytes) VALUES (0, 0);
+
+CREATE TABLE IF NOT EXISTS extractions_sweep (
+    id   INTEGER PRIMARY KEY CHECK (id = 0),
+    keep TEXT NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS extractions_size_ins AFTER INSERT ON extractions BEGIN
+    UPDATE extractions_meta SET total_bytes = total_bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS extractions_size_del AFTER DELETE ON extractions BEGIN
+    UPDATE extractions_meta SET total_bytes = total_bytes - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS extractions_size_upd AFTER UPDATE OF size ON extractions BEGIN
+    UPDATE extractions_meta SET total_bytes = total_bytes - OLD.size + NEW.size WHERE id = 0;
+END;
+"""
+
+_EVICTION_ORDER = {
+    "lru": "accessed_at",
+    "lfu": "hits, accessed_at",
+}
+
+
+class SQLiteCache(PersistentCache):
+    """SQLite-backed cache in WAL mode with byte-budgeted eviction.
+
+    Payloads are zlib-compressed compact JSON.  A running byte total is kept
+    by triggers so the budget check is O(1); once it is exceeded, entries
+    are evicted in LRU or LFU order down to 90 % of *max_bytes*.  WAL mode
+    plus a busy timeout lets several worker processes share one file; each
+    thread gets its own connection.
+    """
+
+    def __init__(
+        self,
+        db_path: Path | None = None,
+        *,
+        ttl_s: float | None = None,
+        max_bytes: int | None = None,
+        policy: str = "lru",
+    ) -> None:
+        if policy not in _EVICTION_ORDER:
+            raise ValueError(f"Unknown eviction policy '{policy}'")
+        self._conn = ThreadLocalConnection(db_path or CACHE_DIR / "extractions.sqlite3")
+        self._ttl = ttl_s
+        self._max_bytes = max_bytes
+        self._order = _EVICTION_ORDER[policy]
+        self._conn().executescript(_SCHEMA)
+
+    def get(self, key: str) -> CacheEntry | None:
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT fingerprint, payload, created_at FROM extractions WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            fingerprint, payload, created_at = row
+            now = time.time()
+            if self._ttl is not None and now - created_at > self._ttl:
+                conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                logger.debug("Cache entry expired for %s", key[:12])
+                self._removed([key])
+                return None
+            conn.execute(
+                "UPDATE extractions SET accessed_at = ?, hits = hits + 1 WHERE key = ?",
+                (now, key),
+            )
+            report = LabReport.model_validate_json(zlib.decompress(payload))
+            logger.debug("Cache hit for %s", key[:12])
+            return CacheEntry(fingerprint, report)
+        except Exception:
+            logger.warning("Cache read failed for %s, ignoring", key[:12])
+            return None
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        payload = zlib.compress(entry.report.model_dump_json().encode("utf-8"))
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT INTO extractions "
+                "(key, fingerprint, payload, size, created_at, accessed_at, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "fingerprint = excluded.fingerprint, payload = excluded.payload, "
+                "size = excluded.size, created_at = excluded.created_at, "
+                "accessed_at = excluded.accessed_at",
+                (key, entry.fingerprint, payload, len(payload), now, now),
+            )
+            logger.debug("Cached result for %s (%d bytes)", key[:12], len(payload))
+            if self._max_bytes is not None:
+                self._evict(self._max_bytes)
+        except Exception:
+            logger.warning("Cache write failed for %s", key[:12])
+
+    def _evict(self, max_bytes: int) -> None:
+        conn = self._conn()
+        if self.total_bytes() <= max_bytes:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock: another worker may have evicted already.
+            excess = self.total_bytes() - int(max_bytes * 0.9)
+            victims: list[tuple[str]] = []
+            freed = 0
+            for key, size in conn.execute(
+                f"SELECT key, size FROM extractions ORDER BY {self._order}"
+            ):
+                if freed >= excess:
+                    break
+                victims.append((key,))
+                freed += size
+            conn.executemany("DELETE FROM extractions WHERE key = ?", victims)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.debug("Evicted %d cache entries (%d bytes)", len(victims), freed)
+        self._removed([key for (key,) in victims])
+
+    def total_bytes(self) -> int:
+        """Compressed payload bytes currently stored."""
+        row = self._conn().execute(
+            "SELECT total_bytes FROM extractions_meta WHERE id = 0"
+        ).fetchone()
+        return int(row[0]) if row else 0
+
+    def __len__(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM extractions").fetchone()[0])
+
+    def delete(self, key: str) -> None:
+        cur = self._conn().execute("DELETE FROM extractions WHERE key = ?", (key,))
+        if cur.rowcount > 0:
+            self._removed([key])
+
+    def purge(self, keep: frozenset[str]) -> int:
+        """Delete entries outside *keep* in short batches.
+
+        The sweep is claimed under the write lock by recording *keep* first,
+        so only one worker sweeps per fingerprint change; rows a crashed
+        sweep leaves behind are still dropped as stale on read.
+        """
+        conn = self._conn()
+        marker = _keep_marker(keep)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT keep FROM extractions_sweep WHERE id = 0").fetchone()
+            claimed = row is None or row[0] != marker
+            if claimed:
+                conn.execute(
+                    "INSERT INTO extractions_sweep (id, keep) VALUES (0, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET keep = excluded.keep",
+                    (marker,),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if not claimed:
+            return 0
+
+        placeholders = ",".join("?" * len(keep))
+        removed = 0
+        while True:
+            keys = [
+                key
+                for (key,) in conn.execute(
+                    "DELETE FROM extractions WHERE key IN (SELECT key FROM extractions "
+                    f"WHERE fingerprint NOT IN ({placeholders}) LIMIT ?) RETURNING key",
+                    (*keep, _PURGE_BATCH),
+                ).fetchall()
+            ]
+            self._removed(keys)
+            removed += len(keys)
+            if len(keys) < _PURGE_BATCH:
+                return removed
+
+    def clear(self) -> int:
+        keys = [
+            key
+            for (key,) in self._conn().execute("DELETE FROM extractions RETURNING key").fetchall()
+        ]
+        self._removed(keys)
+        return len(keys)
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for a ``TieredCache``."""
+
+    memory_hits: int = 0
+    persistent_hits: int = 0
+    misses: int = 0
+    stale: int = 0
+    migrated: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.persistent_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class TieredCache:
+    """In-process LRU in front of an optional persistent store.
+
+    Persistent hits are promoted into the memory tier; writes go to both.
+    Entries stamped with a fingerprint listed in *compatible* are migrated
+    to the caller's fingerprint on read instead of being invalidated.
+    """
+
+    def __init__(
+        self,
+        memory: MemoryCache,
+        persistent: PersistentCache | None = None,
+        *,
+        compatible: frozenset[str] = frozenset(),
+    ) -> None:
+        self._memory = memory
+        self._persistent = persistent
+        self._compatible = compatible
+        self._swept: set[str] = set()
+        self._sweep_lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def get(self, key: str, fingerprint: str) -> LabReport | None:
+        entry = self._memory.get(key)
+        tier = "memory"
+        if entry is None and self._persistent is not None:
+            entry = self._persistent.get(key)
+            tier = "persistent"
+
+        if entry is not None and entry.fingerprint != fingerprint:
+            if entry.fingerprint in self._compatible:
+                logger.debug("Migrating cache entry %s to %s", key[:12], fingerprint)
+                self.stats.migrated += 1
+                entry = CacheEntry(fingerprint, entry.report)
+                self.put(key, fingerprint, entry.report)
+            else:
+                logger.debug("Dropping stale cache entry for %s", key[:12])
+                self.stats.stale += 1
+                inc_cache_lookup(tier=tier, result="stale")
+                self.delete(key)
+                entry = None
+
+        if entry is None:
+            self.stats.misses += 1
+            inc_cache_lookup(tier="all", result="miss")
+            return None
+
+        if tier == "memory":
+            self.stats.memory_hits += 1
+        else:
+            self.stats.persistent_hits += 1
+            self._memory.put(key, entry)
+        inc_cache_lookup(tier=tier, result="hit")
+        return entry.report
+
+    def put(self, key: str, fingerprint: str, report: LabReport) -> None:
+        entry = CacheEntry(fingerprint, report)
+        self._memory.put(key, entry)
+        if self._persistent is not None:
+            self._persistent.put(key, entry)
+
+    def delete(self, key: str) -> None:
+        self._memory.delete(key)
+        if self._persistent is not None:
+            self._persistent.delete(key)
+
+    def set_remove_listener(self, listener: RemoveListener | None) -> None:
+        """Call *listener* with the keys the backing tier drops.
+
+        That is the persistent tier when there is one (memory evictions
+        leave the entry on disk), otherwise the memory tier.
+        """
+        if self._persistent is not None:
+            self._persistent.set_remove_listener(listener)
+        else:
+            self._memory.set_remove_listener(listener)
+
+    def claim_sweep(self, fingerprint: str) -> bool:
+        """Return ``True`` the first time a sweep for *fingerprint* is requested."""
+        with self._sweep_lock:
+            if fingerprint in self._swept:
+                return False
+            self._swept.add(fingerprint)
+            return True
+
+    def purge_stale(self, fingerprint: str) -> int:
+        """Drop persistent entries that are neither current nor compatible."""
+        if self._persistent is None:
+            return 0
+        removed = self._persistent.purge(self._compatible | {fingerprint})
+        if removed:
+            logger.info("Purged %d stale cache entries (fingerprint %s)", removed, fingerprint)
+        return removed
+
+    def clear(self) -> int:
+        """Clear both tiers. Returns count of removed persistent entries."""
+        self._memory.clear()
+        return self._persistent.clear() if self._persistent is not None else 0
+
+
+_cache: TieredCache | None = None
+
+
+def get_cache(settings: Settings | None = None) -> TieredCache | None:
+    """Return (and lazily create) the shared extraction cache.
+
+    Returns ``None`` unless ``cache_enabled`` is set.  The persistent tier
+    sits behind a memory tier of ``cache_memory_entries`` entries.
+    """
+    global _cache  # noqa: PLW0603
+    if _cache is None:
+        s = settings or get_settings()
+        if not s.cache_enabled:
+            return None
+        ttl = float(s.cache_ttl_s) if s.cache_ttl_s > 0 else None
+        cache_dir = Path(s.cache_dir) if s.cache_dir else CACHE_DIR
+        persistent: PersistentCache
+        if s.cache_backend == "disk":
+            persistent = DiskCache(cache_dir, ttl_s=ttl, max_entries=s.cache_max_entries)
+        else:
+            persistent = SQLiteCache(
+                cache_dir / "extractions.sqlite3",
+                ttl_s=ttl,
+                max_bytes=s.cache_max_bytes,
+                policy=s.cache_eviction_policy,
+            )
+        _cache = TieredCache(
+            MemoryCache(s.cache_memory_entries, ttl_s=ttl),
+            persistent,
+            compatible=frozenset(s.cache_compatible_fingerprints),
+        )
+    return _cache
+
+
+def reset_cache() -> None:
+    """Tear down the shared cache (useful in tests)."""
+    global _cache  # noqa: PLW0603
+    _cache = None
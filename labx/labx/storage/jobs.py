@@ -0,0 +1,316 @@
+"""Job queue — SQLite-backed store for asynchronous analysis jobs.
+
+Each job owns a directory holding its uploaded images; the row tracks its
+status and, once finished, the zlib-compressed ``AnalysisReport`` JSON or a
+client-safe error.  Workers claim jobs with ``BEGIN IMMEDIATE`` so several
+worker processes can share one database file.
+
+The database lives on the local filesystem, so every request for a job
+must reach the instance that accepted it, and jobs last only as long as
+that disk does (on Cloud Run, until the instance is replaced).
+Deployments that scale out serve ``/jobs`` from a single pinned instance
+and turn it off elsewhere with ``jobs_enabled=False`` (see
+``cloudbuild.yaml``).
+"""
+
+from __future__ import annotations
+
+import logging
+import shutil
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any
+
+from labx.config.constants import JOB_MAX_ATTEMPTS
+from labx.config.settings import Settings, get_settings
+from labx.domain.models import AnalysisReport
+from labx.storage.sqlite import DATA_DIR, ThreadLocalConnection
+
+logger = logging.getLogger(__name__)
+
+_JOBS_DIR = DATA_DIR / "jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    image_count INTEGER NOT NULL,
+    summary INTEGER NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 1,
+    tenant TEXT NOT NULL DEFAULT 'default',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    result BLOB,
+    error TEXT,
+    error_detail TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at);
+CREATE INDEX IF NOT EXISTS jobs_tenant ON jobs (status, tenant);
+"""
+
+_COLUMNS = (
+    "id, status, image_count, summary, priority, tenant, attempts, created_at, started_at, "
+    "finished_at, error, error_detail"
+)
+
+
+@dataclass(frozen=True)
+class Job:
+    """Snapshot of one job row (without the result payload)."""
+
+    id: str
+    status: str
+    image_count: int
+    summary: bool
+    priority: int
+    tenant: str
+    attempts: int
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+    error_detail: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+
+class JobStore:
+    """SQLite job queue in WAL mode; each thread gets its own connection."""
+
+    def __init__(
+        self, jobs_dir: Path | None = None, *, max_attempts: int = JOB_MAX_ATTEMPTS
+    ) -> None:
+        self._dir = jobs_dir or _JOBS_DIR
+        self._conn = ThreadLocalConnection(self._dir / "jobs.sqlite3")
+        self._max_attempts = max_attempts
+        self._conn().executescript(_SCHEMA)
+
+    # ── Producer side ────────────────────────────────────────────
+
+    def new_job_dir(self) -> tuple[str, Path]:
+        """Allocate a job id and an empty directory for its uploads."""
+        job_id = uuid.uuid4().hex
+        path = self.input_dir(job_id)
+        path.mkdir(parents=True)
+        return job_id, path
+
+    def input_dir(self, job_id: str) -> Path:
+        return self._dir / job_id
+
+    def submit(
+        self,
+        job_id: str,
+        *,
+        image_count: int,
+        summary: bool,
+        priority: int = 1,
+        tenant: str = "default",
+    ) -> Job:
+        """Enqueue a job whose images are already in ``input_dir(job_id)``.
+
+        Lower *priority* values are claimed first (see ``Priority``).
+        """
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, status, image_count, summary, priority, tenant, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, image_count, int(summary), priority, tenant, now),
+        )
+        logger.info("Queued job %s (%d image(s))", job_id[:12], image_count)
+        return Job(job_id, QUEUED, image_count, summary, priority, tenant, 0, now)
+
+    def get(self, job_id: str) -> Job | None:
+        row = self._conn().execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return _row_to_job(row) if row else None
+
+    def result(self, job_id: str) -> AnalysisReport | None:
+        row = self._conn().execute(
+            "SELECT result FROM jobs WHERE id = ? AND status = ?", (job_id, SUCCEEDED)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return AnalysisReport.model_validate_json(zlib.decompress(row[0]))
+
+    def queued(self) -> int:
+        """Number of jobs waiting for a worker."""
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)
+        ).fetchone()
+        return int(row[0])
+
+    # ── Worker side ──────────────────────────────────────────────
+
+    def claim(self) -> Job | None:
+        """Atomically move the next queued job to *running* and return it.
+
+        Jobs are taken by priority, then from the tenant with the fewest
+        running jobs (so one tenant's backlog cannot occupy every worker),
+        then by age.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs AS q WHERE status = ? "
+                "ORDER BY priority, "
+                "(SELECT COUNT(*) FROM jobs AS r WHERE r.status = ? AND r.tenant = q.tenant), "
+                "created_at LIMIT 1",
+                (QUEUED, RUNNING),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, now, now, row[0]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        job = _row_to_job(row)
+        return replace(job, status=RUNNING, attempts=job.attempts + 1, started_at=now)
+
+    # Updates by a worker apply only to the run it claimed: once a job is
+    # recovered and claimed again, ``attempts`` has moved on and the old
+    # worker's late heartbeat, result or error is ignored.
+
+    def heartbeat(self, job: Job) -> None:
+        """Renew the lease on a job claimed as *job*."""
+        self._conn().execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ? AND attempts = ?",
+            (time.time(), job.id, RUNNING, job.attempts),
+        )
+
+    def complete(self, job: Job, analysis: AnalysisReport) -> bool:
+        """Record the result of the run claimed as *job*; ``False`` if it was superseded."""
+        payload = zlib.compress(analysis.model_dump_json().encode("utf-8"))
+        return self._finish(
+            job, "status = ?, finished_at = ?, result = ?", (SUCCEEDED, time.time(), payload)
+        )
+
+    def fail(self, job: Job, error: str, detail: str = "") -> bool:
+        """Record the failure of the run claimed as *job*; ``False`` if it was superseded."""
+        return self._finish(
+            job,
+            "status = ?, finished_at = ?, error = ?, error_detail = ?",
+            (FAILED, time.time(), error, detail),
+        )
+
+    def _finish(self, job: Job, assignments: str, params: tuple[Any, ...]) -> bool:
+        updated = self._conn().execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ? AND status = ? AND attempts = ?",
+            (*params, job.id, RUNNING, job.attempts),
+        ).rowcount
+        if not updated:
+            logger.warning(
+                "Job %s attempt %d was superseded; its outcome is dropped",
+                job.id[:12],
+                job.attempts,
+            )
+            return False
+        self._remove_inputs(job.id)
+        return True
+
+    def recover(self, lease_s: float) -> int:
+        """Requeue running jobs whose worker stopped heartbeating.
+
+        A job is considered abandoned once its heartbeat is older than
+        *lease_s* (its worker crashed or the instance was stopped).  Jobs
+        that have already used ``max_attempts`` are failed instead, so a job
+        that crashes its worker cannot loop forever.
+        """
+        conn = self._conn()
+        cutoff = time.time() - lease_s
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            exhausted = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, error_detail = ? "
+                "WHERE status = ? AND heartbeat_at < ? AND attempts >= ? RETURNING id",
+                (
+                    FAILED,
+                    time.time(),
+                    "internal",
+                    "Job was interrupted too many times",
+                    RUNNING,
+                    cutoff,
+                    self._max_attempts,
+                ),
+            ).fetchall()
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, heartbeat_at = NULL "
+                "WHERE status = ? AND heartbeat_at < ?",
+                (QUEUED, RUNNING, cutoff),
+            ).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for (job_id,) in exhausted:
+            self._remove_inputs(job_id)
+        if requeued or exhausted:
+            logger.warning(
+                "Recovered %d abandoned job(s), failed %d", requeued, len(exhausted)
+            )
+        return requeued
+
+    def purge(self, older_than_s: float) -> int:
+        """Delete finished jobs (and their results) older than *older_than_s*."""
+        cutoff = time.time() - older_than_s
+        conn = self._conn()
+        ids = [
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (SUCCEEDED, FAILED, cutoff),
+            )
+        ]
+        conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+        for job_id in ids:
+            self._remove_inputs(job_id)
+        if ids:
+            logger.info("Purged %d finished job(s)", len(ids))
+        return len(ids)
+
+    def _remove_inputs(self, job_id: str) -> None:
+        shutil.rmtree(self.input_dir(job_id), ignore_errors=True)
+
+
+def _row_to_job(row: tuple[Any, ...]) -> Job:
+    job_id, status, image_count, summary, *rest = row
+    return Job(job_id, status, image_count, bool(summary), *rest)
+
+
+_job_store: JobStore | None = None
+
+
+def get_job_store(settings: Settings | None = None) -> JobStore:
+    """Return (and lazily create) the shared job store."""
+    global _job_store  # noqa: PLW0603
+    if _job_store is None:
+        s = settings or get_settings()
+        _job_store = JobStore(Path(s.jobs_dir) if s.jobs_dir else None)
+    return _job_store
+
+
+def reset_job_store() -> None:
+    """Tear down the shared job store (useful in tests)."""
+    global _job_store  # noqa: PLW0603
+    _job_store = None
@@ -0,0 +1,248 @@
+"""Perceptual-hash index for near-duplicate image lookup.
+
+Maps 64-bit perceptual hashes (see ``image_io.dhash``) to extraction cache
+keys so that a re-photographed report can be matched to an earlier
+extraction.  Two implementations answer "which keys are within Hamming
+distance *r* of this hash":
+
+* ``BKTreeIndex`` — an in-process BK-tree, for a memory-only
+  ``TieredCache``.
+* ``SQLiteHashIndex`` — multi-index hashing over a WAL-mode SQLite file,
+  used alongside the persistent cache.  Each hash is split into four
+  16-bit chunks, each with its own index.  Two hashes within distance *r*
+  must agree to within ``r // 4`` bits on at least one chunk (pigeonhole),
+  so a query only has to read rows whose chunk is one of a few hundred
+  nearby values, which stays fast at millions of stored hashes.
+
+Hashes are recorded per tenant and a search only returns the searching
+tenant's keys, so one tenant's upload is never matched to another's.
+Entries are removed along with the cache entries they point to (see
+``TieredCache.set_remove_listener``), so the index never outgrows the cache.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any
+
+from labx.config.settings import Settings, get_settings
+from labx.storage.sqlite import CACHE_DIR, ThreadLocalConnection
+
+logger = logging.getLogger(__name__)
+
+_CHUNKS = 4
+_CHUNK_BITS = 16
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class HashIndex(ABC):
+    """Store ``key → hash`` per tenant and find a tenant's keys near a hash."""
+
+    @abstractmethod
+    def add(self, key: str, phash: int, *, tenant: str) -> None: ...
+
+    @abstractmethod
+    def remove(self, keys: list[str]) -> None:
+        """Forget *keys* for every tenant; unknown keys are ignored."""
+
+    @abstractmethod
+    def search(self, phash: int, max_distance: int, *, tenant: str) -> list[tuple[int, str]]:
+        """Return *tenant*'s ``(distance, key)`` pairs within *max_distance*, nearest first."""
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+
+class BKTreeIndex(HashIndex):
+    """In-memory BK-tree over Hamming distance.
+
+    The tree is cleared once it holds *max_entries* hashes, which bounds its
+    memory alongside a bounded memory cache.
+    """
+
+    def __init__(self, max_entries: int = 100_000) -> None:
+        self._max_entries = max_entries
+        # node: (hash, keys, {distance: child})
+        self._root: tuple[int, list[str], dict[int, Any]] | None = None
+        self._hashes: dict[str, int] = {}
+        self._tenants: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, key: str, phash: int, *, tenant: str) -> None:
+        with self._lock:
+            if self._hashes.get(key) == phash:
+                self._tenants[key].add(tenant)
+                return
+            if key in self._hashes:
+                self._discard(key)
+            if len(self._hashes) >= self._max_entries:
+                self._root = None
+                self._hashes.clear()
+                self._tenants.clear()
+            self._hashes[key] = phash
+            self._tenants[key] = {tenant}
+            if self._root is None:
+                self._root = (phash, [key], {})
+                return
+            node = self._root
+            while True:
+                d = hamming(phash, node[0])
+                if d == 0:
+                    node[1].append(key)
+                    return
+                child = node[2].get(d)
+                if child is None:
+                    node[2][d] = (phash, [key], {})
+                    return
+                node = child
+
+    def remove(self, keys: list[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._discard(key)
+
+    def _discard(self, key: str) -> None:
+        # Nodes stay in place (they route searches); only the key is dropped.
+        phash = self._hashes.pop(key, None)
+        self._tenants.pop(key, None)
+        node = self._root
+        while phash is not None and node is not None:
+            d = hamming(phash, node[0])
+            if d == 0:
+                node[1].remove(key)
+                return
+            node = node[2].get(d)
+
+    def search(self, phash: int, max_distance: int, *, tenant: str) -> list[tuple[int, str]]:
+        found: list[tuple[int, str]] = []
+        with self._lock:
+            stack = [self._root] if self._root is not None else []
+            while stack:
+                node = stack.pop()
+                d = hamming(phash, node[0])
+                if d <= max_distance:
+                    found.extend((d, key) for key in node[1] if tenant in self._tenants[key])
+                # Triangle inequality: only children at distance d ± r can match.
+                for edge, child in node[2].items():
+                    if d - max_distance <= edge <= d + max_distance:
+                        stack.append(child)
+        return sorted(found)
+
+
+# The unscoped table of earlier versions cannot be attributed to tenants.
+_SCHEMA = f"""
+DROP TABLE IF EXISTS phashes;
+CREATE TABLE IF NOT EXISTS tenant_phashes (
+    tenant TEXT NOT NULL,
+    key TEXT NOT NULL,
+    hash INTEGER NOT NULL,
+    {", ".join(f"c{i} INTEGER NOT NULL" for i in range(_CHUNKS))},
+    created_at REAL NOT NULL,
+    PRIMARY KEY (tenant, key)
+);
+CREATE INDEX IF NOT EXISTS tenant_phashes_key ON tenant_phashes (key);
+{"".join(
+    f"CREATE INDEX IF NOT EXISTS tenant_phashes_c{i} ON tenant_phashes (tenant, c{i});"
+    for i in range(_CHUNKS)
+)}
+"""
+
+
+def _chunks(phash: int) -> list[int]:
+    return [(phash >> (i * _CHUNK_BITS)) & _CHUNK_MASK for i in range(_CHUNKS)]
+
+
+def _neighbours(value: int, radius: int) -> list[int]:
+    """All chunk values within *radius* bits of *value*."""
+    out = [value]
+    for r in range(1, radius + 1):
+        for bits in itertools.combinations(range(_CHUNK_BITS), r):
+            flipped = value
+            for b in bits:
+                flipped ^= 1 << b
+            out.append(flipped)
+    return out
+
+
+def _to_signed(phash: int) -> int:
+    return phash - (1 << 64) if phash >= 1 << 63 else phash
+
+
+class SQLiteHashIndex(HashIndex):
+    """Multi-index hashing over SQLite; each thread gets its own connection."""
+
+    def __init__(self, db_path: Path) -> None:
+        self._conn = ThreadLocalConnection(db_path)
+        self._conn().executescript(_SCHEMA)
+
+    def __len__(self) -> int:
+        return int(
+            self._conn().execute("SELECT COUNT(DISTINCT key) FROM tenant_phashes").fetchone()[0]
+        )
+
+    def add(self, key: str, phash: int, *, tenant: str) -> None:
+        self._conn().execute(
+            f"INSERT OR REPLACE INTO tenant_phashes (tenant, key, hash, "
+            f"{', '.join(f'c{i}' for i in range(_CHUNKS))}, created_at) "
+            f"VALUES (?, ?, ?, {', '.join('?' * _CHUNKS)}, ?)",
+            (tenant, key, _to_signed(phash), *_chunks(phash), time.time()),
+        )
+
+    def remove(self, keys: list[str]) -> None:
+        self._conn().executemany(
+            "DELETE FROM tenant_phashes WHERE key = ?", [(k,) for k in keys]
+        )
+
+    def search(self, phash: int, max_distance: int, *, tenant: str) -> list[tuple[int, str]]:
+        conn = self._conn()
+        radius = max_distance // _CHUNKS
+        found: dict[str, int] = {}
+        for i, chunk in enumerate(_chunks(phash)):
+            values = _neighbours(chunk, radius)
+            rows = conn.execute(
+                f"SELECT key, hash FROM tenant_phashes "
+                f"WHERE tenant = ? AND c{i} IN ({', '.join('?' * len(values))})",
+                (tenant, *values),
+            )
+            for key, stored in rows:
+                d = hamming(phash, stored & ((1 << 64) - 1))
+                if d <= max_distance:
+                    found[key] = d
+        return sorted((d, key) for key, d in found.items())
+
+
+_index: HashIndex | None = None
+
+
+def get_hash_index(settings: Settings | None = None) -> HashIndex | None:
+    """Return the shared perceptual-hash index, or ``None`` when matching is off.
+
+    The index lives next to the persistent extraction cache, so it is also
+    ``None`` while the cache is disabled.
+    """
+    global _index  # noqa: PLW0603
+    if _index is None:
+        s = settings or get_settings()
+        if s.near_duplicate_mode == "off" or not s.cache_enabled:
+            return None
+        cache_dir = Path(s.cache_dir) if s.cache_dir else CACHE_DIR
+        _index = SQLiteHashIndex(cache_dir / "phash.sqlite3")
+    return _index
+
+
+def reset_hash_index() -> None:
+    """Tear down the shared index (useful in tests)."""
+    global _index  # noqa: PLW0603
+    _index = None
@@ -0,0 +1,39 @@
+"""Shared plumbing for the local SQLite stores.
+
+The extraction cache, perceptual-hash index, job queue and per-key rate
+limits each keep a SQLite file under ``DATA_DIR`` (unless configured
+elsewhere) and open it the same way, through ``ThreadLocalConnection``.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from pathlib import Path
+
+DATA_DIR = Path.home() / ".labx"
+CACHE_DIR = DATA_DIR / "cache"
+
+
+class ThreadLocalConnection:
+    """Lazily opened WAL-mode connection to *path*, one per thread.
+
+    Call the instance to get the current thread's connection.  Connections
+    are in autocommit mode (``isolation_level=None``): stores that need a
+    transaction issue ``BEGIN IMMEDIATE`` themselves.  Concurrent writers
+    from other threads or processes wait up to 30 s for the lock.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+    def __call__(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,280 @@
+"""Tests for process-wide admission control and load shedding."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from labx.api.admission import AdmissionController, AdmissionMiddleware, OverloadedError
+from labx.pipeline.concurrency import Priority
+
+
+async def _hold(
+    controller: AdmissionController,
+    release: asyncio.Event,
+    cost: int = 0,
+    priority: Priority = Priority.routine,
+) -> None:
+    async with controller.admit(cost, priority):
+        await release.wait()
+
+
+class TestAdmissionController:
+    @pytest.mark.asyncio
+    async def test_sheds_when_queue_full(self):
+        controller = AdmissionController(max_active=1, max_queued=1)
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(controller, release))
+        queued = asyncio.create_task(_hold(controller, release))
+        await asyncio.sleep(0)
+
+        assert (controller.active, controller.queued) == (1, 1)
+        with pytest.raises(OverloadedError) as exc_info:
+            async with controller.admit():
+                pass
+        assert exc_info.value.reason == "queue_full"
+        assert exc_info.value.retry_after >= 1
+
+        release.set()
+        await asyncio.gather(running, queued)
+        assert (controller.active, controller.queued) == (0, 0)
+
+    @pytest.mark.asyncio
+    async def test_sheds_over_byte_budget(self):
+        controller = AdmissionController(max_bytes=100)
+        release = asyncio.Event()
+        held = asyncio.create_task(_hold(controller, release, cost=80))
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError) as exc_info:
+            async with controller.admit(30):
+                pass
+        assert exc_info.value.reason == "memory"
+
+        release.set()
+        await held
+        assert controller.reserved_bytes == 0
+
+    @pytest.mark.asyncio
+    async def test_oversized_request_admitted_when_idle(self):
+        controller = AdmissionController(max_bytes=100)
+        async with controller.admit(500):
+            assert controller.reserved_bytes == 500
+
+    @pytest.mark.asyncio
+    async def test_queue_timeout_sheds(self):
+        controller = AdmissionController(max_active=1, queue_timeout_s=0.01)
+        release = asyncio.Event()
+        held = asyncio.create_task(_hold(controller, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError) as exc_info:
+            async with controller.admit():
+                pass
+        assert exc_info.value.reason == "timeout"
+        assert controller.queued == 0
+
+        release.set()
+        await held
+
+
+class TestAdmissionPriority:
+    @pytest.mark.asyncio
+    async def test_stat_takes_reserved_slot(self):
+        controller = AdmissionController(max_active=2, stat_reserved=1)
+        release = asyncio.Event()
+        routine = [asyncio.create_task(_hold(controller, release)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert (controller.active, controller.queued) == (1, 1)
+
+        stat = asyncio.create_task(_hold(controller, release, priority=Priority.stat))
+        await asyncio.sleep(0)
+        assert (controller.active, controller.queued) == (2, 1)
+
+        release.set()
+        await asyncio.gather(*routine, stat)
+        assert (controller.active, controller.queued) == (0, 0)
+
+    @pytest.mark.asyncio
+    async def test_stat_admitted_before_queued_routine(self):
+        controller = AdmissionController(max_active=1)
+        order: list[str] = []
+        release = asyncio.Event()
+
+        async def run(name: str, priority: Priority) -> None:
+            async with controller.admit(priority=priority):
+                order.append(name)
+
+        held = asyncio.create_task(_hold(controller, release))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(run("routine", Priority.routine)),
+            asyncio.create_task(run("stat", Priority.stat)),
+        ]
+        await asyncio.sleep(0)
+
+        release.set()
+        await asyncio.gather(held, *waiting)
+        assert order == ["stat", "routine"]
+
+    @pytest.mark.asyncio
+    async def test_routine_shed_first(self):
+        controller = AdmissionController(max_active=1, max_queued=1, max_bytes=100)
+        release = asyncio.Event()
+        held = [
+            asyncio.create_task(_hold(controller, release, cost=40)),
+            asyncio.create_task(_hold(controller, release, cost=35)),
+        ]
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError) as exc_info:
+            async with controller.admit(5):
+                pass
+        assert exc_info.value.reason == "queue_full"
+        with pytest.raises(OverloadedError) as exc_info:
+            async with controller.admit(30, Priority.stat):
+                pass
+        assert exc_info.value.reason == "memory"
+
+        stat = asyncio.create_task(_hold(controller, release, cost=5, priority=Priority.stat))
+        await asyncio.sleep(0)
+        assert controller.queued == 2
+
+        release.set()
+        await asyncio.gather(*held, stat)
+        assert controller.reserved_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_middleware_rejects_before_reading_body(monkeypatch: pytest.MonkeyPatch):
+    controller = AdmissionController(max_bytes=100)
+    monkeypatch.setattr("labx.api.admission.get_admission_controller", lambda: controller)
+    release = asyncio.Event()
+    held = asyncio.create_task(_hold(controller, release, cost=100))
+    await asyncio.sleep(0)
+
+    async def app(scope, receive, send):  # pragma: no cover - must not run
+        raise AssertionError("request should have been shed")
+
+    async def receive():  # pragma: no cover - body must not be read
+        raise AssertionError("body should not be read")
+
+    sent: list[dict] = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/analyse",
+        "headers": [(b"content-length", b"50")],
+    }
+    await AdmissionMiddleware(app)(scope, receive, send)
+
+    start = sent[0]
+    assert start["status"] == 503
+    assert any(name == b"retry-after" for name, _ in start["headers"])
+
+    release.set()
+    await held
+
+
+def _chunked_receive(chunks: list[bytes]):
+    messages = [
+        {"type": "http.request", "body": c, "more_body": i < len(chunks) - 1}
+        for i, c in enumerate(chunks)
+    ]
+
+    async def receive():
+        return messages.pop(0)
+
+    return receive
+
+
+async def _send_nothing(message):  # pragma: no cover - not reached by these apps
+    pass
+
+
+_CHUNKED_SCOPE = {"type": "http", "method": "POST", "path": "/analyse", "headers": []}
+
+
+@pytest.mark.asyncio
+async def test_middleware_takes_slot_only_after_upload(monkeypatch: pytest.MonkeyPatch):
+    controller = AdmissionController(max_active=1, max_bytes=1000)
+    monkeypatch.setattr("labx.api.admission.get_admission_controller", lambda: controller)
+    seen: list[tuple[int, int]] = []
+
+    async def app(scope, receive, send):
+        while True:
+            message = await receive()
+            seen.append((controller.active, controller.reserved_bytes))
+            if not message["more_body"]:
+                return
+
+    await AdmissionMiddleware(app)(
+        _CHUNKED_SCOPE, _chunked_receive([b"x" * 100, b"x" * 100, b"x" * 50]), _send_nothing
+    )
+
+    assert seen == [(0, 100), (0, 200), (1, 250)]
+    assert (controller.active, controller.reserved_bytes) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_slow_upload_does_not_block_others(monkeypatch: pytest.MonkeyPatch):
+    controller = AdmissionController(max_active=1, max_bytes=1000)
+    monkeypatch.setattr("labx.api.admission.get_admission_controller", lambda: controller)
+    release = asyncio.Event()
+
+    async def slow_client():
+        yield {"type": "http.request", "body": b"x" * 100, "more_body": True}
+        await release.wait()
+        yield {"type": "http.request", "body": b"", "more_body": False}
+
+    slow_messages = slow_client()
+
+    async def read_all(scope, receive, send):
+        while (await receive())["more_body"]:
+            pass
+
+    slow = asyncio.create_task(
+        AdmissionMiddleware(read_all)(_CHUNKED_SCOPE, slow_messages.__anext__, _send_nothing)
+    )
+    await asyncio.sleep(0)
+    assert controller.reserved_bytes == 100
+
+    # A second chunked upload is neither shed nor queued behind the slow one.
+    await AdmissionMiddleware(read_all)(
+        _CHUNKED_SCOPE, _chunked_receive([b"y" * 300]), _send_nothing
+    )
+
+    release.set()
+    await slow
+    assert (controller.active, controller.reserved_bytes) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_body_over_budget_shed_as_it_arrives(monkeypatch: pytest.MonkeyPatch):
+    controller = AdmissionController(max_bytes=100)
+    monkeypatch.setattr("labx.api.admission.get_admission_controller", lambda: controller)
+    release = asyncio.Event()
+    held = asyncio.create_task(_hold(controller, release, cost=40))
+    await asyncio.sleep(0)
+    sent: list[dict] = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def read_all(scope, receive, send):
+        while (await receive())["more_body"]:
+            pass
+
+    await AdmissionMiddleware(read_all)(
+        _CHUNKED_SCOPE, _chunked_receive([b"x" * 30, b"x" * 30, b"x" * 30]), send
+    )
+
+    assert sent[0]["status"] == 503
+    assert controller.reserved_bytes == 40
+    release.set()
+    await held
@@ -0,0 +1,49 @@
+"""Tests for the Anthropic text summarizer's retry and rate accounting."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+import anthropic
+import httpx
+import pytest
+
+from labx.config.settings import Settings
+from labx.domain.models import AnalysisReport
+from labx.pipeline.concurrency import AdaptiveLimiter
+from labx.pipeline.ratelimit import ProviderRateLimiter
+from labx.providers import anthropic_text
+
+
+class FlakyMessages:
+    """Overloaded (529) on the first call, then answers."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def create(self, **kwargs: Any) -> Any:
+        self.calls += 1
+        if self.calls == 1:
+            request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+            response = httpx.Response(529, headers={"retry-after": "0"}, request=request)
+            raise anthropic.InternalServerError("overloaded", response=response, body=None)
+        usage = SimpleNamespace(input_tokens=900, output_tokens=120)
+        return SimpleNamespace(content=[SimpleNamespace(text="Stable.")], usage=usage)
+
+
+@pytest.mark.asyncio
+async def test_summary_retried_under_shared_limits(monkeypatch: pytest.MonkeyPatch):
+    messages = FlakyMessages()
+    monkeypatch.setattr(
+        anthropic_text, "get_client", lambda s: SimpleNamespace(messages=messages)
+    )
+    limiter = AdaptiveLimiter(2, min_limit=1, max_limit=4)
+    rate_limiter = ProviderRateLimiter(rpm=100, itpm=100_000, otpm=100_000)
+    summarizer = anthropic_text.AnthropicTextSummarizer(
+        Settings(), limiter=limiter, rate_limiter=rate_limiter
+    )
+
+    assert await summarizer.summarize(AnalysisReport()) == "Stable."
+    assert messages.calls == 2
+    assert limiter.inflight == 0
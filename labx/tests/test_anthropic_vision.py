@@ -0,0 +1,457 @@
+"""Tests for the Anthropic vision extractor's request layout and usage accounting."""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+from datetime import date
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from labx.config.settings import Settings
+from labx.domain.models import LabReport
+from labx.pipeline.image_io import prepare_image_bytes
+from labx.providers import anthropic_vision
+from labx.providers.base import analyte_scope, column_dates_scope
+
+_JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 100
+_REPORT = {
+    "patient": {},
+    "panels": [
+        {
+            "panel_name": "BMP",
+            "results": [
+                {"analyte_key": "sodium", "observations": [{"date": "2024-01-01", "value": 140}]},
+                {"analyte_key": "potassium", "observations": [{"date": "2024-01-01", "value": 7}]},
+            ],
+        }
+    ],
+}
+
+
+class FakeMessages:
+    """Answers with a tool call when tools are offered, otherwise with *text*."""
+
+    def __init__(
+        self, *, text: str | None = None, cache_read: int = 0, cache_write: int = 0
+    ) -> None:
+        self.calls: list[dict[str, Any]] = []
+        self._text = text if text is not None else json.dumps(_REPORT)
+        self._usage = SimpleNamespace(
+            input_tokens=1500,
+            output_tokens=200,
+            cache_read_input_tokens=cache_read,
+            cache_creation_input_tokens=cache_write,
+        )
+
+    async def create(self, **kwargs: Any) -> Any:
+        self.calls.append(kwargs)
+        if "tools" in kwargs:
+            block = SimpleNamespace(type="tool_use", name=kwargs["tools"][0]["name"], input=_REPORT)
+        elif kwargs["system"] == anthropic_vision._REPAIR_SYSTEM:
+            block = SimpleNamespace(type="text", text=json.dumps(_REPORT))
+        else:
+            block = SimpleNamespace(type="text", text=self._text)
+        return SimpleNamespace(content=[block], usage=self._usage)
+
+    def stream(self, **kwargs: Any) -> FakeStream:
+        return FakeStream(self, kwargs)
+
+
+class FakeStream:
+    """Replays the fake response as tool-input deltas of a few characters.
+
+    The streamed text is the response's ``streamed`` attribute when set
+    (e.g. cut off mid-analyte), otherwise the report JSON.
+    """
+
+    def __init__(self, messages: FakeMessages, kwargs: dict[str, Any]) -> None:
+        self._messages = messages
+        self._kwargs = kwargs
+
+    async def __aenter__(self) -> FakeStream:
+        self._final = await self._messages.create(**self._kwargs)
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        return None
+
+    async def __aiter__(self):
+        text = getattr(self._final, "streamed", None) or json.dumps(_REPORT)
+        for i in range(0, len(text), 5):
+            delta = SimpleNamespace(type="input_json_delta", partial_json=text[i : i + 5])
+            yield SimpleNamespace(type="content_block_delta", delta=delta)
+
+    async def get_final_message(self) -> Any:
+        return self._final
+
+
+def _extractor(
+    monkeypatch: pytest.MonkeyPatch, messages: FakeMessages, **settings: Any
+) -> anthropic_vision.AnthropicVisionExtractor:
+    client = SimpleNamespace(messages=messages)
+    monkeypatch.setattr(anthropic_vision, "get_client", lambda s: client)
+    return anthropic_vision.AnthropicVisionExtractor(Settings(**settings))
+
+
+@pytest.mark.asyncio
+async def test_prompt_is_cached_prefix_before_image(monkeypatch: pytest.MonkeyPatch):
+    messages = FakeMessages()
+    ext = _extractor(monkeypatch, messages)
+
+    report = await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+    assert report.panels[0].panel_name == "BMP"
+    content = messages.calls[0]["messages"][0]["content"]
+    assert [block["type"] for block in content] == ["text", "image"]
+    assert content[0]["cache_control"] == {"type": "ephemeral"}
+
+
+@pytest.mark.asyncio
+async def test_prompt_cache_disabled_keeps_image_first(monkeypatch: pytest.MonkeyPatch):
+    messages = FakeMessages()
+    ext = _extractor(monkeypatch, messages, prompt_cache=False)
+
+    await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+    content = messages.calls[0]["messages"][0]["content"]
+    assert [block["type"] for block in content] == ["image", "text"]
+    assert "cache_control" not in content[1]
+
+
+@pytest.mark.asyncio
+async def test_cache_usage_recorded(monkeypatch: pytest.MonkeyPatch):
+    recorded: list[tuple[str, int, int]] = []
+    monkeypatch.setattr(
+        anthropic_vision,
+        "inc_prompt_cache_tokens",
+        lambda model, read, written: recorded.append((model, read, written)),
+    )
+    ext = _extractor(monkeypatch, FakeMessages(cache_read=1100, cache_write=0))
+
+    await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+    assert recorded == [(ext._settings.model_vision, 1100, 0)]
+
+
+def test_short_prefix_warns_once(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+):
+    monkeypatch.setattr(anthropic_vision, "_MIN_CACHEABLE_TOKENS", 10**6)
+    anthropic_vision._warn_uncacheable_prefix.cache_clear()
+
+    for _ in range(2):
+        _extractor(monkeypatch, FakeMessages())
+    _extractor(monkeypatch, FakeMessages(), prompt_cache=False)
+
+    warnings = [r for r in caplog.records if "caching minimum" in r.getMessage()]
+    assert len(warnings) == 1
+    assert warnings[0].levelname == "WARNING"
+    anthropic_vision._warn_uncacheable_prefix.cache_clear()
+
+
+def test_tool_schema_generated_from_report_model():
+    schema = anthropic_vision._report_tool()["input_schema"]
+
+    assert set(schema["properties"]) == {"patient", "panels"}
+    analyte = schema["properties"]["panels"]["items"]["properties"]["results"]["items"]
+    observation = analyte["properties"]["observations"]["items"]
+    assert "ref_range" not in analyte["properties"]
+    assert "flag_computed" not in observation["properties"]
+    assert observation["required"] == ["date", "value"]
+    assert "$ref" not in json.dumps(schema)
+    assert set(schema["properties"]) <= set(LabReport.model_fields)
+
+
+@pytest.mark.asyncio
+async def test_tool_mode_reads_tool_input(monkeypatch: pytest.MonkeyPatch):
+    repairs: list[str] = []
+    monkeypatch.setattr(anthropic_vision, "inc_json_repair", repairs.append)
+    messages = FakeMessages()
+    ext = _extractor(monkeypatch, messages)
+
+    report = await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+    call = messages.calls[0]
+    assert call["tool_choice"] == {"type": "tool", "name": "record_lab_report"}
+    assert report.raw_json == _REPORT
+    assert len(messages.calls) == 1
+    assert repairs == []
+
+
+@pytest.mark.asyncio
+async def test_text_mode_escalates_to_model_repair(monkeypatch: pytest.MonkeyPatch):
+    repairs: list[tuple[str, str]] = []
+    monkeypatch.setattr(anthropic_vision, "inc_json_repair", lambda *a: repairs.append(a))
+    messages = FakeMessages(text="The image is too blurry to read.")
+    ext = _extractor(monkeypatch, messages, vision_output_mode="text")
+
+    report = await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+    assert "tools" not in messages.calls[0]
+    assert len(messages.calls) == 2
+    assert repairs == [("text", "model")]
+    assert report.panels[0].panel_name == "BMP"
+
+
+@pytest.mark.asyncio
+async def test_truncated_output_salvaged_without_second_call(monkeypatch: pytest.MonkeyPatch):
+    repairs: list[tuple[str, str]] = []
+    monkeypatch.setattr(anthropic_vision, "inc_json_repair", lambda *a: repairs.append(a))
+    messages = FakeMessages(text=_TRUNCATED)
+    ext = _extractor(monkeypatch, messages, vision_output_mode="text")
+
+    report = await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+    assert len(messages.calls) == 1
+    assert repairs == [("text", "local")]
+    assert [a.analyte_key for a in report.panels[0].results] == ["sodium"]
+
+
+_SODIUM = (
+    '{"analyte_key": "sodium", "observations": '
+    '[{"date": "2024-01-01", "value": 140}, {"date": "2024-01-02", "value": 141}]}'
+)
+_TRUNCATED = (
+    '```json\n{"patient": {"name": "A"}, "panels": [{"panel_name": "BMP", "results": ['
+    + _SODIUM
+    + ', {"analyte_key": "potassium", "observations": [{"date": "2024-01-01", "value": 4.1}, '
+    '{"date": "2024-01-02", "val'
+)
+
+
+class TestSalvageJson:
+    def test_truncated_keeps_only_whole_analytes(self):
+        data = anthropic_vision._salvage_json(_TRUNCATED)
+        assert data is not None
+        results = data["panels"][0]["results"]
+        assert [r["analyte_key"] for r in results] == ["sodium"]
+        assert len(results[0]["observations"]) == 2
+        assert data["patient"] == {"name": "A"}
+
+    def test_trailing_commas_and_prose(self):
+        text = 'Here you go:\n{"panels": [{"panel_name": "CBC",},],} Hope that helps {'
+        assert anthropic_vision._salvage_json(text) == {"panels": [{"panel_name": "CBC"}]}
+
+    def test_brackets_inside_strings_ignored(self):
+        text = '{"patient": {"name": "A } ] \\" ,"}, "panels": [{"panel_name": "x"'
+        assert anthropic_vision._salvage_json(text) == {
+            "patient": {"name": 'A } ] " ,'},
+            "panels": [],
+        }
+
+    @pytest.mark.parametrize("text", ["no json here", '{"panels": [}', '{"pat'])
+    def test_unrecoverable(self, text: str):
+        assert anthropic_vision._salvage_json(text) is None
+
+
+@pytest.mark.asyncio
+async def test_read_identity(monkeypatch: pytest.MonkeyPatch):
+    image = prepare_image_bytes(_JPEG, "lab.jpg")
+    text = '{"mrn": "A-123", "dates": ["2024-01-01", "2024-02-01"]}'
+    ext = _extractor(monkeypatch, FakeMessages(text=text))
+
+    identity = await ext.read_identity(image)
+
+    assert identity is not None
+    assert identity.patient_id == "A-123"
+    assert identity.dates == {date(2024, 1, 1), date(2024, 2, 1)}
+    ext = _extractor(monkeypatch, FakeMessages(text='{"mrn": "A-123", "dates": ["Jan 1"]}'))
+    assert await ext.read_identity(image) is None
+
+
+@pytest.mark.asyncio
+async def test_band_told_column_dates(monkeypatch: pytest.MonkeyPatch):
+    messages = FakeMessages()
+    ext = _extractor(monkeypatch, messages)
+
+    with column_dates_scope([date(2024, 3, 1), date(2024, 1, 1)]):
+        await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg#1"))
+    await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+    band, whole = (call["messages"][0]["content"] for call in messages.calls)
+    assert "2024-03-01, 2024-01-01" in band[-1]["text"]
+    assert [block["type"] for block in whole] == ["text", "image"]
+
+
+def test_system_prompt_changes_fingerprint(monkeypatch: pytest.MonkeyPatch):
+    before = _extractor(monkeypatch, FakeMessages()).fingerprint
+    monkeypatch.setattr(anthropic_vision, "_TOOL_SYSTEM", "You extract lab reports.")
+    assert _extractor(monkeypatch, FakeMessages()).fingerprint != before
+
+
+def test_output_mode_changes_fingerprint(monkeypatch: pytest.MonkeyPatch):
+    tool = _extractor(monkeypatch, FakeMessages())
+    text = _extractor(monkeypatch, FakeMessages(), vision_output_mode="text")
+    assert tool.fingerprint != text.fingerprint
+
+
+@pytest.mark.asyncio
+async def test_json_only_rule_sent_in_text_mode_only(monkeypatch: pytest.MonkeyPatch):
+    messages = FakeMessages()
+    await _extractor(monkeypatch, messages).extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+    prompt = messages.calls[0]["messages"][0]["content"][0]["text"]
+    assert "Output ONLY valid JSON" not in prompt
+    assert "Extract EVERY analyte row" in prompt
+
+    text = _extractor(monkeypatch, FakeMessages(), vision_output_mode="text")
+    assert "Output ONLY valid JSON" in text._prompt
+
+
+@pytest.mark.asyncio
+async def test_streams_analytes_to_listener(monkeypatch: pytest.MonkeyPatch):
+    messages = FakeMessages()
+    ext = _extractor(monkeypatch, messages)
+    seen: list[tuple[int, str]] = []
+
+    with analyte_scope(lambda panel, analyte: seen.append((panel, analyte.analyte_key))):
+        report = await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+    assert seen == [(0, "sodium"), (0, "potassium")]
+    assert len(report.panels[0].results) == 2
+
+
+@pytest.mark.asyncio
+async def test_streaming_off_uses_single_response_with_scaled_timeout(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    messages = FakeMessages()
+    monkeypatch.setattr(messages, "stream", None)
+
+    with analyte_scope(lambda panel, analyte: None):
+        ext = _extractor(monkeypatch, messages, vision_streaming=False)
+        await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+    (call,) = messages.calls
+    assert call["timeout"] == 60 + call["max_tokens"] / 40
+
+
+def _analyte(key: str, *, normalized: bool = True) -> dict[str, Any]:
+    observations = [{"date": "2024-01-01", "value": 1.0}]
+    if not normalized:  # as printed: no key yet, units shared across rows
+        return {"raw_name": key.title(), "raw_unit": "mmol/L", "observations": observations}
+    return {"raw_name": key.title(), "analyte_key": key, "observations": observations}
+
+
+class ScriptedMessages:
+    """Returns tool calls with the given (stop reason, analyte keys) in turn.
+
+    A ``max_tokens`` response streams its JSON cut off inside the last
+    analyte, or just after it with ``cut_inside=False``.
+    """
+
+    def __init__(
+        self, *script: tuple[str, list[str]], cut_inside: bool = True, normalized: bool = True
+    ) -> None:
+        self.calls: list[dict[str, Any]] = []
+        self._script = list(script)
+        self._cut_inside = cut_inside
+        self._normalized = normalized
+
+    async def create(self, **kwargs: Any) -> Any:
+        self.calls.append(kwargs)
+        stop_reason, keys = self._script[min(len(self.calls), len(self._script)) - 1]
+        results = [_analyte(k, normalized=self._normalized) for k in keys]
+        data = {"panels": [{"panel_name": "BMP", "results": results}]}
+        text = json.dumps(data)
+        if stop_reason == "max_tokens":
+            text = text[: text.rindex('"observations"')] if self._cut_inside else text[:-4]
+        block = SimpleNamespace(type="tool_use", name="record_lab_report", input=data)
+        usage = SimpleNamespace(input_tokens=1500, output_tokens=4096)
+        return SimpleNamespace(
+            content=[block], stop_reason=stop_reason, usage=usage, streamed=text
+        )
+
+    def stream(self, **kwargs: Any) -> FakeStream:
+        return FakeStream(self, kwargs)  # type: ignore[arg-type]
+
+
+class TestContinuation:
+    @pytest.fixture(autouse=True)
+    def _counted(self, monkeypatch: pytest.MonkeyPatch):
+        self.continuations: list[str] = []
+        monkeypatch.setattr(anthropic_vision, "inc_continuation", self.continuations.append)
+
+    @pytest.mark.asyncio
+    async def test_max_tokens_sized_from_page_shape(self, monkeypatch: pytest.MonkeyPatch):
+        messages = ScriptedMessages(("end_turn", ["sodium"]))
+        ext = _extractor(monkeypatch, messages)  # type: ignore[arg-type]
+
+        image = prepare_image_bytes(_JPEG, "lab.jpg")
+        await ext.extract(dataclasses.replace(image, width=1000, height=1000))
+        await ext.extract(dataclasses.replace(image, width=1000, height=3000))
+
+        assert messages.calls[0]["max_tokens"] == 4300
+        assert messages.calls[1]["max_tokens"] == 12300
+
+    @pytest.mark.asyncio
+    async def test_truncated_output_continued_for_missing_rows(
+        self, monkeypatch: pytest.MonkeyPatch
+    ):
+        messages = ScriptedMessages(
+            ("max_tokens", ["sodium", "potassium"]), ("end_turn", ["potassium", "chloride"])
+        )
+        ext = _extractor(monkeypatch, messages)  # type: ignore[arg-type]
+
+        report = await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+        follow_up = messages.calls[1]["messages"][0]["content"][-1]["text"]
+        assert "- BMP: Sodium" in follow_up
+        assert "Potassium" not in follow_up  # cut short, so asked for again
+        assert messages.calls[1]["max_tokens"] == 16384
+        assert [a.analyte_key for a in report.panels[0].results] == [
+            "sodium",
+            "potassium",
+            "chloride",
+        ]
+        assert self.continuations == ["complete"]
+
+    @pytest.mark.asyncio
+    async def test_whole_last_analyte_kept_and_rows_not_collapsed(
+        self, monkeypatch: pytest.MonkeyPatch
+    ):
+        messages = ScriptedMessages(
+            ("max_tokens", ["sodium", "potassium"]),
+            ("end_turn", ["chloride"]),
+            cut_inside=False,
+            normalized=False,
+        )
+        ext = _extractor(monkeypatch, messages)  # type: ignore[arg-type]
+
+        report = await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+        follow_up = messages.calls[1]["messages"][0]["content"][-1]["text"]
+        assert "- BMP: Potassium" in follow_up
+        assert [a.raw_name for a in report.panels[0].results] == [
+            "Sodium",
+            "Potassium",
+            "Chloride",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_unstreamed_truncation_drops_last_analyte(
+        self, monkeypatch: pytest.MonkeyPatch
+    ):
+        messages = ScriptedMessages(
+            ("max_tokens", ["sodium", "potassium"]), ("end_turn", ["potassium"]), cut_inside=False
+        )
+        ext = _extractor(monkeypatch, messages, vision_streaming=False)  # type: ignore[arg-type]
+
+        report = await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+        follow_up = messages.calls[1]["messages"][0]["content"][-1]["text"]
+        assert "Potassium" not in follow_up
+        assert [a.analyte_key for a in report.panels[0].results] == ["sodium", "potassium"]
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_continuations(self, monkeypatch: pytest.MonkeyPatch):
+        messages = ScriptedMessages(("max_tokens", ["sodium", "potassium"]))
+        ext = _extractor(monkeypatch, messages, vision_max_continuations=1)  # type: ignore[arg-type]
+
+        report = await ext.extract(prepare_image_bytes(_JPEG, "lab.jpg"))
+
+        assert len(messages.calls) == 2
+        assert [a.analyte_key for a in report.panels[0].results] == ["sodium"]
+        assert self.continuations == ["incomplete"]
@@ -0,0 +1,57 @@
+"""Tests for the Server-Sent Events variant of /analyse."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from labx.api.server import app
+from labx.pipeline import orchestrator
+from tests.test_pipeline_smoke import MockExtractor
+
+_JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 100
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    monkeypatch.setenv("LABX_API_KEY", "test-key")
+    monkeypatch.setattr(orchestrator, "AnthropicVisionExtractor", lambda s: MockExtractor())
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_stream_emits_progress_then_report(client: TestClient):
+    response = client.post(
+        "/analyse/stream?summary=false",
+        headers={"X-API-Key": "test-key"},
+        files=[("files", ("a.jpg", _JPEG, "image/jpeg"))],
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "image_loaded"
+    assert "report_normalized" in names
+    assert names[-1] == "complete"
+    assert len(events[-1][1]["analysis"]["trends"]) == 2
+
+
+def test_stream_rejects_invalid_image_before_streaming(client: TestClient):
+    response = client.post(
+        "/analyse/stream?summary=false",
+        headers={"X-API-Key": "test-key"},
+        files=[("files", ("notes.txt", b"not an image", "text/plain"))],
+    )
+
+    assert response.status_code == 422
+    assert response.json()["error"] == "image_validation"
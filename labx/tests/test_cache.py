@@ -0,0 +1,295 @@
+"""Tests for the tiered extraction cache."""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from labx.config.settings import Settings
+from labx.domain.models import LabAnalyte, LabPanel, LabReport, Observation
+from labx.pipeline.image_io import PreparedImage
+from labx.providers.base import VisionExtractor
+from labx.providers.cached import CachedVisionExtractor
+from labx.storage.cache import (
+    CacheEntry,
+    DiskCache,
+    MemoryCache,
+    SQLiteCache,
+    TieredCache,
+    get_cache,
+    reset_cache,
+)
+from labx.storage.sqlite import ThreadLocalConnection
+
+
+def _report(image_id: str = "img1", value: float = 140.0) -> LabReport:
+    return LabReport(
+        source_image_id=image_id,
+        panels=[
+            LabPanel(
+                panel_name="BMP",
+                results=[
+                    LabAnalyte(
+                        analyte_key="sodium",
+                        observations=[Observation(date=date(2024, 1, 1), value=value)],
+                    )
+                ],
+            )
+        ],
+    )
+
+
+def _entry(image_id: str, fingerprint: str = "fp1") -> CacheEntry:
+    return CacheEntry(fingerprint, _report(image_id))
+
+
+def _image(image_id: str = "a" * 64) -> PreparedImage:
+    return PreparedImage(
+        image_id=image_id,
+        media_type="image/jpeg",
+        data=b"",
+        file_name="lab.jpg",
+    )
+
+
+class CountingExtractor(VisionExtractor):
+    def __init__(self, fingerprint: str | None = "fp1") -> None:
+        self.calls = 0
+        self._fingerprint = fingerprint
+
+    @property
+    def fingerprint(self) -> str | None:
+        return self._fingerprint
+
+    async def extract(self, image):
+        self.calls += 1
+        return _report(image.image_id)
+
+
+class TestMemoryCache:
+    def test_lru_eviction(self):
+        cache = MemoryCache(max_entries=2)
+        cache.put("a", _entry("a"))
+        cache.put("b", _entry("b"))
+        assert cache.get("a") is not None  # touch "a" so "b" is least recent
+        cache.put("c", _entry("c"))
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+
+    def test_ttl_expiry(self):
+        cache = MemoryCache(max_entries=4, ttl_s=-1)
+        cache.put("a", _entry("a"))
+        assert cache.get("a") is None
+
+    def test_returns_copies(self):
+        cache = MemoryCache()
+        cache.put("a", _entry("a"))
+        hit = cache.get("a").report
+        hit.panels[0].results[0].analyte_key = "mutated"
+        assert cache.get("a").report.panels[0].results[0].analyte_key == "sodium"
+
+
+class TestTieredCache:
+    def test_persistent_hit_promoted_to_memory(self, tmp_path: Path):
+        disk = DiskCache(tmp_path)
+        disk.put("k", _entry("k"))
+        cache = TieredCache(MemoryCache(), disk)
+
+        assert cache.get("k", "fp1") is not None
+        assert cache.get("k", "fp1") is not None
+        assert cache.stats.persistent_hits == 1
+        assert cache.stats.memory_hits == 1
+
+    def test_miss_counted(self, tmp_path: Path):
+        cache = TieredCache(MemoryCache(), DiskCache(tmp_path))
+        assert cache.get("missing", "fp1") is None
+        assert cache.stats.misses == 1
+        assert cache.stats.hit_rate == 0.0
+
+    def test_stale_fingerprint_invalidated(self, tmp_path: Path):
+        disk = DiskCache(tmp_path)
+        cache = TieredCache(MemoryCache(), disk)
+        cache.put("k", "old", _report("k"))
+
+        assert cache.get("k", "new") is None
+        assert cache.stats.stale == 1
+        assert disk.get("k") is None
+
+    def test_compatible_fingerprint_migrated(self, tmp_path: Path):
+        disk = DiskCache(tmp_path)
+        cache = TieredCache(MemoryCache(), disk, compatible=frozenset({"old"}))
+        cache.put("k", "old", _report("k"))
+
+        assert cache.get("k", "new") is not None
+        assert cache.stats.migrated == 1
+        assert disk.get("k").fingerprint == "new"
+
+    def test_purge_stale(self, tmp_path: Path):
+        disk = DiskCache(tmp_path)
+        disk.put("a", _entry("a", "old"))
+        disk.put("b", _entry("b", "new"))
+        cache = TieredCache(MemoryCache(), disk)
+
+        assert cache.purge_stale("new") == 1
+        assert disk.get("b") is not None
+
+    def test_purge_skipped_until_fingerprint_changes(self, tmp_path: Path):
+        disk = DiskCache(tmp_path)
+        disk.put("a", _entry("a", "old"))
+        assert disk.purge(frozenset({"new"})) == 1
+
+        disk.put("c", _entry("c", "older"))
+        assert DiskCache(tmp_path).purge(frozenset({"new"})) == 0
+        assert disk.purge(frozenset({"newer"})) == 1
+
+    def test_legacy_entry_reads_as_stale(self, tmp_path: Path):
+        (tmp_path / "k.json").write_text(_report("k").model_dump_json(), encoding="utf-8")
+        cache = TieredCache(MemoryCache(), DiskCache(tmp_path))
+        assert cache.get("k", "fp1") is None
+
+    def test_disk_max_entries(self, tmp_path: Path):
+        disk = DiskCache(tmp_path, max_entries=2)
+        for key in ("a", "b", "c"):
+            disk.put(key, _entry(key))
+        assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+class TestSQLiteCache:
+    def test_round_trip(self, tmp_path: Path):
+        db = SQLiteCache(tmp_path / "cache.sqlite3")
+        db.put("k", _entry("k"))
+        entry = db.get("k")
+        assert entry.fingerprint == "fp1"
+        assert entry.report.panels[0].results[0].analyte_key == "sodium"
+
+    def test_upsert_replaces(self, tmp_path: Path):
+        db = SQLiteCache(tmp_path / "cache.sqlite3")
+        db.put("k", _entry("k", "old"))
+        db.put("k", _entry("k", "new"))
+        assert len(db) == 1
+        assert db.get("k").fingerprint == "new"
+
+    def test_shared_between_instances(self, tmp_path: Path):
+        path = tmp_path / "cache.sqlite3"
+        SQLiteCache(path).put("k", _entry("k"))
+        assert SQLiteCache(path).get("k") is not None
+
+    def test_byte_budget_evicts_least_recent(self, tmp_path: Path):
+        db = SQLiteCache(tmp_path / "cache.sqlite3")
+        db.put("probe", _entry("probe"))
+        size = db.total_bytes()
+        db.clear()
+
+        db = SQLiteCache(tmp_path / "cache.sqlite3", max_bytes=size * 3)
+        for key in ("a", "b", "c"):
+            db.put(key, _entry(key))
+        db.get("a")  # refresh "a"
+        db.put("d", _entry("d"))
+
+        assert db.total_bytes() <= size * 3
+        assert db.get("a") is not None
+        assert db.get("b") is None
+
+    def test_lfu_keeps_frequently_read(self, tmp_path: Path):
+        db = SQLiteCache(tmp_path / "cache.sqlite3")
+        db.put("probe", _entry("probe"))
+        size = db.total_bytes()
+        db.clear()
+
+        db = SQLiteCache(tmp_path / "cache.sqlite3", max_bytes=size * 2, policy="lfu")
+        db.put("hot", _entry("hot"))
+        db.get("hot")
+        db.get("hot")
+        db.put("cold", _entry("cold"))
+        db.put("new", _entry("new"))
+
+        assert db.get("hot") is not None
+        assert db.get("cold") is None
+
+    def test_purge_by_fingerprint(self, tmp_path: Path):
+        db = SQLiteCache(tmp_path / "cache.sqlite3")
+        db.put("a", _entry("a", "old"))
+        db.put("b", _entry("b", "new"))
+        assert db.purge(frozenset({"new"})) == 1
+        assert db.get("b") is not None
+
+    def test_purge_batches_and_runs_once_per_fingerprint(self, tmp_path: Path, monkeypatch):
+        monkeypatch.setattr("labx.storage.cache._PURGE_BATCH", 2)
+        db = SQLiteCache(tmp_path / "cache.sqlite3")
+        for i in range(5):
+            db.put(f"old{i}", _entry(f"old{i}", "old"))
+        db.put("b", _entry("b", "new"))
+
+        assert db.purge(frozenset({"new"})) == 5
+        assert len(db) == 1
+
+        db.put("c", _entry("c", "old"))
+        assert SQLiteCache(tmp_path / "cache.sqlite3").purge(frozenset({"new"})) == 0
+        assert db.purge(frozenset({"new", "newer"})) == 1
+
+
+class TestCachedVisionExtractor:
+    @pytest.mark.asyncio
+    async def test_repeat_image_skips_extractor(self):
+        inner = CountingExtractor()
+        ext = CachedVisionExtractor(inner, TieredCache(MemoryCache()))
+
+        await ext.extract(_image())
+        report = await ext.extract(_image())
+
+        assert inner.calls == 1
+        assert report.panels[0].results[0].analyte_key == "sodium"
+
+    @pytest.mark.asyncio
+    async def test_fingerprint_change_misses(self):
+        cache = TieredCache(MemoryCache())
+        first = CountingExtractor("fp1")
+        second = CountingExtractor("fp2")
+
+        await CachedVisionExtractor(first, cache).extract(_image())
+        await CachedVisionExtractor(second, cache).extract(_image())
+
+        assert first.calls == 1
+        assert second.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_no_fingerprint_bypasses_cache(self):
+        inner = CountingExtractor(fingerprint=None)
+        ext = CachedVisionExtractor(inner, TieredCache(MemoryCache()))
+
+        await ext.extract(_image())
+        await ext.extract(_image())
+
+        assert inner.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_preprocessing_change_misses(self):
+        cache, inner = TieredCache(MemoryCache()), CountingExtractor()
+
+        await CachedVisionExtractor(inner, cache, preprocessing="1920").extract(_image())
+        await CachedVisionExtractor(inner, cache, preprocessing="1920").extract(_image())
+        await CachedVisionExtractor(inner, cache, preprocessing="1024").extract(_image())
+
+        assert inner.calls == 2
+
+
+def test_cache_disabled_has_no_tiers(tmp_path: Path):
+    reset_cache()
+    try:
+        assert get_cache(Settings(cache_enabled=False, cache_memory_entries=256)) is None
+        cache = get_cache(Settings(cache_enabled=True, cache_dir=str(tmp_path)))
+        assert cache is not None
+    finally:
+        reset_cache()
+
+
+def test_thread_local_connection(tmp_path: Path):
+    conn = ThreadLocalConnection(tmp_path / "nested" / "db.sqlite3")
+    assert conn() is conn()
+    assert conn().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    other = ThreadPoolExecutor(1).submit(conn).result()
+    assert other is not conn()
@@ -0,0 +1,333 @@
+"""Tests for the adaptive concurrency limiter and header-aware retry."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import anthropic
+import httpx
+import pytest
+
+from labx.pipeline.concurrency import (
+    AdaptiveLimiter,
+    BackoffGate,
+    Priority,
+    PriorityLock,
+    current_priority,
+    iter_settled,
+    parse_priority,
+    priority_scope,
+    retry_after_seconds,
+    run_concurrently,
+    tenant_scope,
+    with_retry,
+)
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _rate_limit_error(headers: dict[str, str]) -> anthropic.RateLimitError:
+    request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+    response = httpx.Response(429, headers=headers, request=request)
+    return anthropic.RateLimitError("rate limited", response=response, body=None)
+
+
+async def _run_ok(limiter: AdaptiveLimiter, n: int) -> None:
+    for _ in range(n):
+        async with limiter.slot():
+            pass
+
+
+async def _run_failing(limiter: AdaptiveLimiter, status_code: int) -> None:
+    with pytest.raises(FakeStatusError):
+        async with limiter.slot():
+            raise FakeStatusError(status_code)
+
+
+class TestAdaptiveLimiter:
+    @pytest.mark.asyncio
+    async def test_additive_increase_on_success(self):
+        limiter = AdaptiveLimiter(2, min_limit=1, max_limit=8)
+        await _run_ok(limiter, 5)
+        assert limiter.limit > 2
+
+    @pytest.mark.asyncio
+    async def test_increase_capped_at_max(self):
+        limiter = AdaptiveLimiter(2, min_limit=1, max_limit=3)
+        await _run_ok(limiter, 50)
+        assert limiter.limit == 3
+
+    @pytest.mark.asyncio
+    async def test_multiplicative_decrease_on_429(self):
+        limiter = AdaptiveLimiter(8, min_limit=1, max_limit=16)
+        await _run_failing(limiter, 429)
+        assert limiter.limit == 4
+
+    @pytest.mark.asyncio
+    async def test_one_decrease_per_congestion_event(self):
+        limiter = AdaptiveLimiter(8, min_limit=1, max_limit=16)
+        started = [await limiter.acquire() for _ in range(3)]
+        for t in started:
+            limiter.release(t, FakeStatusError(529))
+        assert limiter.limit == 4
+        assert limiter.inflight == 0
+
+    @pytest.mark.asyncio
+    async def test_other_errors_hold_limit(self):
+        limiter = AdaptiveLimiter(4, min_limit=1, max_limit=16)
+        await _run_failing(limiter, 500)
+        assert limiter.limit == 4
+
+    @pytest.mark.asyncio
+    async def test_slow_calls_do_not_grow_limit(self):
+        limiter = AdaptiveLimiter(2, min_limit=1, max_limit=8, latency_target_s=-1)
+        await _run_ok(limiter, 5)
+        assert limiter.limit == 2
+
+    @pytest.mark.asyncio
+    async def test_bounds_inflight(self):
+        limiter = AdaptiveLimiter(2, min_limit=2, max_limit=2)
+        peak = 0
+
+        async def task() -> None:
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.inflight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(task() for _ in range(6)))
+        assert peak == 2
+        assert limiter.inflight == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_releases_queue(self):
+        limiter = AdaptiveLimiter(1, min_limit=1, max_limit=1)
+        started = await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release(started)
+        assert limiter.inflight == 0
+        assert limiter.waiting == 0
+
+
+async def _acquire_in_lane(limiter: AdaptiveLimiter, priority: Priority, order: list[str]) -> None:
+    with priority_scope(priority):
+        started = await limiter.acquire()
+    order.append(priority.name)
+    limiter.release(started)
+
+
+class TestPriorityLanes:
+    @pytest.mark.asyncio
+    async def test_stat_jumps_routine_queue(self):
+        limiter = AdaptiveLimiter(1, min_limit=1, max_limit=1)
+        held = await limiter.acquire()
+        order: list[str] = []
+        routine = [
+            asyncio.create_task(_acquire_in_lane(limiter, Priority.routine, order))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        stat = asyncio.create_task(_acquire_in_lane(limiter, Priority.stat, order))
+        await asyncio.sleep(0)
+
+        limiter.release(held)
+        await asyncio.gather(*routine, stat)
+        assert order[0] == "stat"
+
+    @pytest.mark.asyncio
+    async def test_aging_prevents_starvation(self):
+        limiter = AdaptiveLimiter(1, min_limit=1, max_limit=1, aging_s=0.01)
+        held = await limiter.acquire()
+        order: list[str] = []
+        routine = asyncio.create_task(_acquire_in_lane(limiter, Priority.routine, order))
+        await asyncio.sleep(0.03)
+        stat = asyncio.create_task(_acquire_in_lane(limiter, Priority.stat, order))
+        await asyncio.sleep(0)
+
+        limiter.release(held)
+        await asyncio.gather(routine, stat)
+        assert order == ["routine", "stat"]
+
+    @pytest.mark.asyncio
+    async def test_priority_lock_serves_stat_first(self):
+        lock = PriorityLock()
+        await lock.acquire()
+        order: list[str] = []
+
+        async def take(priority: Priority) -> None:
+            with priority_scope(priority):
+                async with lock:
+                    order.append(priority.name)
+
+        tasks = [asyncio.create_task(take(Priority.routine))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(take(Priority.stat)))
+        await asyncio.sleep(0)
+        lock.release()
+        await asyncio.gather(*tasks)
+        assert order == ["stat", "routine"]
+
+    @pytest.mark.asyncio
+    async def test_scope_propagates_to_spawned_tasks(self):
+        async def lane() -> Priority:
+            return current_priority()
+
+        with priority_scope(Priority.stat):
+            seen = await asyncio.create_task(lane())
+        assert seen is Priority.stat
+        assert current_priority() is Priority.routine
+
+    def test_parse_priority(self):
+        assert parse_priority("STAT") is Priority.stat
+        assert parse_priority(None) is Priority.routine
+        with pytest.raises(ValueError):
+            parse_priority("urgent-ish")
+
+
+async def _acquire_as(limiter: AdaptiveLimiter, tenant: str, order: list[str]) -> None:
+    with tenant_scope(tenant):
+        started = await limiter.acquire()
+        order.append(tenant)
+        await asyncio.sleep(0)
+        limiter.release(started)
+
+
+class TestFairQueueing:
+    @pytest.mark.asyncio
+    async def test_light_tenant_not_stuck_behind_backlog(self):
+        limiter = AdaptiveLimiter(1, min_limit=1, max_limit=1)
+        held = await limiter.acquire()
+        order: list[str] = []
+        heavy = [asyncio.create_task(_acquire_as(limiter, "bulk", order)) for _ in range(5)]
+        await asyncio.sleep(0)
+        light = asyncio.create_task(_acquire_as(limiter, "ward", order))
+        await asyncio.sleep(0)
+
+        limiter.release(held)
+        await asyncio.gather(*heavy, light)
+        assert order.index("ward") <= 1
+
+    @pytest.mark.asyncio
+    async def test_weights_share_slots(self):
+        limiter = AdaptiveLimiter(
+            1, min_limit=1, max_limit=1, tenant_weights={"a": 2.0, "b": 1.0}
+        )
+        held = await limiter.acquire()
+        order: list[str] = []
+        tasks = [
+            asyncio.create_task(_acquire_as(limiter, tenant, order))
+            for _ in range(4)
+            for tenant in ("a", "b")
+        ]
+        await asyncio.sleep(0)
+
+        limiter.release(held)
+        await asyncio.gather(*tasks)
+        assert order[:6].count("a") == 4
+
+    @pytest.mark.asyncio
+    async def test_tenant_cap(self):
+        limiter = AdaptiveLimiter(4, min_limit=4, max_limit=4, default_tenant_cap=1)
+        peak = 0
+
+        async def call(tenant: str) -> None:
+            nonlocal peak
+            with tenant_scope(tenant):
+                async with limiter.slot():
+                    peak = max(peak, limiter.tenant_inflight("bulk"))
+                    await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call("bulk") for _ in range(4)), call("ward"))
+        assert peak == 1
+        assert limiter.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_run_concurrently_preserves_order():
+    async def make(i: int) -> int:
+        await asyncio.sleep(0.001 * (5 - i))
+        return i
+
+    results = await run_concurrently([lambda i=i: make(i) for i in range(5)], max_concurrent=2)
+    assert results == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_iter_settled_yields_in_completion_order():
+    async def make(i: int) -> int:
+        await asyncio.sleep(0.005 * (3 - i))
+        if i == 1:
+            raise ValueError("boom")
+        return i
+
+    results = [r async for r in iter_settled([lambda i=i: make(i) for i in range(3)])]
+    assert [r.index for r in results] == [2, 1, 0]
+    assert isinstance(results[1].error, ValueError)
+    assert results[2].value == 0
+
+
+class TestRetryAfter:
+    def test_retry_after_seconds_header(self):
+        assert retry_after_seconds(_rate_limit_error({"retry-after": "7"})) == 7.0
+
+    def test_ratelimit_reset_header(self):
+        reset = (datetime.now(tz=UTC) + timedelta(seconds=20)).isoformat()
+        exc = _rate_limit_error(
+            {
+                "anthropic-ratelimit-input-tokens-remaining": "0",
+                "anthropic-ratelimit-input-tokens-reset": reset,
+                "anthropic-ratelimit-requests-remaining": "10",
+            }
+        )
+        assert 18 < retry_after_seconds(exc) <= 20
+
+    def test_no_hint(self):
+        assert retry_after_seconds(_rate_limit_error({})) is None
+        assert retry_after_seconds(ValueError("boom")) is None
+
+    @pytest.mark.asyncio
+    async def test_with_retry_waits_hint_and_pauses_lane(self):
+        gate = BackoffGate()
+        attempts = 0
+
+        @with_retry(gate)
+        async def call() -> str:
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise _rate_limit_error({"retry-after": "0.05"})
+            return "ok"
+
+        async def other_caller() -> float:
+            await asyncio.sleep(0.01)
+            waited = gate.remaining
+            await gate.wait()
+            return waited
+
+        result, waited = await asyncio.gather(call(), other_caller())
+        assert result == "ok"
+        assert attempts == 2
+        assert waited > 0
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_error_raised_immediately(self):
+        attempts = 0
+
+        @with_retry(BackoffGate())
+        async def call() -> None:
+            nonlocal attempts
+            attempts += 1
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            await call()
+        assert attempts == 1
@@ -0,0 +1,111 @@
+"""Tests for image loading, lazy base64 encoding and downscaling."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import mmap
+import sys
+from pathlib import Path
+
+import pytest
+
+from labx.config.settings import Settings
+from labx.pipeline.image_io import (
+    ImageValidationError,
+    PreparedImage,
+    check_mime,
+    downscale_image,
+    downscale_images,
+    load_image,
+    prepare_image_bytes,
+    warn_if_pillow_missing,
+)
+
+_JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 100
+
+
+def test_file_is_memory_mapped_not_encoded(tmp_path: Path):
+    p = tmp_path / "lab.jpg"
+    p.write_bytes(_JPEG)
+
+    img = load_image(p)
+
+    assert isinstance(img.data, mmap.mmap)
+    assert img.image_id == hashlib.sha256(_JPEG).hexdigest()
+    assert img.encode_base64() == base64.standard_b64encode(_JPEG).decode("ascii")
+
+
+def test_buffer_is_not_copied():
+    buf = bytearray(_JPEG)
+    img = prepare_image_bytes(memoryview(buf), "lab.jpg")
+
+    assert img.data.obj is buf  # type: ignore[union-attr]
+    assert img.media_type == "image/jpeg"
+    assert img.size_bytes == len(_JPEG)
+
+
+def test_empty_file_cannot_be_mapped_but_is_validated(tmp_path: Path):
+    p = tmp_path / "empty.txt"
+    p.write_bytes(b"")
+    with pytest.raises(ImageValidationError, match="Unsupported"):
+        load_image(p)
+
+
+def test_oversized_file_rejected_without_reading(tmp_path: Path):
+    p = tmp_path / "big.jpg"
+    p.write_bytes(_JPEG + b"\x00" * 2048)
+    with pytest.raises(ImageValidationError, match="limit"):
+        load_image(p, max_mb=1024 / (1024 * 1024))
+
+
+def test_warns_when_pillow_features_enabled_without_pillow(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+):
+    monkeypatch.setitem(sys.modules, "PIL", None)
+
+    warn_if_pillow_missing(Settings(image_downscale=False, tile_tall_images=False))
+    assert not caplog.records
+
+    warn_if_pillow_missing(Settings(image_downscale=False, near_duplicate_mode="verify"))
+    assert "near_duplicate_mode" in caplog.text
+    assert "image_downscale" not in caplog.text
+
+
+class TestDownscale:
+    @pytest.fixture(autouse=True)
+    def _pillow(self):
+        pytest.importorskip("PIL")
+
+    def _photo(self, width: int, height: int, fmt: str = "PNG") -> PreparedImage:
+        from PIL import Image
+
+        out = io.BytesIO()
+        Image.effect_noise((width, height), 64).convert("RGB").save(out, format=fmt)
+        return prepare_image_bytes(out.getvalue(), f"lab.{fmt.lower()}")
+
+    def test_resized_to_budget_and_grayscale(self):
+        original = self._photo(3000, 600)
+
+        scaled = downscale_image(original, max_width_px=1920, max_pixels=800_000)
+
+        assert scaled.image_id == original.image_id
+        assert scaled.media_type == "image/jpeg"
+        assert scaled.width <= 1920
+        assert scaled.width * scaled.height <= 800_000
+        assert scaled.size_bytes < original.size_bytes
+        assert check_mime(scaled.data[:12], "x") == "image/jpeg"
+
+    def test_gif_and_undecodable_images_untouched(self):
+        gif = self._photo(64, 64, fmt="GIF")
+        assert downscale_image(gif) is gif
+        broken = prepare_image_bytes(_JPEG, "lab.jpg")
+        assert downscale_image(broken) is broken
+
+    @pytest.mark.asyncio
+    async def test_batch_preserves_order(self):
+        images = [self._photo(1200, 1200), self._photo(100, 100)]
+        scaled = await downscale_images(images, max_pixels=500_000)
+        assert [s.image_id for s in scaled] == [i.image_id for i in images]
+        assert scaled[0].width * scaled[0].height <= 500_000
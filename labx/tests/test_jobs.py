@@ -0,0 +1,210 @@
+"""Tests for the job queue, its worker pool and the /jobs API."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from labx.api.server import app
+from labx.domain.models import AnalysisReport
+from labx.pipeline import orchestrator
+from labx.pipeline.worker import JobWorkerPool, job_image_paths
+from labx.storage.jobs import (
+    FAILED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    JobStore,
+    get_job_store,
+    reset_job_store,
+)
+from tests.test_pipeline_smoke import MockExtractor
+
+_JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 100
+
+
+def _enqueue(store: JobStore, images: int = 1, priority: int = 1, tenant: str = "default") -> str:
+    job_id, job_dir = store.new_job_dir()
+    for i in range(images):
+        (job_dir / f"{i:02d}").mkdir()
+        (job_dir / f"{i:02d}" / "lab.jpg").write_bytes(_JPEG + bytes([i]))
+    store.submit(job_id, image_count=images, summary=False, priority=priority, tenant=tenant)
+    return job_id
+
+
+class TestJobStore:
+    def test_claim_oldest_first(self, tmp_path: Path):
+        store = JobStore(tmp_path)
+        first = _enqueue(store)
+        _enqueue(store)
+
+        job = store.claim()
+        assert job is not None
+        assert job.id == first
+        assert job.status == RUNNING
+        assert job.attempts == 1
+        assert store.queued() == 1
+
+    def test_claim_stat_before_older_routine(self, tmp_path: Path):
+        store = JobStore(tmp_path)
+        _enqueue(store)
+        stat = _enqueue(store, priority=0)
+
+        assert store.claim().id == stat
+
+    def test_claim_spreads_workers_across_tenants(self, tmp_path: Path):
+        store = JobStore(tmp_path)
+        for _ in range(3):
+            _enqueue(store, tenant="bulk")
+        small = _enqueue(store, tenant="ward-7")
+
+        assert store.claim().tenant == "bulk"
+        assert store.claim().id == small
+
+    def test_complete_stores_result_and_removes_inputs(self, tmp_path: Path):
+        store = JobStore(tmp_path)
+        job_id = _enqueue(store)
+        job = store.claim()
+        assert store.complete(job, AnalysisReport())
+
+        assert store.get(job_id).status == SUCCEEDED
+        assert store.result(job_id) == AnalysisReport()
+        assert not store.input_dir(job_id).exists()
+
+    def test_recover_requeues_abandoned_jobs(self, tmp_path: Path):
+        store = JobStore(tmp_path, max_attempts=2)
+        job_id = _enqueue(store)
+        store.claim()
+
+        assert store.recover(lease_s=60) == 0
+        assert store.recover(lease_s=-1) == 1
+        assert store.get(job_id).status == QUEUED
+
+        store.claim()
+        store.recover(lease_s=-1)
+        job = store.get(job_id)
+        assert job.status == FAILED
+        assert job.error == "internal"
+
+    def test_superseded_run_cannot_finish(self, tmp_path: Path):
+        store = JobStore(tmp_path)
+        job_id = _enqueue(store)
+        stale = store.claim()
+        store.recover(lease_s=-1)
+        current = store.claim()
+
+        assert not store.complete(stale, AnalysisReport())
+        assert not store.fail(stale, "internal")
+        assert store.get(job_id).status == RUNNING
+        assert store.input_dir(job_id).exists()
+        assert store.complete(current, AnalysisReport(summary="second run"))
+        assert store.result(job_id).summary == "second run"
+        assert not store.fail(current, "internal")
+
+    def test_purge_finished(self, tmp_path: Path):
+        store = JobStore(tmp_path)
+        done = _enqueue(store)
+        pending = _enqueue(store)
+        job = store.claim()
+        assert job.id == done
+        store.fail(job, "internal")
+
+        assert store.purge(older_than_s=-1) == 1
+        assert store.get(done) is None
+        assert store.get(pending) is not None
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_drains_queue(tmp_path: Path):
+    store = JobStore(tmp_path)
+    job_ids = [_enqueue(store, images=2) for _ in range(3)]
+    pool = JobWorkerPool(store, workers=2, extractor=MockExtractor(), poll_interval_s=0.01)
+
+    pool.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not all(store.get(j).finished for j in job_ids):
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.01)
+    finally:
+        await pool.stop()
+
+    assert all(store.get(j).status == SUCCEEDED for j in job_ids)
+    assert len(store.result(job_ids[0]).reports) == 2
+
+
+def test_job_image_paths_keep_submission_order(tmp_path: Path):
+    for i, name in enumerate(["z.jpg", "a.jpg", "z.jpg"]):
+        (tmp_path / f"{i:02d}").mkdir()
+        (tmp_path / f"{i:02d}" / name).write_bytes(_JPEG)
+
+    assert [p.parent.name for p in job_image_paths(tmp_path)] == ["00", "01", "02"]
+
+
+def test_jobs_api_submit_poll_fetch(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LABX_API_KEY", "test-key")
+    monkeypatch.setenv("JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(orchestrator, "AnthropicVisionExtractor", lambda s: MockExtractor())
+    reset_job_store()
+    headers = {"X-API-Key": "test-key"}
+
+    try:
+        with TestClient(app) as client:
+            response = client.post(
+                "/jobs?summary=false",
+                headers=headers,
+                files=[("files", ("a.jpg", _JPEG, "image/jpeg"))],
+            )
+            assert response.status_code == 202
+            job_id = response.json()["job_id"]
+
+            deadline = time.monotonic() + 5
+            while (status := client.get(f"/jobs/{job_id}", headers=headers).json())[
+                "status"
+            ] in (QUEUED, RUNNING):
+                assert time.monotonic() < deadline
+                time.sleep(0.02)
+
+            assert status["status"] == SUCCEEDED
+            result = client.get(f"/jobs/{job_id}/result", headers=headers)
+            assert result.status_code == 200
+            assert len(result.json()["analysis"]["trends"]) == 2
+            assert client.get("/jobs/missing", headers=headers).status_code == 404
+    finally:
+        reset_job_store()
+
+
+def test_jobs_api_disabled(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LABX_API_KEY", "test-key")
+    monkeypatch.setenv("JOBS_DIR", str(tmp_path))
+    monkeypatch.setenv("JOBS_ENABLED", "false")
+    reset_job_store()
+
+    try:
+        with TestClient(app) as client:
+            assert app.state.job_pool is None
+            response = client.get("/jobs/anything", headers={"X-API-Key": "test-key"})
+            assert response.status_code == 404
+    finally:
+        reset_job_store()
+
+
+def test_jobs_api_hides_other_tenants_jobs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LABX_API_KEYS", "ward-7:key-7,ward-9:key-9")
+    monkeypatch.setenv("JOBS_DIR", str(tmp_path))
+    monkeypatch.setenv("JOB_WORKERS", "0")
+    reset_job_store()
+
+    try:
+        with TestClient(app) as client:
+            job_id = _enqueue(get_job_store(), tenant="ward-7")
+            own = client.get(f"/jobs/{job_id}", headers={"X-API-Key": "key-7"})
+            assert own.status_code == 200
+            for path in (f"/jobs/{job_id}", f"/jobs/{job_id}/result"):
+                assert client.get(path, headers={"X-API-Key": "key-9"}).status_code == 404
+    finally:
+        reset_job_store()
@@ -0,0 +1,65 @@
+"""Tests for the incremental JSON stream parser."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from labx.providers.json_stream import JSONStreamParser
+
+_REPORT = {
+    "patient": {"name": 'O"Brien {x}'},
+    "panels": [
+        {
+            "panel_name": "BMP",
+            "results": [
+                {"analyte_key": "sodium", "observations": [{"value": 140}]},
+                {"analyte_key": "chl]oride", "raw_unit": "mmol/L"},
+            ],
+        },
+        {"results": [{"analyte_key": "hemoglobin"}]},
+    ],
+}
+
+
+def _feed(text: str, size: int) -> list:
+    parser = JSONStreamParser()
+    found = []
+    for i in range(0, len(text), size):
+        found.extend(parser.feed(text[i : i + size]))
+    return found
+
+
+@pytest.mark.parametrize("size", [1, 7, 10_000])
+def test_analytes_emitted_with_positions(size: int):
+    found = _feed(json.dumps(_REPORT), size)
+
+    assert [path for path, _ in found] == [
+        ("panels", 0, "results", 0),
+        ("panels", 0, "results", 1),
+        ("panels", 1, "results", 0),
+    ]
+    assert found[1][1] == {"analyte_key": "chl]oride", "raw_unit": "mmol/L"}
+
+
+def test_each_analyte_emitted_as_soon_as_it_closes():
+    text = json.dumps(_REPORT)
+    first_close = text.index("}]}") + 3  # sodium's observations, then sodium itself
+    parser = JSONStreamParser()
+
+    assert parser.feed(text[: first_close - 1]) == []
+    assert [p for p, _ in parser.feed(text[first_close - 1 : first_close])] == [
+        ("panels", 0, "results", 0)
+    ]
+
+
+def test_prose_and_fences_ignored():
+    text = "Here is the report:\n```json\n" + json.dumps(_REPORT) + "\n```\n{not json}"
+    assert len(_feed(text, 5)) == 3
+
+
+def test_truncated_document_yields_completed_analytes_only():
+    text = json.dumps(_REPORT)
+    cut = text.index("hemoglobin")
+    assert len(_feed(text[:cut], 3)) == 2
@@ -7,9 +7,10 @@ from labx.domain.models import (
     LabPanel,
     LabReport,
     Observation,
+    PatientMeta,
     ReferenceRange,
 )
-from labx.pipeline.merge import merge_reports
+from labx.pipeline.merge import TimelineMerger, merge_reports, stitch_reports
 
 
 def _make_report(
@@ -121,3 +122,102 @@ class TestMergeReports:
     def test_empty_reports(self):
         merged = merge_reports([])
         assert merged == []
+
+
+class TestTimelineMerger:
+    def test_last_image_wins_by_order_not_arrival(self):
+        """Reports folded out of order still resolve duplicates by batch position."""
+        analyte = LabAnalyte(
+            analyte_key="sodium",
+            unit_canonical="mmol/L",
+            ref_range=ReferenceRange(low=136.0, high=145.0),
+            observations=[_obs("2024-01-01", 140.0)],
+        )
+        merger = TimelineMerger()
+        merger.add(_make_report("img2", [analyte.model_copy(deep=True)]), order=1)
+        merger.add(_make_report("img1", [analyte.model_copy(deep=True)]), order=0)
+
+        merged = merger.timeline()
+        assert merged[0].observations[0].source_image_id == "img2"
+
+    def test_timeline_can_be_read_while_adding(self):
+        a1 = LabAnalyte(
+            analyte_key="sodium",
+            unit_canonical="mmol/L",
+            observations=[_obs("2024-01-02", 141.0)],
+        )
+        a2 = LabAnalyte(
+            analyte_key="sodium",
+            unit_canonical="mmol/L",
+            observations=[_obs("2024-01-01", 139.0)],
+        )
+        merger = TimelineMerger()
+        merger.add(_make_report("img1", [a1]))
+        assert len(merger.timeline()[0].observations) == 1
+
+        merger.add(_make_report("img2", [a2]))
+        dates = [o.date for o in merger.timeline()[0].observations]
+        assert dates == [date(2024, 1, 1), date(2024, 1, 2)]
+
+
+class TestStitchReports:
+    def _band(self, panels: list[LabPanel], mrn: str = "") -> LabReport:
+        return LabReport(panels=panels, patient=PatientMeta(mrn=mrn))
+
+    def test_overlap_rows_deduplicated(self):
+        top = self._band(
+            [
+                LabPanel(
+                    panel_name="BMP",
+                    results=[
+                        LabAnalyte(analyte_key="sodium", observations=[_obs("2024-01-01", 140)]),
+                        LabAnalyte(analyte_key="potassium", observations=[_obs("2024-01-01", 4)]),
+                    ],
+                )
+            ],
+            mrn="123",
+        )
+        bottom = self._band(
+            [
+                LabPanel(
+                    panel_name="General",  # header was above the band edge
+                    results=[
+                        LabAnalyte(analyte_key="potassium", observations=[_obs("2024-01-01", 4)]),
+                        LabAnalyte(analyte_key="chloride", observations=[_obs("2024-01-01", 101)]),
+                    ],
+                )
+            ]
+        )
+
+        report = stitch_reports([top, bottom], source_image_id="img1")
+
+        assert report.source_image_id == "img1"
+        assert report.patient.mrn == "123"
+        assert [p.panel_name for p in report.panels] == ["BMP"]
+        rows = report.panels[0].results
+        assert [a.analyte_key for a in rows] == ["sodium", "potassium", "chloride"]
+        assert len(rows[1].observations) == 1
+
+    def test_named_panels_kept_apart(self):
+        a = self._band([LabPanel(panel_name="CBC", results=[LabAnalyte(analyte_key="wbc")])])
+        b = self._band([LabPanel(panel_name="LFT", results=[LabAnalyte(analyte_key="alt")])])
+        report = stitch_reports([a, b])
+        assert [p.panel_name for p in report.panels] == ["CBC", "LFT"]
+
+    def test_unnormalized_rows_sharing_a_unit_kept_apart(self):
+        def row(name: str, value: float) -> LabAnalyte:
+            return LabAnalyte(
+                raw_name=name, raw_unit="mmol/L", observations=[_obs("2024-01-01", value)]
+            )
+
+        top = self._band(
+            [LabPanel(panel_name="BMP", results=[row("Sodium", 140), row("Potassium", 4.1)])]
+        )
+        bottom = self._band(
+            [LabPanel(panel_name="", results=[row("POTASSIUM ", 4.1), row("Chloride", 101)])]
+        )
+
+        rows = stitch_reports([top, bottom]).panels[0].results
+
+        assert [a.raw_name for a in rows] == ["Sodium", "Potassium", "Chloride"]
+        assert [a.observations[0].value for a in rows] == [140, 4.1, 101]
@@ -0,0 +1,252 @@
+"""Tests for perceptual hashing and near-duplicate reuse."""
+
+from __future__ import annotations
+
+import io
+import random
+import time
+import zlib
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from labx.domain.models import LabAnalyte, LabPanel, LabReport, Observation, PatientMeta
+from labx.pipeline.concurrency import tenant_scope
+from labx.pipeline.image_io import PreparedImage, dhash, prepare_image_bytes
+from labx.providers import cached
+from labx.providers.base import PageIdentity, VisionExtractor
+from labx.providers.cached import CachedVisionExtractor
+from labx.storage.cache import CacheEntry, DiskCache, MemoryCache, SQLiteCache, TieredCache
+from labx.storage.phash import BKTreeIndex, HashIndex, SQLiteHashIndex, hamming
+
+
+def _flip(value: int, bits: int, rng: random.Random) -> int:
+    for b in rng.sample(range(64), bits):
+        value ^= 1 << b
+    return value
+
+
+@pytest.mark.parametrize("kind", ["bktree", "sqlite"])
+def test_index_finds_hashes_within_distance(kind: str, tmp_path: Path):
+    rng = random.Random(7)
+    index: HashIndex = (
+        BKTreeIndex() if kind == "bktree" else SQLiteHashIndex(tmp_path / "phash.sqlite3")
+    )
+    query = rng.getrandbits(64)
+    hashes = {f"k{i}": rng.getrandbits(64) for i in range(300)}
+    hashes.update({f"near{d}": _flip(query, d, rng) for d in (0, 2, 5, 6, 7)})
+    for key, h in hashes.items():
+        index.add(key, h, tenant="t1")
+
+    found = index.search(query, 6, tenant="t1")
+
+    expected = sorted((hamming(query, h), k) for k, h in hashes.items() if hamming(query, h) <= 6)
+    assert found == expected
+    assert [k for _, k in found][:4] == ["near0", "near2", "near5", "near6"]
+    assert len(index) == len(hashes)
+
+
+def test_bktree_clears_when_full():
+    index = BKTreeIndex(max_entries=2)
+    for i in range(3):
+        index.add(f"k{i}", i, tenant="t1")
+    assert len(index) == 1
+    assert index.search(2, 0, tenant="t1") == [(0, "k2")]
+
+
+@pytest.mark.parametrize("kind", ["bktree", "sqlite"])
+def test_index_remove(kind: str, tmp_path: Path):
+    index: HashIndex = (
+        BKTreeIndex() if kind == "bktree" else SQLiteHashIndex(tmp_path / "phash.sqlite3")
+    )
+    index.add("a", 0b1011, tenant="t1")
+    index.add("b", 0b1011, tenant="t1")
+    index.add("c", 0b1111, tenant="t1")
+
+    index.remove(["a", "c", "missing"])
+
+    assert index.search(0b1011, 2, tenant="t1") == [(0, "b")]
+    assert len(index) == 1
+
+
+class TestIndexPruning:
+    def _entry(self, key: str, fingerprint: str = "fp1") -> CacheEntry:
+        return CacheEntry(fingerprint, LabReport(source_image_id=key))
+
+    @pytest.mark.parametrize("tier", ["memory", "disk", "sqlite"])
+    def test_eviction_prunes_index(self, tier: str, tmp_path: Path):
+        memory = MemoryCache(max_entries=2 if tier == "memory" else 10)
+        store: MemoryCache | DiskCache | SQLiteCache = memory
+        if tier == "disk":
+            store = DiskCache(tmp_path, max_entries=2)
+        elif tier == "sqlite":
+            size = len(zlib.compress(LabReport(source_image_id="a").model_dump_json().encode()))
+            store = SQLiteCache(tmp_path / "cache.sqlite3", max_bytes=int(size * 2.5))
+        cache = TieredCache(memory, None if store is memory else store)  # type: ignore[arg-type]
+        index = BKTreeIndex()
+        CachedVisionExtractor(_Extractor(), cache, index=index, mode="verify")
+
+        for i, key in enumerate(["a", "b", "c"]):
+            index.add(key, i, tenant="t1")
+            cache.put(key, "fp1", LabReport(source_image_id=key))
+            time.sleep(0.01)  # distinct timestamps for oldest-first eviction
+
+        indexed = {k for _, k in index.search(0, 64, tenant="t1")}
+        assert "a" not in indexed
+        assert indexed == {k for k in "abc" if store.get(k) is not None}
+
+    @pytest.mark.parametrize("tier", ["disk", "sqlite"])
+    def test_delete_and_purge_prune_index(self, tier: str, tmp_path: Path):
+        persistent = (
+            DiskCache(tmp_path) if tier == "disk" else SQLiteCache(tmp_path / "cache.sqlite3")
+        )
+        cache, index = TieredCache(MemoryCache(), persistent), BKTreeIndex()
+        CachedVisionExtractor(_Extractor(), cache, index=index, mode="verify")
+        for i, (key, fingerprint) in enumerate([("a", "fp1"), ("b", "old"), ("c", "fp1")]):
+            index.add(key, i, tenant="t1")
+            persistent.put(key, self._entry(key, fingerprint))
+
+        cache.delete("a")
+        cache.purge_stale("fp1")
+
+        assert [k for _, k in index.search(0, 64, tenant="t1")] == ["c"]
+
+
+class _Extractor(VisionExtractor):
+    """Reads patient ``P1`` off every page unless *patients* says otherwise."""
+
+    def __init__(self, accept: bool = True) -> None:
+        self.calls = 0
+        self.verified = 0
+        self.patients: dict[str, str] = {}
+        self._accept = accept
+
+    @property
+    def fingerprint(self) -> str | None:
+        return "fp1"
+
+    async def extract(self, image: PreparedImage) -> LabReport:
+        self.calls += 1
+        mrn = self.patients.get(image.image_id, "P1")
+        return LabReport(source_image_id=image.image_id, patient=PatientMeta(mrn=mrn))
+
+    async def read_identity(self, image: PreparedImage) -> PageIdentity | None:
+        return PageIdentity(patient_id=self.patients.get(image.image_id, "P1"))
+
+    async def verify(self, image: PreparedImage, report: LabReport) -> bool:
+        self.verified += 1
+        return self._accept
+
+
+class TestNearDuplicate:
+    @pytest.fixture(autouse=True)
+    def _pillow(self):
+        pytest.importorskip("PIL")
+
+    def _page(self, size: tuple[int, int], seed: int = 1) -> PreparedImage:
+        from PIL import Image, ImageDraw
+
+        rng = random.Random(seed)
+        im = Image.new("L", (600, 800), 255)
+        draw = ImageDraw.Draw(im)
+        for _ in range(40):
+            x, y = rng.randrange(560), rng.randrange(780)
+            draw.rectangle((x, y, x + rng.randrange(10, 40), y + 12), fill=0)
+        out = io.BytesIO()
+        im.resize(size).save(out, format="JPEG", quality=80)
+        return prepare_image_bytes(out.getvalue(), "lab.jpg")
+
+    def test_dhash_stable_under_rescale(self):
+        a = dhash(self._page((600, 800)))
+        b = dhash(self._page((450, 600)))
+        c = dhash(self._page((600, 800), seed=2))
+        assert a is not None and b is not None and c is not None
+        assert hamming(a, b) <= 6
+        assert hamming(a, c) > 6
+
+    def test_undecodable_image_has_no_hash(self):
+        assert dhash(prepare_image_bytes(b"\xff\xd8\xff\xe0" + b"\x00" * 100, "x.jpg")) is None
+
+    def _extractor(self, inner: VisionExtractor, mode: str) -> CachedVisionExtractor:
+        return CachedVisionExtractor(
+            inner, TieredCache(MemoryCache()), index=BKTreeIndex(), mode=mode  # type: ignore[arg-type]
+        )
+
+    @pytest.mark.asyncio
+    async def test_verify_mode_reuses_same_page(self):
+        inner = _Extractor()
+        ext = self._extractor(inner, "verify")
+        second = self._page((450, 600))
+
+        await ext.extract(self._page((600, 800)))
+        report = await ext.extract(second)
+
+        assert (inner.calls, inner.verified) == (1, 1)
+        assert report.source_image_id == second.image_id
+
+    @pytest.mark.asyncio
+    async def test_same_layout_different_patient_not_reused(self):
+        inner = _Extractor()
+        ext = self._extractor(inner, "verify")
+        first, second = self._page((600, 800)), self._page((450, 600))
+        first_hash, second_hash = dhash(first), dhash(second)
+        assert first_hash is not None and second_hash is not None
+        assert hamming(first_hash, second_hash) <= 6
+        inner.patients[second.image_id] = "P2"
+
+        await ext.extract(first)
+        report = await ext.extract(second)
+
+        assert (inner.calls, inner.verified) == (2, 0)
+        assert report.patient.mrn == "P2"
+
+    def test_identity_must_match_exactly(self):
+        obs = Observation(date=date(2024, 1, 2), value=1.0)
+        report = LabReport(
+            patient=PatientMeta(mrn="P 1"),
+            panels=[LabPanel(results=[LabAnalyte(observations=[obs])])],
+        )
+        dates = frozenset({date(2024, 1, 2)})
+
+        assert cached._identity_matches(PageIdentity(patient_id=" p1", dates=dates), report)
+        assert not cached._identity_matches(PageIdentity(patient_id="P1"), report)
+        assert not cached._identity_matches(PageIdentity(dates=dates), report)
+        assert not cached._identity_matches(
+            PageIdentity(patient_id="P1", dates=dates | {date(2024, 1, 3)}), report
+        )
+        assert not cached._identity_matches(PageIdentity(), LabReport())
+
+    @pytest.mark.asyncio
+    async def test_candidates_scoped_to_tenant(self):
+        inner = _Extractor()
+        ext = self._extractor(inner, "verify")
+
+        with tenant_scope("clinic-a"):
+            await ext.extract(self._page((600, 800)))
+        with tenant_scope("clinic-b"):
+            await ext.extract(self._page((450, 600)))
+
+        assert (inner.calls, inner.verified) == (2, 0)
+
+    @pytest.mark.asyncio
+    async def test_verify_mode_checks_candidate(self):
+        accepting = _Extractor(accept=True)
+        ext = self._extractor(accepting, "verify")
+        await ext.extract(self._page((600, 800)))
+        await ext.extract(self._page((450, 600)))
+        assert (accepting.calls, accepting.verified) == (1, 1)
+
+        rejecting = _Extractor(accept=False)
+        ext = self._extractor(rejecting, "verify")
+        await ext.extract(self._page((600, 800)))
+        await ext.extract(self._page((450, 600)))
+        assert (rejecting.calls, rejecting.verified) == (2, 1)
+
+    @pytest.mark.asyncio
+    async def test_off_mode_ignores_index(self):
+        inner = _Extractor()
+        ext = self._extractor(inner, "off")
+        await ext.extract(self._page((600, 800)))
+        await ext.extract(self._page((450, 600)))
+        assert inner.calls == 2
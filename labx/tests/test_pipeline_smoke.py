@@ -17,8 +17,8 @@ from labx.domain.models import (
     Observation,
     ReferenceRange,
 )
-from labx.pipeline.orchestrator import run_full_pipeline
-from labx.providers.base import VisionExtractor
+from labx.pipeline.orchestrator import run_full_pipeline, stream_pipeline
+from labx.providers.base import VisionExtractor, current_analyte_listener
 
 
 class MockExtractor(VisionExtractor):
@@ -161,3 +161,140 @@ async def test_pipeline_critical_flags(tmp_image: Path):
 
     assert len(result.critical_flags) >= 1
     assert result.critical_flags[0].analyte_key == "potassium"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_keeps_partial_results(tmp_path: Path):
+    """One failing image should not discard the others' extractions."""
+    good = tmp_path / "good.jpg"
+    bad = tmp_path / "bad.jpg"
+    good.write_bytes(b"\xff\xd8\xff\xe0" + b"\x00" * 100)
+    bad.write_bytes(b"\xff\xd8\xff\xe0" + b"\x01" * 100)
+
+    class FlakyExtractor(MockExtractor):
+        async def extract(self, image):
+            if image.file_name == "bad.jpg":
+                raise ValueError("No JSON object found in model response")
+            return await super().extract(image)
+
+    result = await run_full_pipeline(
+        [good, bad],
+        extractor=FlakyExtractor(),
+        enable_summary=False,
+    )
+
+    assert len(result.reports) == 1
+    assert len(result.trends) == 2
+    assert len(result.errors) == 1
+    assert result.errors[0].file_name == "bad.jpg"
+    assert result.errors[0].error_type == "invalid_json"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_raises_when_every_image_fails(tmp_image: Path):
+    class BrokenExtractor(VisionExtractor):
+        async def extract(self, image):
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await run_full_pipeline([tmp_image], extractor=BrokenExtractor(), enable_summary=False)
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_reports_as_they_complete(tmp_path: Path):
+    """A fast image is normalized before a slow one finishes; order is kept in the result."""
+    slow = tmp_path / "slow.jpg"
+    fast = tmp_path / "fast.jpg"
+    slow.write_bytes(b"\xff\xd8\xff\xe0" + b"\x00" * 100)
+    fast.write_bytes(b"\xff\xd8\xff\xe0" + b"\x01" * 100)
+
+    class DelayedExtractor(MockExtractor):
+        async def extract(self, image):
+            if image.file_name == "slow.jpg":
+                await asyncio.sleep(0.05)
+            return await super().extract(image)
+
+    events = [
+        e
+        async for e in stream_pipeline(
+            [slow, fast], extractor=DelayedExtractor(), enable_summary=False
+        )
+    ]
+    kinds = [(e.event, getattr(e, "index", None)) for e in events]
+
+    assert kinds[:2] == [("image_loaded", 0), ("image_loaded", 1)]
+    assert kinds.index(("report_normalized", 1)) < kinds.index(("image_extracted", 0))
+    assert kinds[-1] == ("complete", None)
+    analysis = events[-1].analysis
+    assert [r.source_image_id for r in analysis.reports] == [
+        events[0].image_id,
+        events[1].image_id,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_reports_critical_values(tmp_image: Path):
+    class CriticalExtractor(VisionExtractor):
+        async def extract(self, image):
+            return LabReport(
+                source_image_id=image.image_id,
+                panels=[
+                    LabPanel(
+                        results=[
+                            LabAnalyte(
+                                raw_name="Potassium",
+                                unit="mmol/L",
+                                raw_range_text="3.5 - 5.1",
+                                observations=[
+                                    Observation(date=date(2024, 1, 1), value=7.0),
+                                ],
+                            ),
+                        ],
+                    ),
+                ],
+            )
+
+    events = [
+        e
+        async for e in stream_pipeline(
+            [tmp_image], extractor=CriticalExtractor(), enable_summary=False
+        )
+    ]
+    critical = [e for e in events if e.event == "critical_detected"]
+
+    assert len(critical) == 1
+    assert critical[0].values[0].analyte_key == "potassium"
+    assert critical[0].values[0].flag == Flag.critical_high
+
+
+@pytest.mark.asyncio
+async def test_stream_reports_analytes_before_report_completes(tmp_image: Path):
+    """Analytes streamed by the extractor are normalized and flagged mid-extraction."""
+    released = asyncio.Event()
+
+    class StreamingExtractor(MockExtractor):
+        async def extract(self, image):
+            report = await super().extract(image)
+            listener = current_analyte_listener()
+            assert listener is not None
+            for analyte in report.panels[0].results:
+                listener(0, analyte.model_copy(deep=True))
+                await asyncio.sleep(0)
+            await released.wait()
+            return report
+
+    events = []
+    async for e in stream_pipeline(
+        [tmp_image], extractor=StreamingExtractor(), enable_summary=False
+    ):
+        events.append(e)
+        if len([x for x in events if x.event == "analyte_extracted"]) == 2:
+            released.set()
+
+    kinds = [e.event for e in events]
+    assert kinds[:3] == ["image_loaded", "analyte_extracted", "analyte_extracted"]
+    assert kinds[3] == "image_extracted"
+    sodium = events[1]
+    assert sodium.analyte.analyte_key == "sodium"
+    assert sodium.analyte.observations[0].flag_computed == Flag.critical_high
+    assert [v.analyte_key for v in sodium.critical_values] == ["sodium"]
@@ -0,0 +1,137 @@
+"""Tests for per-API-key rate limiting and image quotas."""
+
+from __future__ import annotations
+
+import pytest
+
+from labx.api.quota import (
+    ApiRateLimiter,
+    ApiRateLimitMiddleware,
+    MemoryBucketStore,
+    RateLimitedError,
+    SQLiteBucketStore,
+)
+from labx.api.security import configured_keys, resolve_tenant
+
+
+class TestKeys:
+    def test_multiple_keys_map_to_tenants(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setenv("LABX_API_KEY", "legacy")
+        monkeypatch.setenv("LABX_API_KEYS", "icu:k1, ward-7:k2,malformed")
+        keys = configured_keys()
+        assert keys == [("default", "legacy"), ("icu", "k1"), ("ward-7", "k2")]
+        assert resolve_tenant("k2", keys) == "ward-7"
+        assert resolve_tenant("legacy", keys) == "default"
+        assert resolve_tenant("nope", keys) is None
+        assert resolve_tenant(None, keys) is None
+
+
+class TestBucketStores:
+    @pytest.mark.parametrize("kind", ["memory", "sqlite"])
+    def test_take_until_empty(self, kind: str, tmp_path):
+        store = MemoryBucketStore() if kind == "memory" else SQLiteBucketStore(tmp_path / "b.db")
+        assert store.take("k", 1, rate=1.0, capacity=2) == 0
+        assert store.take("k", 1, rate=1.0, capacity=2) == 0
+        wait = store.take("k", 1, rate=1.0, capacity=2)
+        assert 0 < wait <= 1.0
+
+    def test_peek_does_not_consume(self):
+        store = MemoryBucketStore()
+        for _ in range(3):
+            assert store.take("k", 1, rate=1.0, capacity=1, consume=False) == 0
+        assert store.take("k", 1, rate=1.0, capacity=1) == 0
+        assert store.take("k", 1, rate=1.0, capacity=1, consume=False) > 0
+
+    def test_oversized_charge_goes_into_debt(self):
+        store = MemoryBucketStore()
+        assert store.take("k", 5, rate=1.0, capacity=2) == 0
+        assert store.take("k", 1, rate=1.0, capacity=2) > 3
+
+    def test_sqlite_shared_between_instances(self, tmp_path):
+        path = tmp_path / "b.db"
+        SQLiteBucketStore(path).take("k", 1, rate=0.01, capacity=1)
+        assert SQLiteBucketStore(path).take("k", 1, rate=0.01, capacity=1) > 0
+
+
+class TestApiRateLimiter:
+    @pytest.mark.asyncio
+    async def test_request_rate_per_tenant(self):
+        limiter = ApiRateLimiter(MemoryBucketStore(), requests_per_minute=60, burst=2)
+        await limiter.check_request("a")
+        await limiter.check_request("a")
+        with pytest.raises(RateLimitedError) as exc_info:
+            await limiter.check_request("a")
+        assert exc_info.value.reason == "request_rate"
+        assert exc_info.value.retry_after == 1
+        await limiter.check_request("b")  # other tenants are unaffected
+
+    @pytest.mark.asyncio
+    async def test_image_quota(self):
+        limiter = ApiRateLimiter(MemoryBucketStore(), images_per_hour=10)
+        await limiter.check_request("a")
+        await limiter.charge_images("a", 10)
+        with pytest.raises(RateLimitedError) as exc_info:
+            await limiter.check_request("a")
+        assert exc_info.value.reason == "image_quota"
+        assert exc_info.value.retry_after > 60
+
+
+async def _call(
+    monkeypatch: pytest.MonkeyPatch, scope: dict, limiter: ApiRateLimiter | None
+) -> tuple[list[dict], bool]:
+    monkeypatch.setattr("labx.api.quota.get_api_rate_limiter", lambda: limiter)
+    reached = False
+
+    async def app(scope, receive, send):
+        nonlocal reached
+        reached = True
+
+    async def receive():  # pragma: no cover - body must not be read
+        raise AssertionError("body should not be read")
+
+    sent: list[dict] = []
+
+    async def send(message):
+        sent.append(message)
+
+    await ApiRateLimitMiddleware(app)(scope, receive, send)
+    return sent, reached
+
+
+def _scope(key: str | None) -> dict:
+    headers = [(b"content-length", b"50")]
+    if key is not None:
+        headers.append((b"x-api-key", key.encode()))
+    return {"type": "http", "method": "POST", "path": "/analyse", "headers": headers}
+
+
+class TestMiddleware:
+    @pytest.fixture(autouse=True)
+    def _keys(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.delenv("LABX_API_KEY", raising=False)
+        monkeypatch.setenv("LABX_API_KEYS", "icu:k1")
+
+    @pytest.mark.asyncio
+    async def test_rejects_over_rate_before_reading_body(self, monkeypatch: pytest.MonkeyPatch):
+        limiter = ApiRateLimiter(MemoryBucketStore(), requests_per_minute=60, burst=1)
+        _, reached = await _call(monkeypatch, _scope("k1"), limiter)
+        assert reached
+
+        sent, reached = await _call(monkeypatch, _scope("k1"), limiter)
+        assert not reached
+        assert sent[0]["status"] == 429
+        assert (b"retry-after", b"1") in sent[0]["headers"]
+
+    @pytest.mark.asyncio
+    async def test_rejects_unknown_key(self, monkeypatch: pytest.MonkeyPatch):
+        sent, reached = await _call(monkeypatch, _scope("wrong"), None)
+        assert not reached
+        assert sent[0]["status"] == 401
+
+    @pytest.mark.asyncio
+    async def test_other_paths_pass_through(self, monkeypatch: pytest.MonkeyPatch):
+        limiter = ApiRateLimiter(MemoryBucketStore(), requests_per_minute=60, burst=1)
+        scope = {"type": "http", "method": "GET", "path": "/jobs/abc", "headers": []}
+        for _ in range(3):
+            _, reached = await _call(monkeypatch, scope, limiter)
+            assert reached
@@ -0,0 +1,76 @@
+"""Tests for pre-flight token estimation and the provider rate limiter."""
+
+from __future__ import annotations
+
+import struct
+import time
+from pathlib import Path
+
+import pytest
+
+from labx.config.constants import IMAGE_MAX_TOKENS
+from labx.pipeline.image_io import load_image
+from labx.pipeline.ratelimit import (
+    ProviderRateLimiter,
+    TokenBucket,
+    estimate_image_tokens,
+    estimate_text_tokens,
+)
+
+
+def _png_header(width: int, height: int) -> bytes:
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + ihdr + b"\x00" * 4
+
+
+class TestEstimation:
+    def test_small_image_scales_with_pixels(self):
+        assert estimate_image_tokens(750, 100) == 100
+
+    def test_large_image_capped(self):
+        assert estimate_image_tokens(4000, 3000) <= IMAGE_MAX_TOKENS
+
+    def test_unknown_dimensions_assume_max(self):
+        assert estimate_image_tokens(0, 0) == IMAGE_MAX_TOKENS
+
+    def test_text_tokens(self):
+        assert estimate_text_tokens("a" * 35) == 10
+
+    def test_png_dimensions_read_from_header(self, tmp_path: Path):
+        p = tmp_path / "lab.png"
+        p.write_bytes(_png_header(1200, 3400))
+        img = load_image(p)
+        assert (img.width, img.height) == (1200, 3400)
+        assert img.size_bytes == p.stat().st_size
+
+
+class TestTokenBucket:
+    def test_wait_time_after_drain(self):
+        bucket = TokenBucket(per_minute=60)
+        bucket.consume(60)
+        assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+
+    def test_oversized_request_capped_at_capacity(self):
+        bucket = TokenBucket(per_minute=60)
+        assert bucket.wait_time(1000) == 0.0
+
+
+class TestProviderRateLimiter:
+    @pytest.mark.asyncio
+    async def test_waits_for_input_budget(self):
+        limiter = ProviderRateLimiter(itpm=6000)  # 100 tokens/s
+        await limiter.reserve(6000, 0)
+
+        start = time.monotonic()
+        await limiter.reserve(10, 0)
+        assert time.monotonic() - start >= 0.08
+
+    @pytest.mark.asyncio
+    async def test_reconcile_refunds_overestimate(self):
+        limiter = ProviderRateLimiter(otpm=1000)
+        reservation = await limiter.reserve(0, 1000)
+        limiter.reconcile(reservation, 0, 200)
+
+        start = time.monotonic()
+        await limiter.reserve(0, 500)
+        assert time.monotonic() - start < 0.05
@@ -0,0 +1,89 @@
+"""Tests for single-flight coalescing of concurrent extractions."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from labx.domain.models import LabReport
+from labx.pipeline.orchestrator import run_extract_only
+from labx.pipeline.singleflight import SingleFlight
+from labx.providers.base import VisionExtractor
+
+
+class SlowExtractor(VisionExtractor):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def extract(self, image):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return LabReport(source_image_id=image.image_id)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flight: SingleFlight[int] = SingleFlight()
+    calls = 0
+
+    async def fn() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 42
+
+    results = await asyncio.gather(*(flight.do("k", fn) for _ in range(5)))
+
+    assert calls == 1
+    assert [r for r, _ in results] == [42] * 5
+    assert all(shared for _, shared in results)
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_exception_reaches_every_caller():
+    flight: SingleFlight[int] = SingleFlight()
+
+    async def fn() -> int:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(
+        flight.do("k", fn), flight.do("k", fn), return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    flight: SingleFlight[int] = SingleFlight()
+
+    async def fn() -> int:
+        await asyncio.sleep(0.02)
+        return 7
+
+    leader = asyncio.create_task(flight.do("k", fn))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("k", fn))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == (7, True)
+
+
+@pytest.mark.asyncio
+async def test_duplicate_images_in_batch_extracted_once(tmp_path: Path):
+    first = tmp_path / "a.jpg"
+    second = tmp_path / "b.jpg"
+    for p in (first, second):
+        p.write_bytes(b"\xff\xd8\xff\xe0" + b"\x00" * 100)
+    extractor = SlowExtractor()
+
+    reports, errors = await run_extract_only([first, second], extractor=extractor)
+
+    assert extractor.calls == 1
+    assert len(reports) == 2
+    assert errors == []
+    assert reports[0] is not reports[1]
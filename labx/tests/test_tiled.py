@@ -0,0 +1,123 @@
+"""Tests for tiled extraction of very tall images."""
+
+from __future__ import annotations
+
+import io
+from datetime import date
+
+import pytest
+
+from labx.config.settings import Settings
+from labx.domain.models import LabAnalyte, LabPanel, LabReport, Observation
+from labx.pipeline.image_io import PreparedImage, prepare_image_bytes, tile_bands
+from labx.providers.base import VisionExtractor, current_column_dates
+from labx.providers.tiled import TilingVisionExtractor, should_tile
+
+
+class TestTileBands:
+    def test_short_image_single_band(self):
+        assert tile_bands(1000, 1200, band_aspect=1.4, overlap=0.15, max_bands=8) == [(0, 1200)]
+
+    def test_bands_cover_and_overlap(self):
+        bands = tile_bands(1000, 5000, band_aspect=1.4, overlap=0.15, max_bands=8)
+        assert bands[0][0] == 0
+        assert bands[-1][1] == 5000
+        for (_, bottom), (top, _) in zip(bands, bands[1:], strict=False):
+            assert top < bottom  # consecutive bands overlap
+
+    def test_band_count_capped(self):
+        bands = tile_bands(1000, 50_000, band_aspect=1.4, overlap=0.15, max_bands=4)
+        assert len(bands) == 4
+        assert bands[-1][1] == 50_000
+
+
+_HEADER_DATES = [date(2024, 3, 1), date(2024, 1, 1)]
+
+
+class BandExtractor(VisionExtractor):
+    """Reports one row per band; neighbouring bands share a row in the overlap.
+
+    Like the model, only the first band can read the header dates; later
+    bands use the dates they are told, or fall back to today's.
+    """
+
+    def __init__(self) -> None:
+        self.images: list[PreparedImage] = []
+        self.told: dict[int, tuple[date, ...]] = {}
+
+    async def extract(self, image: PreparedImage) -> LabReport:
+        self.images.append(image)
+        n = int(image.file_name.rsplit("#", 1)[1]) if "#" in image.file_name else 0
+        self.told[n] = current_column_dates()
+        dates = _HEADER_DATES if n == 0 else self.told[n] or [date.today()]
+        rows = [
+            LabAnalyte(
+                analyte_key=f"row{i}",
+                observations=[Observation(date=d, value=float(i)) for d in dates],
+            )
+            for i in (n, n + 1)
+        ]
+        return LabReport(
+            source_image_id=image.image_id,
+            panels=[LabPanel(panel_name="General", results=rows)],
+        )
+
+
+def _tall_png(width: int, height: int) -> PreparedImage:
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(out, format="PNG")
+    return prepare_image_bytes(out.getvalue(), "long.png")
+
+
+class TestTilingExtractor:
+    @pytest.fixture(autouse=True)
+    def _pillow(self):
+        pytest.importorskip("PIL")
+
+    @pytest.mark.asyncio
+    async def test_tall_image_extracted_in_bands_and_stitched(self):
+        settings = Settings(tile_min_aspect=2.5, tile_band_aspect=1.4, tile_max_bands=8)
+        image = _tall_png(200, 1000)
+        inner = BandExtractor()
+
+        report = await TilingVisionExtractor(inner, settings).extract(image)
+
+        assert len(inner.images) > 1
+        assert all(tile.height < image.height for tile in inner.images)
+        assert report.source_image_id == image.image_id
+        keys = [a.analyte_key for a in report.panels[0].results]
+        assert keys == [f"row{i}" for i in range(len(inner.images) + 1)]
+
+    @pytest.mark.asyncio
+    async def test_later_bands_keep_header_dates(self):
+        settings = Settings(tile_min_aspect=2.5, tile_band_aspect=1.4, tile_max_bands=8)
+        inner = BandExtractor()
+
+        report = await TilingVisionExtractor(inner, settings).extract(_tall_png(200, 1000))
+
+        assert len(inner.images) > 2
+        assert inner.told[0] == ()
+        assert all(inner.told[n] == tuple(_HEADER_DATES) for n in range(1, len(inner.images)))
+        for analyte in report.panels[0].results:
+            assert [o.date for o in analyte.observations] == _HEADER_DATES
+
+    @pytest.mark.asyncio
+    async def test_normal_image_passes_through(self):
+        settings = Settings()
+        image = _tall_png(200, 300)
+        inner = BandExtractor()
+
+        await TilingVisionExtractor(inner, settings).extract(image)
+
+        assert not should_tile(image, settings)
+        assert inner.images == [image]
+
+    def test_fingerprint_includes_tiling(self):
+        class Fingerprinted(BandExtractor):
+            fingerprint = "fp"  # type: ignore[assignment]
+
+        assert TilingVisionExtractor(Fingerprinted(), Settings()).fingerprint != "fp"
+        off = Settings(tile_tall_images=False)
+        assert TilingVisionExtractor(Fingerprinted(), off).fingerprint == "fp"
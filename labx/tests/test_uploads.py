@@ -0,0 +1,115 @@
+"""Tests for streaming multipart upload parsing."""
+
+from __future__ import annotations
+
+import hashlib
+
+import pytest
+from starlette.requests import Request
+
+from labx.api.uploads import prepare_uploads, read_uploads
+from labx.pipeline.image_io import ImageValidationError
+
+_JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 100
+_BOUNDARY = "labxboundary"
+
+
+def _multipart(*parts: tuple[str, str | None, bytes]) -> bytes:
+    body = b""
+    for name, file_name, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if file_name is not None:
+            disposition += f'; filename="{file_name}"'
+        body += (
+            f"--{_BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode()
+            + data
+            + b"\r\n"
+        )
+    return body + f"--{_BOUNDARY}--\r\n".encode()
+
+
+def _request(body: bytes, chunk_size: int = 64) -> tuple[Request, list[int]]:
+    """A request whose body arrives in chunks; the list counts chunks read."""
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+    read = [0]
+
+    async def receive():
+        read[0] += 1
+        i = read[0] - 1
+        return {
+            "type": "http.request",
+            "body": chunks[i] if i < len(chunks) else b"",
+            "more_body": i < len(chunks) - 1,
+        }
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/analyse",
+        "headers": [
+            (b"content-type", f"multipart/form-data; boundary={_BOUNDARY}".encode())
+        ],
+    }
+    return Request(scope, receive), read
+
+
+@pytest.mark.asyncio
+async def test_reads_files_and_hashes_while_streaming():
+    png = b"\x89PNG\r\n\x1a\n" + b"\x00" * 300
+    body = _multipart(
+        ("files", "a.jpg", _JPEG), ("note", None, b"ignored"), ("files", "../b.png", png)
+    )
+    request, _ = _request(body)
+
+    uploads = await read_uploads(request, max_files=10, max_mb=1)
+
+    assert [u.file_name for u in uploads] == ["a.jpg", "b.png"]
+    assert uploads[1].data == png
+    assert uploads[1].sha256 == hashlib.sha256(png).hexdigest()
+    images = prepare_uploads(uploads, max_mb=1)
+    assert images[1].image_id == uploads[1].sha256
+    assert images[1].media_type == "image/png"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("file_name", ["..", ".", "a/..", ""])
+async def test_dot_names_replaced(file_name: str):
+    request, _ = _request(_multipart(("files", file_name, _JPEG)))
+
+    uploads = await read_uploads(request, max_files=10, max_mb=1)
+
+    assert [u.file_name for u in uploads] == ["image.bin"]
+
+
+@pytest.mark.asyncio
+async def test_oversized_file_aborts_before_rest_of_body():
+    big = b"\xff\xd8\xff\xe0" + b"\x00" * 4096
+    request, read = _request(_multipart(("files", "big.jpg", big)), chunk_size=256)
+
+    with pytest.raises(ImageValidationError, match="exceeds"):
+        await read_uploads(request, max_files=10, max_mb=1024 / (1024 * 1024))
+    assert read[0] < 10
+
+
+@pytest.mark.asyncio
+async def test_non_image_rejected_on_first_bytes():
+    body = _multipart(("files", "notes.txt", b"not an image at all" * 100))
+    request, read = _request(body)
+
+    with pytest.raises(ImageValidationError, match="Unsupported"):
+        await read_uploads(request, max_files=10, max_mb=1)
+    assert read[0] <= 3
+
+
+@pytest.mark.asyncio
+async def test_too_many_files():
+    body = _multipart(*[("files", f"{i}.jpg", _JPEG) for i in range(3)])
+    request, _ = _request(body)
+
+    with pytest.raises(ImageValidationError, match="Too many files"):
+        await read_uploads(request, max_files=2, max_mb=1)
+
+
+def test_no_files():
+    with pytest.raises(ImageValidationError, match="No images"):
+        prepare_uploads([], max_mb=1)